@@ -0,0 +1,196 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from typing import Optional, Dict
+import json
+import os
+import time
+
+from app.api.pipeline import DEFAULT_SYSTEM_PROMPT, check_output_format, run_pipeline
+from app.utils.audio import EXTENSIONS, audio_format, media_type
+from app.utils.jobs import TERMINAL, JobNotFound, JobQueue, JobQueueFull
+from app.utils.routing import AUTO, PROVIDERS
+
+router = APIRouter()
+
+# Seconds between keep-alive comments on an idle event stream
+EVENTS_KEEPALIVE_S = 15.0
+
+async def run_job(job: Dict) -> Dict:
+    """Run a queued pipeline job; audio jobs transcribe their stored upload first."""
+    return await run_pipeline(audio_path=job["input_path"], **job["params"])
+
+_job_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    """The process-wide job queue, configured from the environment on first use."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            sqlite_path=os.getenv("JOBS_SQLITE_PATH", "jobs.db"),
+            files_dir=os.getenv("JOBS_DIR", "job_files"),
+            runner=run_job,
+            workers=int(os.getenv("JOBS_WORKERS", "2")),
+            ttl_s=float(os.getenv("JOBS_TTL_S", "86400")),
+            lease_s=float(os.getenv("JOBS_LEASE_S", "60")),
+            max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+            max_queued=int(os.getenv("JOBS_MAX_QUEUED", "1000")),
+        )
+    return _job_queue
+
+def job_view(job: Dict) -> Dict:
+    job_id = job["id"]
+    view = {
+        "job_id": job_id,
+        "kind": job["kind"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "result": job["result"],
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+    }
+    if job["audio_path"]:
+        view["audio_url"] = f"/api/jobs/{job_id}/audio"
+    return view
+
+async def load_job(job_id: str) -> Dict:
+    try:
+        return await get_job_queue().get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+
+def check_provider(stage: str, provider: Optional[str]) -> None:
+    if provider != AUTO and provider not in PROVIDERS[stage]:
+        raise HTTPException(status_code=400, detail=f"Unknown {stage.upper()} provider: {provider}")
+
+@router.post("", status_code=202)
+async def submit_job(
+    llm_provider: str = Form(...),
+    tts_provider: str = Form(...),
+    audio: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    stt_provider: Optional[str] = Form(None),
+    stt_language: Optional[str] = Form("en-US"),
+    llm_model: Optional[str] = Form(None),
+    llm_system_prompt: Optional[str] = Form(DEFAULT_SYSTEM_PROMPT),
+    llm_max_tokens: Optional[int] = Form(150),
+    llm_temperature: Optional[float] = Form(0.7),
+    llm_messages: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    tts_voice: Optional[str] = Form(None),
+    tts_language: Optional[str] = Form("en-US"),
+    tts_speed: Optional[float] = Form(1.0),
+    tts_pitch: Optional[float] = Form(0.0),
+    tts_format: Optional[str] = Form(None),
+    tts_sample_rate: Optional[int] = Form(None)
+):
+    """
+    Queue a pipeline run and return its job id right away
+
+    - **audio** or **text**: Input audio (Audio → STT → LLM → TTS) or text (Text → LLM → TTS)
+    - **stt_provider**: Required with audio
+    - Other parameters are the same as /api/pipeline/process
+    - Poll `status_url` or subscribe to `events_url` (Server-Sent Events); fetch the reply from `audio_url`
+    """
+    if (audio is None) == (not text or not text.strip()):
+        raise HTTPException(status_code=400, detail="Send either audio or text")
+    tts_format, tts_sample_rate = check_output_format(tts_format, tts_sample_rate)
+    params = {
+        "llm_provider": llm_provider,
+        "tts_provider": tts_provider,
+        "llm_model": llm_model,
+        "llm_system_prompt": llm_system_prompt,
+        "llm_max_tokens": llm_max_tokens,
+        "llm_temperature": llm_temperature,
+        "llm_messages": llm_messages,
+        "session_id": session_id,
+        "tts_voice": tts_voice,
+        "tts_language": tts_language,
+        "tts_speed": tts_speed,
+        "tts_pitch": tts_pitch,
+        "tts_format": tts_format,
+        "tts_sample_rate": tts_sample_rate,
+    }
+    check_provider("llm", llm_provider)
+    check_provider("tts", tts_provider)
+    input_bytes = None
+    suffix = ""
+    if audio is not None:
+        if not audio.content_type or not audio.content_type.startswith('audio/'):
+            raise HTTPException(status_code=400, detail="File must be an audio file")
+        if not stt_provider:
+            raise HTTPException(status_code=400, detail="stt_provider is required with audio")
+        check_provider("stt", stt_provider)
+        params.update(stt_provider=stt_provider, stt_language=stt_language)
+        input_bytes = await audio.read()
+        suffix = f".{audio.filename.split('.')[-1]}" if audio.filename and "." in audio.filename else ""
+    else:
+        params["text"] = text
+
+    try:
+        job = await get_job_queue().submit("audio" if audio is not None else "text", params, input_bytes, suffix)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}")
+    view = job_view(job)
+    return JSONResponse(status_code=202, content=view, headers={"Location": view["status_url"]})
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Get a job's status, and its transcript, response text and audio URL once it has succeeded"""
+    return job_view(await load_job(job_id))
+
+@router.get("/{job_id}/audio")
+async def get_job_audio(job_id: str):
+    """Download the reply audio of a finished job"""
+    job = await load_job(job_id)
+    if not job["audio_path"] or not os.path.exists(job["audio_path"]):
+        raise HTTPException(status_code=404 if job["status"] in TERMINAL else 409,
+                            detail=f"Job {job_id} has no audio ({job['status']})")
+    result = job["result"] or {}
+    fmt = audio_format(job["audio_path"])
+    return FileResponse(job["audio_path"], media_type=media_type(fmt, result.get("sample_rate")),
+                        filename=f"response_{result.get('tts_provider', 'tts')}.{EXTENSIONS[fmt]}")
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of a job's status until it finishes"""
+    queue = get_job_queue()
+    await load_job(job_id)
+
+    async def stream():
+        last_state = None
+        last_sent = time.monotonic()
+        while True:
+            try:
+                job = await queue.get(job_id)
+            except JobNotFound:
+                yield "event: deleted\ndata: {}\n\n"
+                return
+            state = (job["status"], job["updated_at"])
+            if state != last_state:
+                last_state = state
+                last_sent = time.monotonic()
+                yield f"event: status\ndata: {json.dumps(job_view(job))}\n\n"
+            if job["status"] in TERMINAL:
+                return
+            # Jobs run by another process don't signal this one, so re-read every poll interval
+            await queue.wait_for_change(job_id, queue.poll_interval_s)
+            if time.monotonic() - last_sent >= EVENTS_KEEPALIVE_S:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.delete("/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a queued job, or delete a finished job and its audio"""
+    try:
+        job = await get_job_queue().delete(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    if job is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is running and can't be cancelled")
+    return {"job_id": job_id, "status": "cancelled" if job["status"] == "queued" else "deleted"}
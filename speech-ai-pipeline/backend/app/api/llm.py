@@ -5,14 +5,15 @@ import json
 
 from app.services.llm.openai_service import OpenAIService
 from app.services.llm.anthropic_service import AnthropicService
-from app.services.llm.ollama_service import OllamaService
+from app.services.llm.ollama_service import get_ollama_service
+from app.utils.sessions import build_turn_messages, get_session_store
+from app.api.sessions import resolve_session
 
 router = APIRouter()
 
 # Initialize services lazily
 openai_service = None
 anthropic_service = None
-ollama_service = None
 
 def get_openai_service():
     global openai_service
@@ -27,12 +28,6 @@ def get_anthropic_service():
         anthropic_service = AnthropicService()
     return anthropic_service
 
-def get_ollama_service():
-    global ollama_service
-    if ollama_service is None:
-        ollama_service = OllamaService()
-    return ollama_service
-
 @router.post("/generate")
 async def generate_response(
     text: str = Form(...),
@@ -87,6 +82,7 @@ async def generate_response(
             "provider": provider,
             "model": result.get("model", model),
             "tokens_used": result.get("tokens_used", 0),
+            "tokens_details": result.get("tokens_details"),
             "finish_reason": result.get("finish_reason", "completed")
         })
     
@@ -115,8 +111,8 @@ async def get_llm_providers():
             {
                 "name": "ollama",
                 "display_name": "Ollama (Local)",
-                "models": ["llama2", "mistral", "codellama", "neural-chat"],
-                "default_model": "llama2",
+                "models": get_ollama_service().models,
+                "default_model": get_ollama_service().default_model,
                 "description": "Local models via Ollama"
             }
         ]
@@ -124,8 +120,11 @@ async def get_llm_providers():
 
 @router.post("/chat")
 async def chat_conversation(
-    messages: str = Form(...),
     provider: str = Form(...),
+    messages: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    text: Optional[str] = Form(None),
+    system_prompt: Optional[str] = Form(None),
     model: Optional[str] = Form(None),
     max_tokens: Optional[int] = Form(150),
     temperature: Optional[float] = Form(0.7)
@@ -134,6 +133,9 @@ async def chat_conversation(
     Chat conversation with message history
     
     - **messages**: List of message objects with 'role' and 'content'
+    - **session_id**: Server-side conversation to continue instead of sending messages ("new" starts one)
+    - **text**: The new user turn (required with session_id)
+    - **system_prompt**: System prompt prepended to the session history (optional)
     - **provider**: LLM provider (openai, anthropic, ollama)
     - **model**: Specific model to use
     - **max_tokens**: Maximum tokens in response
@@ -141,13 +143,19 @@ async def chat_conversation(
     """
     
     try:
-        # Parse messages JSON string
-        try:
-            parsed_messages = json.loads(messages) if isinstance(messages, str) else messages
-            if not isinstance(parsed_messages, list):
-                raise ValueError("messages must be a JSON array")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid messages format: {e}")
+        if session_id:
+            if not text or not text.strip():
+                raise HTTPException(status_code=400, detail="text is required with session_id")
+            session_id, history = await resolve_session(session_id)
+            parsed_messages = build_turn_messages(history, system_prompt, text)
+        else:
+            # Parse messages JSON string
+            try:
+                parsed_messages = json.loads(messages) if messages else None
+                if not isinstance(parsed_messages, list):
+                    raise ValueError("messages must be a JSON array")
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid messages format: {e}")
         # Route to appropriate service
         if provider == "openai":
             result = await get_openai_service().chat(
@@ -173,7 +181,16 @@ async def chat_conversation(
         else:
             raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
         
+        if session_id:
+            await get_session_store().append(session_id, [
+                {"role": "user", "content": text},
+                {"role": "assistant", "content": result.get("response", "")},
+            ])
+            result = {**result, "session_id": session_id}
+        
         return JSONResponse(content=result)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}") 
\ No newline at end of file
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse
-from typing import Optional
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from typing import Optional, List, Dict, Tuple
 import tempfile
 import os
 import logging
@@ -9,16 +9,26 @@ import json
 from app.services.stt.whisper_service import WhisperService
 from app.services.stt.google_service import GoogleSTTService
 from app.services.stt.azure_service import AzureSTTService
+from app.services.stt.local_whisper_service import get_local_whisper_service
 
 from app.services.llm.openai_service import OpenAIService
 from app.services.llm.anthropic_service import AnthropicService
-from app.services.llm.ollama_service import OllamaService
+from app.services.llm.ollama_service import get_ollama_service
 
 from app.services.tts.google_service import GoogleTTSService
 from app.services.tts.elevenlabs_service import ElevenLabsService
 from app.services.tts.edge_service import EdgeTTSService
 from app.services.tts.gtts_service import GTTSService
+from app.services.tts.local_service import get_local_tts_service
+from app.utils.audio import EXTENSIONS, audio_format, check_output, media_type, transcode
+from app.utils.cache_backend import cache_key, get_cache
 from app.utils.text_utils import strip_all_markup
+from app.utils.tracing import span, run_in_executor
+from app.utils.semantic_cache import SemanticCache, get_semantic_cache
+from app.utils.routing import AUTO, NoProviderAvailable, get_router
+from app.utils.degradation import degradation_header, get_degradation_policy
+from app.utils.sessions import build_turn_messages, get_session_store
+from app.api.sessions import resolve_session
 
 router = APIRouter()
 logger = logging.getLogger("pipeline")
@@ -36,6 +46,8 @@ def get_stt_service(provider: str):
             stt_services[provider] = GoogleSTTService()
         elif provider == "azure":
             stt_services[provider] = AzureSTTService()
+        elif provider == "local":
+            stt_services[provider] = get_local_whisper_service()
     return stt_services.get(provider)
 
 def get_llm_service(provider: str):
@@ -45,7 +57,7 @@ def get_llm_service(provider: str):
         elif provider == "anthropic":
             llm_services[provider] = AnthropicService()
         elif provider == "ollama":
-            llm_services[provider] = OllamaService()
+            llm_services[provider] = get_ollama_service()
     return llm_services.get(provider)
 
 def get_tts_service(provider: str):
@@ -58,8 +70,421 @@ def get_tts_service(provider: str):
             tts_services[provider] = EdgeTTSService()
         elif provider == "gtts":
             tts_services[provider] = GTTSService()
+        elif provider == "local":
+            tts_services[provider] = get_local_tts_service()
     return tts_services.get(provider)
 
+def read_audio_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+TTS_AUDIO_CACHE = os.getenv("TTS_AUDIO_CACHE", "on").lower() in ("1", "on", "true", "yes")
+TTS_AUDIO_CACHE_TTL_S = float(os.getenv("TTS_AUDIO_CACHE_TTL_S", "86400"))
+
+def tts_audio_cache_key(provider: str, voice: Optional[str], language: Optional[str], speed: Optional[float],
+                        pitch: Optional[float], text: str, output_format: Optional[str] = None,
+                        sample_rate: Optional[int] = None) -> Optional[str]:
+    """Cache key of a synthesis request, or None with TTS_AUDIO_CACHE off."""
+    if not TTS_AUDIO_CACHE:
+        return None
+    parts = ("tts", provider, voice, language, speed, pitch, text)
+    # Requests for the provider's own format keep the keys they had before formats could be chosen
+    return cache_key(*parts, output_format, sample_rate) if output_format else cache_key(*parts)
+
+async def cached_tts_audio(key: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """(provider, audio bytes) synthesized earlier for this key, by any worker sharing the cache."""
+    if key is None:
+        return None
+    with span("pipeline.tts_cache.lookup") as cache_span:
+        value = await get_cache("tts_audio").get_async(key)
+        cache_span.set_attribute("hit", value is not None)
+    if value is None:
+        return None
+    provider, _, audio = value.partition(b"\n")
+    return provider.decode("utf-8"), audio
+
+async def store_tts_audio(key: Optional[str], provider: str, audio_file: str) -> None:
+    if key is None:
+        return
+    audio = await run_in_executor(read_audio_file, audio_file)
+    await get_cache("tts_audio").set_async(key, provider.encode("utf-8") + b"\n" + audio, TTS_AUDIO_CACHE_TTL_S)
+
+def apply_degradations(llm_provider: str, llm_model: Optional[str], llm_max_tokens: Optional[int],
+                       tts_provider: str, tts_voice: Optional[str]) -> Dict:
+    """Request parameters after the load-based degradation rules (see app.utils.degradation)."""
+    # Resolve the provider default so a rule can also replace a model the client didn't name
+    llm_service = get_llm_service(llm_provider) if llm_provider != AUTO else None
+    resolved_model = llm_model or getattr(llm_service, "default_model", None)
+    with span("pipeline.degradation") as degradation_span:
+        degraded = get_degradation_policy().apply(resolved_model, llm_max_tokens, tts_provider, tts_voice)
+        degradation_span.set_attribute("applied", len(degraded["applied"]))
+    if degraded["llm_model"] == resolved_model:
+        degraded["llm_model"] = llm_model
+    if degraded["applied"]:
+        logger.info(f"Degraded: {degradation_header(degraded['applied'])}")
+    return degraded
+
+async def call_stt(provider: str, stt_service, audio_path: str, language: str) -> Dict:
+    with span("pipeline.stt", provider=provider, language=language):
+        return await stt_service.transcribe(audio_path, language)
+
+async def call_llm(provider: str, llm_service, messages: Optional[List[Dict]], text: str, model: Optional[str],
+                   max_tokens: int, temperature: float, system_prompt: Optional[str]) -> Dict:
+    """Chat when there is history, otherwise single-turn generate."""
+    if messages:
+        with span("pipeline.llm", provider=provider, model=model, mode="chat", messages=len(messages)):
+            return await llm_service.chat(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+    with span("pipeline.llm", provider=provider, model=model, mode="generate"):
+        return await llm_service.generate(
+            text=text,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system_prompt=system_prompt
+        )
+
+def check_output_format(output_format: Optional[str], sample_rate: Optional[int]) -> Tuple[Optional[str], Optional[int]]:
+    """`check_output` for request parameters: invalid values are a 400."""
+    try:
+        return check_output(output_format, sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def native_output(tts_service, output_format: str, sample_rate: Optional[int]) -> bool:
+    """Whether the provider returns `output_format` at `sample_rate` itself (see the services' OUTPUT_FORMATS)."""
+    # None: any rate; a tuple: those rates; empty: only the provider's own rate
+    formats = getattr(tts_service, "OUTPUT_FORMATS", {"mp3": ()})
+    if output_format not in formats:
+        return False
+    rates = formats[output_format]
+    return rates is None or sample_rate is None or sample_rate in rates
+
+async def call_tts(provider: str, tts_service, text: str, voice: Optional[str], language: str,
+                   speed: float, pitch: float, output_format: Optional[str] = None,
+                   sample_rate: Optional[int] = None) -> str:
+    """
+    The provider's audio file; with `output_format` in that format (at
+    `sample_rate`, if given), transcoded only when the provider can't
+    produce it.
+    """
+    native = output_format is None or native_output(tts_service, output_format, sample_rate)
+    output = {"output_format": output_format, "sample_rate": sample_rate} if output_format and native else {}
+    with span("pipeline.tts", provider=provider, voice=voice, language=language, chars=len(text)):
+        if provider == "gtts":
+            # gTTS doesn't support voice/pitch parameters
+            audio_file = await tts_service.synthesize(
+                text=text,
+                language=language,
+                speed=speed,
+                **output
+            )
+        elif provider == "elevenlabs":
+            # ElevenLabs has no pitch control
+            audio_file = await tts_service.synthesize(
+                text=text,
+                voice=voice,
+                language=language,
+                speed=speed,
+                **output
+            )
+        else:
+            audio_file = await tts_service.synthesize(
+                text=text,
+                voice=voice,
+                language=language,
+                speed=speed,
+                pitch=pitch,
+                **output
+            )
+    if native:
+        return audio_file
+    with span("pipeline.transcode", provider=provider, source=audio_format(audio_file), output_format=output_format,
+              sample_rate=sample_rate):
+        try:
+            return await run_in_executor(transcode, audio_file, output_format, sample_rate)
+        except Exception:
+            os.unlink(audio_file)
+            raise
+
+def build_chat_messages(llm_messages: Optional[str], system_prompt: Optional[str], user_text: str) -> Optional[List[Dict]]:
+    """
+    Parse the `llm_messages` JSON history and prepare it for a chat call.
+
+    Prepends the system prompt when missing and appends the current user turn
+    unless it is already the last message. Returns None when no usable history
+    was sent, in which case callers fall back to single-turn generate.
+    """
+    if not llm_messages:
+        return None
+    try:
+        parsed_messages = json.loads(llm_messages)
+    except Exception:
+        return None
+    if not isinstance(parsed_messages, list) or not parsed_messages:
+        return None
+    return build_turn_messages(parsed_messages, system_prompt, user_text)
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant. Provide clear, concise responses."
+
+async def run_pipeline(
+    llm_provider: str,
+    tts_provider: str,
+    text: Optional[str] = None,
+    audio_path: Optional[str] = None,
+    stt_provider: Optional[str] = None,
+    stt_language: Optional[str] = "en-US",
+    llm_model: Optional[str] = None,
+    llm_system_prompt: Optional[str] = DEFAULT_SYSTEM_PROMPT,
+    llm_max_tokens: Optional[int] = 150,
+    llm_temperature: Optional[float] = 0.7,
+    llm_messages: Optional[str] = None,
+    session_id: Optional[str] = None,
+    tts_voice: Optional[str] = None,
+    tts_language: Optional[str] = "en-US",
+    tts_speed: Optional[float] = 1.0,
+    tts_pitch: Optional[float] = 0.0,
+    tts_format: Optional[str] = None,
+    tts_sample_rate: Optional[int] = None
+) -> Dict:
+    """
+    Run [STT →] LLM → TTS for the pipeline endpoints and background jobs.
+
+    With `audio_path` the audio is transcribed first, otherwise `text` is the
+    user turn. Client errors raise HTTPException, a stage with no usable
+    provider NoProviderAvailable. The reply audio is a file written by the TTS
+    provider (`audio_file`), or bytes (`audio`) from the TTS audio cache, in
+    `tts_format` at `tts_sample_rate` (already validated) when they are given.
+    """
+    session_id, history = await resolve_session(session_id)
+    degraded = apply_degradations(llm_provider, llm_model, llm_max_tokens, tts_provider, tts_voice)
+    llm_model, llm_max_tokens = degraded["llm_model"], degraded["llm_max_tokens"]
+    tts_provider, tts_voice = degraded["tts_provider"], degraded["tts_voice"]
+    provider_router = get_router()
+    stt_result = stt_route = None
+    
+    if audio_path:
+        # Step 1: Speech-to-Text
+        if stt_provider != AUTO and not get_stt_service(stt_provider):
+            raise HTTPException(status_code=400, detail=f"Unknown STT provider: {stt_provider}")
+        
+        logger.info("STT: transcribing audio")
+        stt_result, stt_provider, stt_route = await provider_router.call(
+            "stt", stt_provider, get_stt_service,
+            lambda provider, stt_service: call_stt(provider, stt_service, audio_path, stt_language),
+            language=stt_language)
+        text = stt_result.get("text", "")
+        logger.info(f"STT: done, confidence={stt_result.get('confidence')}")
+        
+        # Fallback to Whisper if no text detected
+        if not text.strip() and stt_provider != "whisper" and not degraded["skip_whisper_fallback"]:
+            whisper = get_stt_service("whisper")
+            if whisper and whisper.is_available():
+                logger.info("STT: primary returned empty. Falling back to Whisper...")
+                try:
+                    with span("pipeline.stt", provider="whisper", language=stt_language, fallback=True):
+                        stt_result = await whisper.transcribe(audio_path, stt_language)
+                    text = stt_result.get("text", "")
+                    logger.info(f"Whisper fallback: confidence={stt_result.get('confidence')}")
+                except Exception as e:
+                    logger.warning(f"Whisper fallback failed: {e}")
+        
+        if not text.strip():
+            raise HTTPException(status_code=400, detail="No speech detected in audio")
+    
+    # Step 2: Language Model Processing
+    if llm_provider != AUTO and not get_llm_service(llm_provider):
+        raise HTTPException(status_code=400, detail=f"Unknown LLM provider: {llm_provider}")
+    
+    logger.info(f"LLM: generating with model={llm_model} temp={llm_temperature}")
+    # Server-side session history, or chat history sent by the client, uses the
+    # chat flow; otherwise single-turn generate
+    if history is not None:
+        messages = build_turn_messages(history, llm_system_prompt, text)
+    else:
+        messages = build_chat_messages(llm_messages, llm_system_prompt, text)
+    # Single-turn questions can be answered from the semantic cache (opt-in)
+    semantic_cache = get_semantic_cache() if not messages else None
+    cache_partition = cache_entry = cache_similarity = None
+    if semantic_cache:
+        cache_partition = SemanticCache.partition_key(llm_provider, llm_model, llm_system_prompt,
+                                                      llm_max_tokens, llm_temperature)
+        with span("pipeline.semantic_cache.lookup") as cache_span:
+            cache_hit = semantic_cache.lookup(text, cache_partition)
+            cache_span.set_attribute("hit", cache_hit is not None)
+        if cache_hit:
+            cache_entry, cache_similarity = cache_hit
+    llm_route = None
+    if cache_entry:
+        llm_result = cache_entry.response
+        logger.info(f"LLM: semantic cache hit, similarity={cache_similarity:.3f}")
+    else:
+        llm_result, llm_provider, llm_route = await provider_router.call(
+            "llm", llm_provider, get_llm_service,
+            lambda provider, llm_service: call_llm(provider, llm_service, messages, text, llm_model,
+                                                   llm_max_tokens, llm_temperature, llm_system_prompt),
+            model=llm_model)
+    response_text = llm_result.get("response", "")
+    logger.info("LLM: done")
+    
+    if not response_text.strip():
+        raise HTTPException(status_code=500, detail="LLM generated empty response")
+    if semantic_cache and not cache_entry:
+        cache_entry = semantic_cache.store(text, cache_partition, llm_result)
+    if session_id:
+        await get_session_store().append(session_id, [
+            {"role": "user", "content": text},
+            {"role": "assistant", "content": response_text},
+        ])
+    
+    # Step 3: Text-to-Speech
+    if tts_provider != AUTO and not get_tts_service(tts_provider):
+        raise HTTPException(status_code=400, detail=f"Unknown TTS provider: {tts_provider}")
+    
+    logger.info(f"TTS: synthesizing voice={tts_voice} lang={tts_language}")
+    # Sanitize response text to avoid reading markup/HTML
+    with span("pipeline.sanitize", chars=len(response_text)):
+        safe_response_text = strip_all_markup(response_text)
+    # Repeated answers (semantic cache hits, canned replies) reuse audio synthesized earlier
+    tts_key = tts_audio_cache_key(tts_provider, tts_voice, tts_language, tts_speed, tts_pitch, safe_response_text,
+                                  tts_format, tts_sample_rate)
+    cached = await cached_tts_audio(tts_key)
+    audio_file = tts_route = cached_audio = None
+    if cached:
+        tts_provider, cached_audio = cached
+        logger.info("TTS: audio cache hit")
+    else:
+        audio_file, tts_provider, tts_route = await provider_router.call(
+            "tts", tts_provider, get_tts_service,
+            lambda provider, tts_service: call_tts(provider, tts_service, safe_response_text, tts_voice,
+                                                   tts_language, tts_speed, tts_pitch, tts_format, tts_sample_rate),
+            language=tts_language, voice=tts_voice)
+        await store_tts_audio(tts_key, tts_provider, audio_file)
+    logger.info("TTS: done")
+    
+    return {
+        "input_text": text,
+        "stt_provider": stt_provider if audio_path else None,
+        "stt_confidence": stt_result.get("confidence", 0.0) if stt_result else None,
+        "stt_route": stt_route,
+        "response_text": response_text,
+        "safe_response_text": safe_response_text,
+        "llm_provider": llm_provider,
+        "llm_route": llm_route,
+        "tts_provider": tts_provider,
+        "tts_route": tts_route,
+        "session_id": session_id,
+        "context": llm_result.get("context"),
+        "degradations": degraded["applied"],
+        "semantic_cache": {
+            "similarity": round(cache_similarity, 3),
+            "audio": "hit" if cached_audio is not None else "miss",
+        } if cache_similarity is not None else None,
+        "audio_format": tts_format or audio_format(audio_file or cached_audio),
+        "sample_rate": tts_sample_rate,
+        "audio_file": audio_file,
+        "audio": cached_audio,
+    }
+
+# response_format=framed: a 4-byte big-endian length, that many bytes of UTF-8
+# JSON metadata, then the audio until the end of the body
+RESPONSE_FORMATS = ("audio", "framed")
+FRAMED_MEDIA_TYPE = "application/vnd.speech-pipeline.framed"
+FRAME_CHUNK_BYTES = 64 * 1024
+# Text headers longer than this, or with characters a header can't carry, are left out
+MAX_TEXT_HEADER_CHARS = 1024
+
+def check_response_format(response_format: str) -> None:
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"response_format must be one of {', '.join(RESPONSE_FORMATS)}")
+
+def header_text(value: Optional[str]) -> Optional[str]:
+    """`value` on one line if a header can carry it (ASCII, at most MAX_TEXT_HEADER_CHARS), else None."""
+    value = " ".join(str(value or "").split())
+    if len(value) > MAX_TEXT_HEADER_CHARS or not value.isascii():
+        return None
+    return value
+
+def pipeline_metadata(result: Dict, media_type: str, filename: str, size: int) -> Dict:
+    """Everything `run_pipeline` returned except the audio itself, which is described instead."""
+    metadata = {key: value for key, value in result.items() if key not in ("audio", "audio_file")}
+    metadata["tts_cache"] = "hit" if result["audio"] is not None else "miss"
+    metadata["audio"] = {"media_type": media_type, "filename": filename, "bytes": size}
+    return metadata
+
+async def _framed_body(prefix: bytes, audio_file: str):
+    yield prefix
+    with open(audio_file, "rb") as f:
+        while True:
+            chunk = await run_in_executor(f.read, FRAME_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+def pipeline_response(result: Dict, text_headers: Dict[str, Optional[str]], response_format: str = "audio"):
+    """
+    The reply audio with the metadata headers both pipeline endpoints share.
+
+    With response_format=audio the transcript and answer go in `text_headers`
+    (left out, and named in X-Omitted-Headers, when a header can't carry
+    them); with response_format=framed all metadata is JSON ahead of the
+    audio in the body, so clients can read it before the audio arrives.
+    """
+    headers = {
+        "X-LLM-Provider": result["llm_provider"],
+        "X-TTS-Provider": result["tts_provider"],
+        "X-Degradations": degradation_header(result["degradations"]),
+    }
+    if result["session_id"]:
+        headers["X-Session-Id"] = result["session_id"]
+    context = result["context"]
+    if context:
+        # Prompt tokens sent / before context trimming
+        headers["X-Context-Tokens"] = f"{context['tokens_after']}/{context['tokens_before']}"
+    for name, key in (("X-STT-Route", "stt_route"), ("X-LLM-Route", "llm_route"), ("X-TTS-Route", "tts_route")):
+        if result[key]:
+            headers[name] = result[key]
+    cache = result["semantic_cache"]
+    if cache:
+        headers["X-Semantic-Cache"] = f"hit; similarity={cache['similarity']:.3f}; audio={cache['audio']}"
+    if result["audio"] is not None:
+        headers["X-TTS-Cache"] = "hit"
+    content_type = media_type(result["audio_format"], result["sample_rate"])
+    filename = f"response_{result['tts_provider']}.{EXTENSIONS[result['audio_format']]}"
+
+    if response_format == "framed":
+        size = len(result["audio"]) if result["audio"] is not None else os.path.getsize(result["audio_file"])
+        metadata = json.dumps(pipeline_metadata(result, content_type, filename, size), ensure_ascii=False).encode("utf-8")
+        prefix = len(metadata).to_bytes(4, "big") + metadata
+        if result["audio"] is not None:
+            return Response(prefix + result["audio"], media_type=FRAMED_MEDIA_TYPE, headers=headers)
+        headers["Content-Length"] = str(len(prefix) + size)
+        return StreamingResponse(_framed_body(prefix, result["audio_file"]), media_type=FRAMED_MEDIA_TYPE,
+                                 headers=headers)
+
+    omitted = []
+    for name, value in text_headers.items():
+        value = header_text(value)
+        if value is None:
+            omitted.append(name)
+        else:
+            headers[name] = value
+    if omitted:
+        headers["X-Omitted-Headers"] = ", ".join(omitted)
+    if result["audio"] is not None:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return Response(result["audio"], media_type=content_type, headers=headers)
+    return FileResponse(
+        result["audio_file"],
+        media_type=content_type,
+        filename=filename,
+        headers=headers
+    )
+
 @router.post("/process")
 async def process_full_pipeline(
     audio: UploadFile = File(...),
@@ -68,154 +493,73 @@ async def process_full_pipeline(
     tts_provider: str = Form(...),
     stt_language: Optional[str] = Form("en-US"),
     llm_model: Optional[str] = Form(None),
-    llm_system_prompt: Optional[str] = Form("You are a helpful AI assistant. Provide clear, concise responses."),
+    llm_system_prompt: Optional[str] = Form(DEFAULT_SYSTEM_PROMPT),
     llm_max_tokens: Optional[int] = Form(150),
     llm_temperature: Optional[float] = Form(0.7),
     llm_messages: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
     tts_voice: Optional[str] = Form(None),
     tts_language: Optional[str] = Form("en-US"),
     tts_speed: Optional[float] = Form(1.0),
-    tts_pitch: Optional[float] = Form(0.0)
+    tts_pitch: Optional[float] = Form(0.0),
+    tts_format: Optional[str] = Form(None),
+    tts_sample_rate: Optional[int] = Form(None),
+    response_format: str = Form("audio")
 ):
     """
     Process the full speech-to-speech pipeline:
     Audio → STT → LLM → TTS → Audio Response
     
     - **audio**: Input audio file
-    - **stt_provider**: Speech-to-text provider (whisper, google, azure)
-    - **llm_provider**: Language model provider (openai, anthropic, ollama)
-    - **tts_provider**: Text-to-speech provider (google, elevenlabs, edge, gtts)
+    - **stt_provider**: Speech-to-text provider (whisper, google, azure, local, or auto)
+    - **llm_provider**: Language model provider (openai, anthropic, ollama, or auto)
+    - **tts_provider**: Text-to-speech provider (google, elevenlabs, edge, gtts, local, or auto)
+    - **session_id**: Server-side conversation to continue ("new" starts one); replaces llm_messages
+    - Under load, degradation rules may swap in a smaller model or cheaper voice (see X-Degradations)
+    - "auto" picks the fastest healthy provider for that stage and fails over on error (see X-*-Route headers)
+    - **tts_format**: Reply audio format (mp3, opus, wav or pcm; default the provider's own) at **tts_sample_rate** Hz
+    - **response_format**: "audio" (metadata in X- headers) or "framed" (JSON metadata, then the audio, in the body)
     - Additional parameters for each service...
     """
     
-    trace_id = getattr(getattr(audio, "scope", None), "trace_id", None)
-    # For FastAPI, use request middleware to inject request.state.request_id; we can't access request here
-    # so we will log without it; middleware already logs the request and sets X-Trace-Id on the response
+    check_response_format(response_format)
+    tts_format, tts_sample_rate = check_output_format(tts_format, tts_sample_rate)
     if not audio.content_type.startswith('audio/'):
         raise HTTPException(status_code=400, detail="File must be an audio file")
     
     # Save uploaded audio file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio.filename.split('.')[-1]}") as temp_audio:
-        content = await audio.read()
-        logger.info(f"Upload received: type={audio.content_type}, name={audio.filename}, size={len(content)} bytes")
-        temp_audio.write(content)
-        temp_audio_path = temp_audio.name
+    with span("file.write", kind="upload") as write_span:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio.filename.split('.')[-1]}") as temp_audio:
+            content = await audio.read()
+            logger.info(f"Upload received: type={audio.content_type}, name={audio.filename}, size={len(content)} bytes")
+            temp_audio.write(content)
+            temp_audio_path = temp_audio.name
+        write_span.set_attribute("bytes", len(content))
     
     try:
         logger.info(f"Pipeline start: stt={stt_provider}, llm={llm_provider}, tts={tts_provider}")
-        # Step 1: Speech-to-Text
-        stt_service = get_stt_service(stt_provider)
-        if not stt_service:
-            raise HTTPException(status_code=400, detail=f"Unknown STT provider: {stt_provider}")
-        
-        logger.info("STT: transcribing audio")
-        stt_result = await stt_service.transcribe(temp_audio_path, stt_language)
-        transcribed_text = stt_result.get("text", "")
-        logger.info(f"STT: done, confidence={stt_result.get('confidence')}")
-        
-        # Fallback to Whisper if no text detected
-        if not transcribed_text.strip():
-            whisper = get_stt_service("whisper")
-            if whisper and whisper.is_available():
-                logger.info("STT: primary returned empty. Falling back to Whisper...")
-                try:
-                    stt_result = await whisper.transcribe(temp_audio_path, stt_language)
-                    transcribed_text = stt_result.get("text", "")
-                    logger.info(f"Whisper fallback: confidence={stt_result.get('confidence')}")
-                except Exception as e:
-                    logger.warning(f"Whisper fallback failed: {e}")
-        
-        if not transcribed_text.strip():
-            raise HTTPException(status_code=400, detail="No speech detected in audio")
-        
-        # Step 2: Language Model Processing
-        llm_service = get_llm_service(llm_provider)
-        if not llm_service:
-            raise HTTPException(status_code=400, detail=f"Unknown LLM provider: {llm_provider}")
-        
-        logger.info(f"LLM: generating with model={llm_model} temp={llm_temperature}")
-        # If chat history is provided, use chat flow; otherwise single-turn generate
-        parsed_messages = None
-        if llm_messages:
-            try:
-                parsed_messages = json.loads(llm_messages)
-                if not isinstance(parsed_messages, list):
-                    parsed_messages = None
-            except Exception:
-                parsed_messages = None
-
-        if parsed_messages:
-            # Ensure system prompt is prepended if provided and not already present
-            messages = parsed_messages[:]
-            if llm_system_prompt and (len(messages) == 0 or messages[0].get("role") != "system"):
-                messages = [{"role": "system", "content": llm_system_prompt}] + messages
-            # If last turn isn't the current user text, append it
-            if not (len(messages) > 0 and messages[-1].get("role") == "user" and messages[-1].get("content") == transcribed_text):
-                messages.append({"role": "user", "content": transcribed_text})
-
-            llm_result = await llm_service.chat(
-                messages=messages,
-                model=llm_model,
-                max_tokens=llm_max_tokens,
-                temperature=llm_temperature
-            )
-        else:
-            llm_result = await llm_service.generate(
-                text=transcribed_text,
-                model=llm_model,
-                max_tokens=llm_max_tokens,
-                temperature=llm_temperature,
-                system_prompt=llm_system_prompt
-            )
-        response_text = llm_result.get("response", "")
-        logger.info("LLM: done")
-        
-        if not response_text.strip():
-            raise HTTPException(status_code=500, detail="LLM generated empty response")
-        
-        # Step 3: Text-to-Speech
-        tts_service = get_tts_service(tts_provider)
-        if not tts_service:
-            raise HTTPException(status_code=400, detail=f"Unknown TTS provider: {tts_provider}")
-        
-        logger.info(f"TTS: synthesizing voice={tts_voice} lang={tts_language}")
-        # Sanitize response text to avoid reading markup/HTML
-        safe_response_text = strip_all_markup(response_text)
-        if tts_provider == "gtts":
-            # gTTS doesn't support voice/pitch parameters
-            audio_file = await tts_service.synthesize(
-                text=safe_response_text,
-                language=tts_language,
-                speed=tts_speed
-            )
-        else:
-            audio_file = await tts_service.synthesize(
-                text=safe_response_text,
-                voice=tts_voice,
-                language=tts_language,
-                speed=tts_speed,
-                pitch=tts_pitch
-            )
-        logger.info("TTS: done")
+        result = await run_pipeline(
+            llm_provider, tts_provider, audio_path=temp_audio_path, stt_provider=stt_provider,
+            stt_language=stt_language, llm_model=llm_model, llm_system_prompt=llm_system_prompt,
+            llm_max_tokens=llm_max_tokens, llm_temperature=llm_temperature, llm_messages=llm_messages,
+            session_id=session_id, tts_voice=tts_voice, tts_language=tts_language, tts_speed=tts_speed,
+            tts_pitch=tts_pitch, tts_format=tts_format, tts_sample_rate=tts_sample_rate
+        )
         
         # Return the generated audio with metadata
-        return FileResponse(
-            audio_file,
-            media_type="audio/mp3",
-            filename=f"response_{tts_provider}.mp3",
-            headers={
-                "X-Transcribed-Text": transcribed_text,
-                "X-Response-Text": safe_response_text,
-                "X-STT-Provider": stt_provider,
-                "X-LLM-Provider": llm_provider,
-                "X-TTS-Provider": tts_provider,
-                "X-STT-Confidence": str(stt_result.get("confidence", 0.0))
-            }
-        )
+        text_headers = {
+            "X-Transcribed-Text": result["input_text"],
+            "X-Response-Text": result["safe_response_text"],
+            "X-STT-Provider": result["stt_provider"],
+            "X-STT-Confidence": str(result["stt_confidence"])
+        }
+        return pipeline_response(result, text_headers, response_format)
     
     except HTTPException:
         logger.exception("Pipeline failed with HTTPException")
         raise
+    except NoProviderAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception(f"Pipeline processing failed: {e}")
         raise HTTPException(status_code=500, detail=f"Pipeline processing failed: {str(e)}")
@@ -231,110 +575,56 @@ async def process_text_pipeline(
     llm_provider: str = Form(...),
     tts_provider: str = Form(...),
     llm_model: Optional[str] = Form(None),
-    llm_system_prompt: Optional[str] = Form("You are a helpful AI assistant. Provide clear, concise responses."),
+    llm_system_prompt: Optional[str] = Form(DEFAULT_SYSTEM_PROMPT),
     llm_max_tokens: Optional[int] = Form(150),
     llm_temperature: Optional[float] = Form(0.7),
     llm_messages: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
     tts_voice: Optional[str] = Form(None),
     tts_language: Optional[str] = Form("en-US"),
     tts_speed: Optional[float] = Form(1.0),
-    tts_pitch: Optional[float] = Form(0.0)
+    tts_pitch: Optional[float] = Form(0.0),
+    tts_format: Optional[str] = Form(None),
+    tts_sample_rate: Optional[int] = Form(None),
+    response_format: str = Form("audio")
 ):
     """
     Process text-only pipeline: Text → LLM → TTS → Audio Response
     
     - **text**: Input text
-    - **llm_provider**: Language model provider (openai, anthropic, ollama)
-    - **tts_provider**: Text-to-speech provider (google, elevenlabs, edge, gtts)
+    - **llm_provider**: Language model provider (openai, anthropic, ollama, or auto)
+    - **tts_provider**: Text-to-speech provider (google, elevenlabs, edge, gtts, local, or auto)
+    - **session_id**: Server-side conversation to continue ("new" starts one); replaces llm_messages
+    - **tts_format**: Reply audio format (mp3, opus, wav or pcm; default the provider's own) at **tts_sample_rate** Hz
+    - **response_format**: "audio" (metadata in X- headers) or "framed" (JSON metadata, then the audio, in the body)
     """
     
+    check_response_format(response_format)
+    tts_format, tts_sample_rate = check_output_format(tts_format, tts_sample_rate)
     if not text.strip():
         raise HTTPException(status_code=400, detail="Input text cannot be empty")
     
     try:
         logger.info(f"Text pipeline start: llm={llm_provider}, tts={tts_provider}")
-        # Step 1: Language Model Processing
-        llm_service = get_llm_service(llm_provider)
-        if not llm_service:
-            raise HTTPException(status_code=400, detail=f"Unknown LLM provider: {llm_provider}")
-        
-        logger.info(f"LLM: generating with model={llm_model} temp={llm_temperature}")
-        # If chat history is provided, use chat flow; otherwise single-turn generate
-        parsed_messages = None
-        if llm_messages:
-            try:
-                parsed_messages = json.loads(llm_messages)
-                if not isinstance(parsed_messages, list):
-                    parsed_messages = None
-            except Exception:
-                parsed_messages = None
-
-        if parsed_messages:
-            messages = parsed_messages[:]
-            if llm_system_prompt and (len(messages) == 0 or messages[0].get("role") != "system"):
-                messages = [{"role": "system", "content": llm_system_prompt}] + messages
-            if not (len(messages) > 0 and messages[-1].get("role") == "user" and messages[-1].get("content") == text):
-                messages.append({"role": "user", "content": text})
-
-            llm_result = await llm_service.chat(
-                messages=messages,
-                model=llm_model,
-                max_tokens=llm_max_tokens,
-                temperature=llm_temperature
-            )
-        else:
-            llm_result = await llm_service.generate(
-                text=text,
-                model=llm_model,
-                max_tokens=llm_max_tokens,
-                temperature=llm_temperature,
-                system_prompt=llm_system_prompt
-            )
-        response_text = llm_result.get("response", "")
-        logger.info("LLM: done")
-        
-        if not response_text.strip():
-            raise HTTPException(status_code=500, detail="LLM generated empty response")
-        
-        # Step 2: Text-to-Speech
-        tts_service = get_tts_service(tts_provider)
-        if not tts_service:
-            raise HTTPException(status_code=400, detail=f"Unknown TTS provider: {tts_provider}")
-        
-        logger.info(f"TTS: synthesizing voice={tts_voice} lang={tts_language}")
-        if tts_provider == "gtts":
-            # gTTS doesn't support voice/pitch parameters
-            audio_file = await tts_service.synthesize(
-                text=response_text,
-                language=tts_language,
-                speed=tts_speed
-            )
-        else:
-            audio_file = await tts_service.synthesize(
-                text=response_text,
-                voice=tts_voice,
-                language=tts_language,
-                speed=tts_speed,
-                pitch=tts_pitch
-            )
-        logger.info("TTS: done")
+        result = await run_pipeline(
+            llm_provider, tts_provider, text=text, llm_model=llm_model, llm_system_prompt=llm_system_prompt,
+            llm_max_tokens=llm_max_tokens, llm_temperature=llm_temperature, llm_messages=llm_messages,
+            session_id=session_id, tts_voice=tts_voice, tts_language=tts_language, tts_speed=tts_speed,
+            tts_pitch=tts_pitch, tts_format=tts_format, tts_sample_rate=tts_sample_rate
+        )
         
         # Return the generated audio with metadata
-        return FileResponse(
-            audio_file,
-            media_type="audio/mp3",
-            filename=f"response_{tts_provider}.mp3",
-            headers={
-                "X-Input-Text": text,
-                "X-Response-Text": response_text,
-                "X-LLM-Provider": llm_provider,
-                "X-TTS-Provider": tts_provider
-            }
-        )
+        text_headers = {
+            "X-Input-Text": text,
+            "X-Response-Text": result["response_text"]
+        }
+        return pipeline_response(result, text_headers, response_format)
     
     except HTTPException:
         logger.exception("Text pipeline failed with HTTPException")
         raise
+    except NoProviderAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception(f"Text pipeline processing failed: {e}")
         raise HTTPException(status_code=500, detail=f"Pipeline processing failed: {str(e)}")
@@ -349,7 +639,7 @@ async def get_pipeline_status():
     }
     
     # Check STT services
-    for name in ["whisper", "google", "azure"]:
+    for name in ["whisper", "google", "azure", "local"]:
         try:
             service = get_stt_service(name)
             if service:
@@ -372,9 +662,15 @@ async def get_pipeline_status():
                 status["llm"][name] = False
         except:
             status["llm"][name] = False
+
+    # Load and health of each Ollama host
+    try:
+        status["ollama_hosts"] = get_llm_service("ollama").host_stats()
+    except:
+        status["ollama_hosts"] = []
     
     # Check TTS services
-    for name in ["google", "elevenlabs", "edge", "gtts"]:
+    for name in ["google", "elevenlabs", "edge", "gtts", "local"]:
         try:
             service = get_tts_service(name)
             if service:
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional, List, Dict, Tuple
+
+from app.utils.sessions import SessionNotFound, get_session_store
+
+router = APIRouter()
+
+async def resolve_session(session_id: Optional[str]) -> Tuple[Optional[str], Optional[List[Dict]]]:
+    """
+    Resolve a `session_id` form field to (session id, stored history).
+
+    Returns (None, None) when no session was requested. "new" starts a fresh
+    session. An unknown or expired id is a 404 so clients can start over.
+    """
+    if not session_id:
+        return None, None
+    store = get_session_store()
+    if session_id == "new":
+        return await store.create(), []
+    try:
+        return session_id, await store.get_messages(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+
+@router.post("")
+async def create_session():
+    """Start a conversation session; send its id as `session_id` with each new turn"""
+    session_id = await get_session_store().create()
+    return {"session_id": session_id}
+
+@router.get("/{session_id}")
+async def get_session(session_id: str):
+    """Get the stored message history of a session"""
+    # Looked up directly: resolve_session would create a session for "new"
+    try:
+        messages = await get_session_store().get_messages(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+    return {"session_id": session_id, "messages": messages}
+
+@router.delete("/{session_id}")
+async def delete_session(session_id: str):
+    """Delete a session and its history"""
+    await get_session_store().delete(session_id)
+    return {"session_id": session_id, "deleted": True}
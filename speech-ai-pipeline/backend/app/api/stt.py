@@ -1,12 +1,20 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
+import shutil
+import tarfile
 import tempfile
 import os
-from typing import Optional
+import time
+import zipfile
+from typing import Dict, List, Optional, Tuple
 
 from app.services.stt.whisper_service import WhisperService
 from app.services.stt.google_service import GoogleSTTService
 from app.services.stt.azure_service import AzureSTTService
+from app.services.stt.local_whisper_service import get_local_whisper_service
+from app.utils.tracing import span, run_in_executor
 
 router = APIRouter()
 
@@ -33,6 +41,36 @@ def get_azure_service():
         azure_service = AzureSTTService()
     return azure_service
 
+def get_stt_service(provider: str):
+    if provider == "whisper":
+        return get_whisper_service()
+    elif provider == "google":
+        return get_google_service()
+    elif provider == "azure":
+        return get_azure_service()
+    elif provider == "local":
+        return get_local_whisper_service()
+    return None
+
+# Concurrent transcriptions per provider across all requests (STT_CONCURRENCY_<PROVIDER>)
+# The local model queues requests into its own micro-batches, so its limit only bounds that queue
+DEFAULT_CONCURRENCY = {"whisper": 4, "google": 8, "azure": 4, "local": 64}
+_provider_limits: Dict[str, asyncio.Semaphore] = {}
+
+def get_provider_limit(provider: str) -> asyncio.Semaphore:
+    if provider not in _provider_limits:
+        limit = int(os.getenv(f"STT_CONCURRENCY_{provider.upper()}", str(DEFAULT_CONCURRENCY.get(provider, 4))))
+        _provider_limits[provider] = asyncio.Semaphore(max(limit, 1))
+    return _provider_limits[provider]
+
+async def transcribe_file(provider: str, path: str, language: Optional[str]) -> Dict:
+    """Transcribe one file, waiting for a free slot under the provider's concurrency limit."""
+    service = get_stt_service(provider)
+    if service is None:
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
+    async with get_provider_limit(provider):
+        return await service.transcribe(path, language)
+
 @router.post("/transcribe")
 async def transcribe_audio(
     audio: UploadFile = File(...),
@@ -43,7 +81,7 @@ async def transcribe_audio(
     Transcribe audio using the specified provider
     
     - **audio**: Audio file (wav, mp3, m4a, etc.)
-    - **provider**: STT provider (whisper, google, azure)
+    - **provider**: STT provider (whisper, google, azure, local)
     - **language**: Language code (default: en-US)
     """
     
@@ -51,21 +89,15 @@ async def transcribe_audio(
         raise HTTPException(status_code=400, detail="File must be an audio file")
     
     # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio.filename.split('.')[-1]}") as temp_file:
-        content = await audio.read()
-        temp_file.write(content)
-        temp_file_path = temp_file.name
+    with span("file.write", kind="upload"):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio.filename.split('.')[-1]}") as temp_file:
+            content = await audio.read()
+            temp_file.write(content)
+            temp_file_path = temp_file.name
     
     try:
         # Route to appropriate service
-        if provider == "whisper":
-            result = await get_whisper_service().transcribe(temp_file_path, language)
-        elif provider == "google":
-            result = await get_google_service().transcribe(temp_file_path, language)
-        elif provider == "azure":
-            result = await get_azure_service().transcribe(temp_file_path, language)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
+        result = await transcribe_file(provider, temp_file_path, language)
         
         return JSONResponse(content={
             "text": result.get("text", ""),
@@ -82,6 +114,136 @@ async def transcribe_audio(
         if os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
 
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".oga", ".opus", ".webm", ".flac", ".aac", ".mp4")
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+BATCH_MAX_FILES = int(os.getenv("STT_BATCH_MAX_FILES", "500"))
+BATCH_MAX_BYTES = int(float(os.getenv("STT_BATCH_MAX_MB", "512")) * 1024 * 1024)
+
+def _is_audio_name(name: str) -> bool:
+    base = os.path.basename(name)
+    return name.lower().endswith(AUDIO_EXTENSIONS) and not base.startswith(".") and "__MACOSX" not in name
+
+def _archive_members(fileobj, filename: str) -> List[Tuple[str, int, object]]:
+    """(name, size, opener) for the audio files in a zip or tar archive."""
+    if filename.lower().endswith(".zip"):
+        archive = zipfile.ZipFile(fileobj)
+        return [(info.filename, info.file_size, lambda info=info: archive.open(info))
+                for info in archive.infolist() if not info.is_dir() and _is_audio_name(info.filename)]
+    archive = tarfile.open(fileobj=fileobj, mode="r:*")
+    return [(member.name, member.size, lambda member=member: archive.extractfile(member))
+            for member in archive.getmembers() if member.isfile() and _is_audio_name(member.name)]
+
+def _unpack_batch(uploads: List[Tuple[str, object]], directory: str) -> List[Tuple[str, str]]:
+    """
+    Write every audio file of the batch to `directory`, expanding archives.
+    Returns (name, path) pairs in upload order; raises HTTPException for
+    unreadable archives or batches over the file count or size limits.
+    """
+    members = []
+    for filename, fileobj in uploads:
+        if filename.lower().endswith(ARCHIVE_EXTENSIONS):
+            try:
+                members.extend(_archive_members(fileobj, filename))
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                raise HTTPException(status_code=400, detail=f"Can't read archive {filename}: {e}")
+        else:
+            fileobj.seek(0, os.SEEK_END)
+            size = fileobj.tell()
+            fileobj.seek(0)
+            members.append((filename, size, lambda fileobj=fileobj: fileobj))
+    if not members:
+        raise HTTPException(status_code=400, detail="No audio files in the upload")
+    if len(members) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"{len(members)} files in the batch, the limit is {BATCH_MAX_FILES}")
+    # Sizes come from the archive headers; copying stops at the limit in case they understate it
+    budget = BATCH_MAX_BYTES
+    if sum(size for _, size, _ in members) > budget:
+        raise HTTPException(status_code=413, detail=f"Batch is larger than {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+    files = []
+    for index, (name, _, opener) in enumerate(members):
+        path = os.path.join(directory, f"{index}{os.path.splitext(name)[1].lower()}")
+        with opener() as source, open(path, "wb") as target:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                budget -= len(chunk)
+                if budget < 0:
+                    raise HTTPException(status_code=413, detail=f"Batch is larger than {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+                target.write(chunk)
+        files.append((name, path))
+    return files
+
+@router.post("/transcribe-batch")
+async def transcribe_batch(
+    files: List[UploadFile] = File(...),
+    provider: str = Form(...),
+    language: Optional[str] = Form("en-US")
+):
+    """
+    Transcribe many audio files, streaming one NDJSON line per file as it finishes
+
+    - **files**: Audio files, and/or zip or tar archives of audio files
+    - **provider**: STT provider (whisper, google, azure, local)
+    - **language**: Language code (default: en-US)
+
+    Lines are `{"index", "file", "text", "confidence", "provider", "language", "duration_ms"}`
+    (or `"error"` instead of the transcript), in completion order; `index` is the
+    file's position in the batch. The last line is a summary with `"done": true`.
+    Files run concurrently up to the provider's STT_CONCURRENCY_<PROVIDER> limit.
+    """
+    if get_stt_service(provider) is None:
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
+    for upload in files:
+        name = (upload.filename or "").lower()
+        is_audio = (upload.content_type or "").startswith("audio/") or name.endswith(AUDIO_EXTENSIONS)
+        if not is_audio and not name.endswith(ARCHIVE_EXTENSIONS):
+            raise HTTPException(status_code=400, detail=f"{upload.filename} is not an audio file or archive")
+
+    directory = tempfile.mkdtemp(prefix="stt_batch_")
+    try:
+        with span("file.write", kind="batch_upload", uploads=len(files)):
+            batch = await run_in_executor(_unpack_batch, [(upload.filename or "audio", upload.file) for upload in files], directory)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    async def transcribe_one(index: int, name: str, path: str) -> Dict:
+        start = time.perf_counter()
+        line = {"index": index, "file": name}
+        try:
+            result = await transcribe_file(provider, path, language)
+            line.update(text=result.get("text", ""), confidence=result.get("confidence", 0.0),
+                        provider=provider, language=language)
+        except Exception as e:
+            line.update(error=f"Transcription failed: {str(e)}", provider=provider)
+        line["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return line
+
+    async def stream():
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(transcribe_one(index, name, path)) for index, (name, path) in enumerate(batch)]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                failed += "error" in line
+                yield json.dumps(line) + "\n"
+            yield json.dumps({
+                "done": True,
+                "files": len(batch),
+                "succeeded": len(batch) - failed,
+                "failed": failed,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }) + "\n"
+        finally:
+            # Also reached when the client disconnects mid-stream
+            for task in tasks:
+                task.cancel()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @router.get("/providers")
 async def get_stt_providers():
     """Get available STT providers and their capabilities"""
@@ -104,6 +266,12 @@ async def get_stt_providers():
                 "display_name": "Azure Speech Services",
                 "languages": ["en-US", "es-ES", "fr-FR", "de-DE", "it-IT", "pt-BR", "zh-CN", "ja-JP"],
                 "description": "Microsoft Azure Speech Services"
+            },
+            {
+                "name": "local",
+                "display_name": "Local Whisper (CPU)",
+                "languages": ["auto-detect"],
+                "description": "Quantized Whisper model running on this server, no API calls"
             }
         ]
     } 
\ No newline at end of file
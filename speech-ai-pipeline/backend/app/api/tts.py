@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Form, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, Form, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse, Response
 from typing import Optional
 import tempfile
 import os
@@ -8,10 +8,16 @@ from app.services.tts.google_service import GoogleTTSService
 from app.services.tts.elevenlabs_service import ElevenLabsService
 from app.services.tts.edge_service import EdgeTTSService
 from app.services.tts.gtts_service import GTTSService
+from app.services.tts.local_service import get_local_tts_service
+from app.api.pipeline import call_tts, cached_tts_audio, check_output_format, store_tts_audio, tts_audio_cache_key
+from app.utils.audio import EXTENSIONS, audio_format, media_type
 from app.utils.text_utils import strip_all_markup
+from app.utils.voice_catalog import get_voice_catalog
 
 router = APIRouter()
 
+MAX_VOICES_PAGE = 500
+
 # Initialize services lazily
 google_service = None
 elevenlabs_service = None
@@ -42,6 +48,14 @@ def get_gtts_service():
         gtts_service = GTTSService()
     return gtts_service
 
+SERVICE_GETTERS = {
+    "google": get_google_service,
+    "elevenlabs": get_elevenlabs_service,
+    "edge": get_edge_service,
+    "gtts": get_gtts_service,
+    "local": get_local_tts_service,
+}
+
 @router.post("/synthesize")
 async def synthesize_speech(
     text: str = Form(...),
@@ -49,65 +63,64 @@ async def synthesize_speech(
     voice: Optional[str] = Form(None),
     language: Optional[str] = Form("en-US"),
     speed: Optional[float] = Form(1.0),
-    pitch: Optional[float] = Form(0.0)
+    pitch: Optional[float] = Form(0.0),
+    output_format: Optional[str] = Form(None, alias="format"),
+    sample_rate: Optional[int] = Form(None)
 ):
     """
     Synthesize speech from text using the specified provider
     
     - **text**: Text to convert to speech
-    - **provider**: TTS provider (google, elevenlabs, edge, gtts)
+    - **provider**: TTS provider (google, elevenlabs, edge, gtts, local)
     - **voice**: Voice ID/name (provider-specific)
     - **language**: Language code (e.g., 'en-US')
     - **speed**: Speech speed (0.5-2.0)
     - **pitch**: Voice pitch (-20.0 to 20.0)
+    - **format**: Audio format (mp3, opus, wav or pcm; default the provider's own), produced by the
+      provider where it can and transcoded otherwise
+    - **sample_rate**: Sample rate in Hz for **format** (pcm defaults to 16000)
     """
     
     if not text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
+    output_format, sample_rate = check_output_format(output_format, sample_rate)
     
     try:
-        # Route to appropriate service
         safe_text = strip_all_markup(text)
-        if provider == "google":
-            audio_file = await get_google_service().synthesize(
-                text=safe_text,
-                voice=voice,
-                language=language,
-                speed=speed,
-                pitch=pitch
-            )
-        elif provider == "elevenlabs":
-            audio_file = await get_elevenlabs_service().synthesize(
-                text=safe_text,
-                voice=voice,
-                language=language,
-                speed=speed
-            )
-        elif provider == "edge":
-            audio_file = await get_edge_service().synthesize(
-                text=safe_text,
-                voice=voice,
-                language=language,
-                speed=speed,
-                pitch=pitch
+        tts_key = tts_audio_cache_key(provider, voice, language, speed, pitch, safe_text, output_format, sample_rate)
+        cached = await cached_tts_audio(tts_key)
+        if cached:
+            audio = cached[1]
+            fmt = output_format or audio_format(audio)
+            return Response(
+                audio,
+                media_type=media_type(fmt, sample_rate),
+                headers={
+                    "X-Provider": provider,
+                    "X-TTS-Cache": "hit",
+                    "Content-Disposition": f'attachment; filename="speech_{provider}.{EXTENSIONS[fmt]}"',
+                }
             )
-        elif provider == "gtts":
-            audio_file = await get_gtts_service().synthesize(
-                text=safe_text,
-                language=language,
-                speed=speed
-            )
-        else:
+
+        # Route to appropriate service
+        get_service = SERVICE_GETTERS.get(provider)
+        if get_service is None:
             raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
+        audio_file = await call_tts(provider, get_service(), safe_text, voice, language, speed, pitch,
+                                    output_format, sample_rate)
+        await store_tts_audio(tts_key, provider, audio_file)
         
         # Return the audio file
+        fmt = output_format or audio_format(audio_file)
         return FileResponse(
             audio_file,
-            media_type="audio/mpeg",
-            filename=f"speech_{provider}.mp3",
+            media_type=media_type(fmt, sample_rate),
+            filename=f"speech_{provider}.{EXTENSIONS[fmt]}",
             headers={"X-Provider": provider}
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {str(e)}")
 
@@ -165,21 +178,39 @@ async def get_tts_providers():
     }
 
 @router.get("/voices/{provider}")
-async def get_provider_voices(provider: str, language: Optional[str] = "en-US"):
-    """Get available voices for a specific provider"""
+async def get_provider_voices(
+    provider: str,
+    language: Optional[str] = "en-US",
+    gender: Optional[str] = None,
+    name: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_VOICES_PAGE)
+):
+    """
+    Get a page of a provider's voices from the voice catalog
+
+    - **language**: Full locale ('en-US') or language ('en'); empty for every language
+    - **gender**: female, male or neutral
+    - **name**: Voice name or id (exact, case-insensitive); ignores the other filters
+    - **offset** / **limit**: Page of the matching voices; `total` is the number of matches
+    """
+    get_service = SERVICE_GETTERS.get(provider)
+    if get_service is None:
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
+    service = get_service()
     try:
-        if provider == "google":
-            voices = await get_google_service().get_voices(language)
-        elif provider == "elevenlabs":
-            voices = await get_elevenlabs_service().get_voices()
-        elif provider == "edge":
-            voices = await get_edge_service().get_voices(language)
-        elif provider == "gtts":
-            voices = await get_gtts_service().get_voices(language)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
-        
-        return {"provider": provider, "voices": voices}
-    
+        index = await get_voice_catalog().index(provider, service.list_voices, getattr(service, "FALLBACK_VOICES", None))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get voices: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get voices: {str(e)}")
+    if name:
+        voice = index.get(name)
+        voices = [voice] if voice else []
+    else:
+        voices = index.search(language, gender)
+    return {
+        "provider": provider,
+        "voices": voices[offset:offset + limit],
+        "total": len(voices),
+        "offset": offset,
+        "limit": limit,
+    }
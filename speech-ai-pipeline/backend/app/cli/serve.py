@@ -0,0 +1,130 @@
+"""
+Pre-fork server: one parent process imports the app and every SDK, loads
+static data (tokenizer tables, local TTS voices, local STT model files, see
+`app.utils.prefork.preload`) and then forks the workers, which share those
+pages copy-on-write instead of each importing and loading them again.
+
+    python -m app.cli.serve --workers 4 --host 0.0.0.0 --port 8000
+
+Workers accept connections from one listening socket opened by the parent.
+Network clients (gRPC channels, HTTP connection pools) are only created
+inside the workers. A worker that dies is restarted; SIGTERM or SIGINT to the
+parent shuts all of them down gracefully.
+
+Unlike `uvicorn --workers`, which starts every worker with a fresh
+interpreter, this needs a platform with fork() (Linux, macOS).
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+logger = logging.getLogger("prefork")
+
+RESTART_DELAY_S = 1.0
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, sock, workers: int):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.children: Dict[int, int] = {}
+        self.stopping = False
+
+    def spawn(self, worker: int) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = worker
+            return
+        # Worker: its own process group, so a terminal's Ctrl+C reaches only the
+        # parent, which passes it on once
+        code = 1
+        try:
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            from app.utils import prefork
+            prefork.after_fork(worker)
+            uvicorn.Server(self.config).run(sockets=[self.sock])
+            code = 0
+        except BaseException:
+            logger.exception(f"Worker {worker} crashed")
+        finally:
+            os._exit(code)
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for worker in range(self.workers):
+            self.spawn(worker)
+        logger.info(f"Started {self.workers} workers: {', '.join(map(str, self.children))}")
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker = self.children.pop(pid, None)
+            if worker is None or self.stopping:
+                continue
+            logger.warning(f"Worker {worker} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}; restarting")
+            time.sleep(RESTART_DELAY_S)
+            if not self.stopping:
+                self.spawn(worker)
+        self.sock.close()
+        return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or (os.cpu_count() or 1),
+                        help="worker processes (default WEB_CONCURRENCY, else one per core)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if not hasattr(os, "fork"):
+        print("error: pre-fork serving needs fork(); use `uvicorn --workers` on this platform", file=sys.stderr)
+        return 2
+    args = parse_args(argv)
+    # No collections while loading, so the shared objects are packed together
+    # instead of around freed holes that the workers would later fill (and copy)
+    gc.disable()
+    start = time.perf_counter()
+    from app.main import app
+    from app.utils import prefork
+    imported_s = time.perf_counter() - start
+    report = prefork.preload()
+
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level, lifespan="on")
+    config.load()
+    sock = config.bind_socket()
+    logger.info(f"Imported the app in {imported_s:.2f}s and preloaded in {report['preload_s']:.2f}s: "
+                f"{report['modules']} SDK modules, encodings {report['encodings'] or 'none'}, "
+                f"local TTS voices {report['local_tts_voices'] or 'none'}, "
+                f"local STT model {report['local_stt_model'] or 'none'}")
+    # Move everything loaded so far out of the collector's reach: the workers'
+    # collections would otherwise write to (and so copy) every shared object
+    gc.freeze()
+    return Supervisor(config, sock, args.workers).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Offline bulk speech synthesis from a CSV or JSONL manifest.
+
+Each manifest row is one item with a `text` and optionally `id`, `provider`,
+`voice`, `language`, `speed`, `pitch`, `format`, `sample_rate` and `output`
+(file name inside the output directory, default `<id>.<format>`, where the
+format defaults to the provider's own: MP3, or WAV for `local`); missing
+fields come from the command line. Items run concurrently with a separate limit per provider:
+
+    python -m app.cli.tts_batch prompts.csv --out ivr/ --provider google \\
+        --concurrency google=8,elevenlabs=2
+
+Finished items are recorded in `<out>/.tts_batch_state.jsonl`, so re-running
+the same command skips them and only synthesizes what is new, changed or
+failed. Outputs are written to a temporary file and renamed into place, so an
+interrupted run never leaves a truncated file under its final name.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional
+
+from app.api.pipeline import call_tts
+from app.services.tts.edge_service import EdgeTTSService
+from app.services.tts.elevenlabs_service import ElevenLabsService
+from app.services.tts.google_service import GoogleTTSService
+from app.services.tts.gtts_service import GTTSService
+from app.services.tts.local_service import LocalTTSService
+from app.utils.audio import EXTENSIONS, OUTPUT_FORMATS, check_output
+from app.utils.text_utils import strip_all_markup
+from app.utils.tracing import run_in_executor
+
+logger = logging.getLogger("tts_batch")
+
+SERVICE_CLASSES = {
+    "google": GoogleTTSService,
+    "elevenlabs": ElevenLabsService,
+    "edge": EdgeTTSService,
+    "gtts": GTTSService,
+    "local": LocalTTSService,
+}
+
+# Concurrent requests per provider unless overridden with --concurrency
+# (the local provider already spreads each item's sentences over every core)
+DEFAULT_CONCURRENCY = {"google": 8, "elevenlabs": 2, "edge": 8, "gtts": 2, "local": 2}
+
+STATE_FILE = ".tts_batch_state.jsonl"
+
+ITEM_FIELDS = ("id", "text", "provider", "voice", "language", "speed", "pitch", "format", "sample_rate", "output")
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def read_manifest(path: str) -> List[Dict]:
+    """Rows of a CSV (with a header line) or JSONL manifest, as dicts."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return [dict(row) for row in csv.DictReader(f)]
+        rows = []
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ManifestError(f"{path}:{number}: invalid JSON ({e})")
+        return rows
+
+
+def build_items(rows: List[Dict], defaults: Dict) -> List[Dict]:
+    """Fill in defaults, validate, and give every item an id, output name and checkpoint key."""
+    items = []
+    seen = set()
+    # Normalized output path → id of the item writing it
+    outputs: Dict[str, str] = {}
+    for number, row in enumerate(rows, 1):
+        item = dict(defaults)
+        item.update({key: value for key, value in row.items() if key in ITEM_FIELDS and value not in (None, "")})
+        item["id"] = str(item.get("id") or f"{number:06d}")
+        if not str(item.get("text") or "").strip():
+            raise ManifestError(f"Item {item['id']} (row {number}) has no text")
+        if item.get("provider") not in SERVICE_CLASSES:
+            raise ManifestError(f"Item {item['id']} (row {number}): unknown provider {item.get('provider')!r}, "
+                                f"use one of {', '.join(SERVICE_CLASSES)} or pass --provider")
+        if item["id"] in seen:
+            raise ManifestError(f"Duplicate item id {item['id']} (row {number})")
+        seen.add(item["id"])
+        speed, pitch = item.get("speed"), item.get("pitch")
+        try:
+            item["speed"] = float(speed or 1.0)
+            item["pitch"] = float(pitch or 0.0)
+        except (TypeError, ValueError):
+            raise ManifestError(f"Item {item['id']} (row {number}): speed and pitch must be numbers, "
+                                f"got {speed!r} and {pitch!r}")
+        try:
+            item["format"], item["sample_rate"] = check_output(
+                item.get("format"), int(item["sample_rate"]) if item.get("sample_rate") else None)
+        except ValueError as e:
+            raise ManifestError(f"Item {item['id']} (row {number}): {e}")
+        extension = EXTENSIONS[item["format"]] if item["format"] else "wav" if item["provider"] == "local" else "mp3"
+        output = item.get("output") or f"{item['id']}.{extension}"
+        if os.path.isabs(output) or ".." in output.replace("\\", "/").split("/"):
+            raise ManifestError(f"Item {item['id']}: output {output!r} must be a relative path inside --out")
+        target = os.path.normpath(output.replace("\\", "/"))
+        if target in outputs:
+            raise ManifestError(f"Items {outputs[target]} and {item['id']} (row {number}) both write {output!r}")
+        outputs[target] = item["id"]
+        item["output"] = output
+        # Any change to what would be synthesized invalidates the checkpoint entry
+        key_fields = {field: item.get(field) for field in ("text", "provider", "voice", "language", "speed", "pitch")}
+        if item["format"]:
+            key_fields.update(format=item["format"], sample_rate=item["sample_rate"])
+        item["key"] = hashlib.sha1(json.dumps(key_fields, sort_keys=True).encode("utf-8")).hexdigest()
+        items.append(item)
+    return items
+
+
+def parse_concurrency(spec: Optional[str]) -> Dict[str, int]:
+    limits = dict(DEFAULT_CONCURRENCY)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        provider, _, value = part.partition("=")
+        if provider.strip() not in SERVICE_CLASSES or not value.strip().isdigit() or int(value) < 1:
+            raise ManifestError(f"Invalid --concurrency entry {part!r}, expected provider=N")
+        limits[provider.strip()] = int(value)
+    return limits
+
+
+class Checkpoint:
+    """Append-only record of finished items; the last entry for an id wins."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write can leave a partial last line
+                        continue
+                    self.done[entry["id"]] = entry["key"]
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, item: Dict, out_dir: str) -> bool:
+        return self.done.get(item["id"]) == item["key"] and os.path.exists(os.path.join(out_dir, item["output"]))
+
+    def record(self, item: Dict, size: int, elapsed_s: float) -> None:
+        entry = {"id": item["id"], "key": item["key"], "output": item["output"], "bytes": size,
+                 "elapsed_s": round(elapsed_s, 3), "finished_at": time.time()}
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done[item["id"]] = item["key"]
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _store_output(audio_file: str, final_path: str) -> int:
+    """Move the provider's temp file into place atomically and return its size."""
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    partial = f"{final_path}.part"
+    shutil.move(audio_file, partial)
+    with open(partial, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(partial, final_path)
+    return os.path.getsize(final_path)
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100.0 * (len(ordered) - 1))))]
+
+
+class BatchSynthesizer:
+    def __init__(self, out_dir: str, concurrency: Dict[str, int], retries: int = 2, force: bool = False):
+        self.out_dir = out_dir
+        self.concurrency = concurrency
+        self.retries = retries
+        self.force = force
+        self._services: Dict[str, object] = {}
+        self.stats = {"items": 0, "skipped": 0, "succeeded": 0, "failed": 0, "retries": 0, "chars": 0, "bytes": 0}
+        self.latencies: Dict[str, List[float]] = {}
+        self.failures: List[Dict] = []
+
+    def get_service(self, provider: str):
+        if provider not in self._services:
+            self._services[provider] = SERVICE_CLASSES[provider]()
+        return self._services[provider]
+
+    async def synthesize(self, item: Dict, checkpoint: Checkpoint) -> None:
+        text = strip_all_markup(item["text"])
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                audio_file = await call_tts(item["provider"], self.get_service(item["provider"]), text, item.get("voice"),
+                                            item.get("language") or "en-US", item["speed"], item["pitch"],
+                                            item["format"], item["sample_rate"])
+                size = await run_in_executor(_store_output, audio_file, os.path.join(self.out_dir, item["output"]))
+            except Exception as e:
+                if attempt < self.retries:
+                    self.stats["retries"] += 1
+                    logger.warning(f"{item['id']}: {e}; retrying ({attempt + 1}/{self.retries})")
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                self.stats["failed"] += 1
+                self.failures.append({"id": item["id"], "provider": item["provider"], "error": str(e)})
+                logger.error(f"{item['id']}: failed after {attempt + 1} attempt(s): {e}")
+                return
+            elapsed = time.perf_counter() - start
+            checkpoint.record(item, size, elapsed)
+            self.latencies.setdefault(item["provider"], []).append(elapsed)
+            self.stats["succeeded"] += 1
+            self.stats["chars"] += len(text)
+            self.stats["bytes"] += size
+            return
+
+    async def _worker(self, queue: asyncio.Queue, checkpoint: Checkpoint) -> None:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self.synthesize(item, checkpoint)
+
+    async def _report_progress(self, interval_s: float) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            done = self.stats["succeeded"] + self.stats["failed"]
+            pending = self.stats["items"] - self.stats["skipped"]
+            logger.info(f"Progress: {done}/{pending} items ({self.stats['failed']} failed)")
+
+    async def run(self, items: List[Dict], progress_interval_s: float = 10.0) -> Dict:
+        os.makedirs(self.out_dir, exist_ok=True)
+        checkpoint = Checkpoint(os.path.join(self.out_dir, STATE_FILE))
+        self.stats["items"] = len(items)
+        queues: Dict[str, asyncio.Queue] = {}
+        for item in items:
+            if not self.force and checkpoint.is_done(item, self.out_dir):
+                self.stats["skipped"] += 1
+                continue
+            queues.setdefault(item["provider"], asyncio.Queue()).put_nowait(item)
+
+        start = time.perf_counter()
+        progress = asyncio.get_running_loop().create_task(self._report_progress(progress_interval_s))
+        try:
+            # One pool of workers per provider, so a slow provider can't hold up the others
+            await asyncio.gather(*(
+                self._worker(queue, checkpoint)
+                for provider, queue in queues.items()
+                for _ in range(min(self.concurrency[provider], queue.qsize()))
+            ))
+        finally:
+            progress.cancel()
+            checkpoint.close()
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, elapsed_s: float) -> Dict:
+        elapsed_s = max(elapsed_s, 1e-9)
+        providers = {}
+        for provider, latencies in sorted(self.latencies.items()):
+            providers[provider] = {
+                "items": len(latencies),
+                "failed": sum(1 for failure in self.failures if failure["provider"] == provider),
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+                "items_per_s": round(len(latencies) / elapsed_s, 2),
+            }
+        return {
+            **self.stats,
+            "elapsed_s": round(elapsed_s, 2),
+            "items_per_s": round(self.stats["succeeded"] / elapsed_s, 2),
+            "chars_per_s": round(self.stats["chars"] / elapsed_s, 1),
+            "mb_per_s": round(self.stats["bytes"] / 1024 / 1024 / elapsed_s, 3),
+            "providers": providers,
+            "failures": self.failures,
+        }
+
+
+def print_summary(summary: Dict) -> None:
+    print(f"{summary['items']} items: {summary['succeeded']} synthesized, {summary['skipped']} already done, "
+          f"{summary['failed']} failed ({summary['retries']} retries) in {summary['elapsed_s']:.1f}s")
+    print(f"Throughput: {summary['items_per_s']:.2f} items/s, {summary['chars_per_s']:.0f} chars/s, "
+          f"{summary['mb_per_s']:.2f} MB/s of audio")
+    for provider, stats in summary["providers"].items():
+        print(f"  {provider:<11} {stats['items']:>6} items  {stats['items_per_s']:>7.2f}/s  "
+              f"mean {stats['mean_ms']:.0f} ms  p50 {stats['p50_ms']:.0f} ms  p95 {stats['p95_ms']:.0f} ms")
+    for failure in summary["failures"][:20]:
+        print(f"  FAILED {failure['id']} ({failure['provider']}): {failure['error']}")
+    if len(summary["failures"]) > 20:
+        print(f"  ... and {len(summary['failures']) - 20} more")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Synthesize every item of a CSV or JSONL manifest to audio files")
+    parser.add_argument("manifest", help="CSV (with a header row) or JSONL file of items")
+    parser.add_argument("--out", required=True, help="output directory; also holds the checkpoint file")
+    parser.add_argument("--provider", choices=sorted(SERVICE_CLASSES), help="provider for items that don't name one")
+    parser.add_argument("--voice", help="voice for items that don't name one")
+    parser.add_argument("--language", default="en-US")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--pitch", type=float, default=0.0)
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS,
+                        help="audio format for items that don't name one (default: the provider's own)")
+    parser.add_argument("--sample-rate", type=int, help="sample rate in Hz for --format")
+    parser.add_argument("--concurrency", help="per-provider limits, e.g. google=8,elevenlabs=2 "
+                                              f"(default {','.join(f'{k}={v}' for k, v in DEFAULT_CONCURRENCY.items())})")
+    parser.add_argument("--retries", type=int, default=2, help="retries per item before it counts as failed")
+    parser.add_argument("--force", action="store_true", help="ignore the checkpoint and synthesize every item")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="seconds between progress log lines")
+    parser.add_argument("--json", dest="json_output", help="also write the summary to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    defaults = {"provider": args.provider, "voice": args.voice, "language": args.language,
+                "speed": args.speed, "pitch": args.pitch, "format": args.output_format, "sample_rate": args.sample_rate}
+    try:
+        items = build_items(read_manifest(args.manifest), defaults)
+        concurrency = parse_concurrency(args.concurrency)
+    except (OSError, ManifestError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    synthesizer = BatchSynthesizer(args.out, concurrency, retries=args.retries, force=args.force)
+    summary = asyncio.run(synthesizer.run(items, progress_interval_s=args.progress_interval))
+    print_summary(summary)
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,9 +6,23 @@ from dotenv import load_dotenv
 import logging
 import sys
 import time
-import uuid
 
-from app.api import stt, llm, tts, pipeline
+from app.api import stt, llm, tts, pipeline, sessions, jobs
+from app.utils import tracing
+from app.utils.monitor import runtime_monitor
+from app.utils import profiling
+from app.utils import prefork
+from app.utils.sessions import get_session_store
+from app.utils.context_window import get_context_window
+from app.utils.prompt_cache import prompt_cache_stats
+from app.utils.semantic_cache import get_semantic_cache
+from app.utils.cache_backend import cache_stats
+from app.utils.voice_catalog import get_voice_catalog
+from app.utils.routing import get_router
+from app.utils.degradation import get_degradation_policy
+from app.services.stt.local_whisper_service import get_local_whisper_service, local_stt_stats
+from app.services.tts.local_service import get_local_tts_service
+from app.services.llm.ollama_service import get_ollama_service
 
 # Load environment variables
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -19,8 +33,10 @@ log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
     level=getattr(logging, log_level, logging.INFO),
     stream=sys.stdout,
-    format="%(asctime)s %(levelname)s %(name)s - %(message)s",
+    format="%(asctime)s %(levelname)s %(name)s [%(trace_id)s] - %(message)s",
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(tracing.TraceIdFilter())
 logger = logging.getLogger("app")
 
 # Normalize GOOGLE_APPLICATION_CREDENTIALS to absolute path if provided relatively
@@ -60,26 +76,91 @@ app.add_middleware(
 
 @app.middleware("http")
 async def request_logging_middleware(request, call_next):
-    request_id = str(uuid.uuid4())
+    request_id = tracing.trace_id_from_header(request.headers.get("X-Trace-Id"))
     setattr(request.state, "request_id", request_id)
+    trace_token = tracing.start_trace(request_id)
+    router = runtime_monitor.request_started(request.url.path)
+    profile = None
+    if profiling.PROFILE_TOKEN and profiling.profiling_requested(request):
+        profile = profiling.RequestProfile(request_id, f"{request.method} {request.url.path}")
     start = time.time()
-    logger.info(f"[{request_id}] → {request.method} {request.url.path}")
+    logger.info(f"→ {request.method} {request.url.path}")
     try:
-        response = await call_next(request)
+        if profile is not None:
+            profile.start()
+        with tracing.span("http.request", method=request.method, path=request.url.path) as root:
+            response = await call_next(request)
+            root.set_attribute("status_code", response.status_code)
         duration_ms = int((time.time() - start) * 1000)
         response.headers["X-Trace-Id"] = request_id
-        logger.info(f"[{request_id}] ← {response.status_code} {request.url.path} ({duration_ms}ms)")
+        if profile is not None:
+            response.headers["X-Profile-Id"] = request_id
+        logger.info(f"← {response.status_code} {request.url.path} ({duration_ms}ms)")
         return response
     except Exception as e:
         duration_ms = int((time.time() - start) * 1000)
-        logger.exception(f"[{request_id}] ✖ Unhandled error after {duration_ms}ms: {e}")
+        logger.exception(f"✖ Unhandled error after {duration_ms}ms: {e}")
         return JSONResponse(status_code=500, content={"detail": "Internal Server Error", "trace_id": request_id}, headers={"X-Trace-Id": request_id})
+    finally:
+        if profile is not None:
+            try:
+                await tracing.run_in_executor(profile.stop)
+            except Exception as e:
+                logger.warning(f"Failed to write profile: {e}")
+        runtime_monitor.request_finished(router, time.time() - start)
+        tracing.end_trace(trace_token)
+
+@app.on_event("startup")
+async def start_runtime_monitor():
+    runtime_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_runtime_monitor():
+    await runtime_monitor.stop()
+
+@app.on_event("startup")
+async def start_job_workers():
+    await jobs.get_job_queue().start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # Jobs still running are handed back to the queue and resume on the next start
+    await jobs.get_job_queue().stop()
+
+@app.on_event("startup")
+async def preload_local_stt():
+    # Load the local STT model before the first request instead of during it
+    if os.getenv("LOCAL_STT_PRELOAD", "off").lower() in ("1", "on", "true", "yes"):
+        service = get_local_whisper_service()
+        if service.is_available():
+            await tracing.run_in_executor(service.load_model)
+
+@app.on_event("startup")
+async def preload_local_tts_voices():
+    service = get_local_tts_service()
+    if service.is_available():
+        try:
+            await tracing.run_in_executor(service.load_voices)
+        except Exception as e:
+            logger.warning(f"Preloading local TTS voices failed: {e}")
+
+@app.on_event("startup")
+async def preload_ollama_models():
+    # In the background: loading a model takes seconds and other providers can serve meanwhile
+    get_ollama_service().start_preload()
+
+@app.on_event("startup")
+async def mark_worker_ready():
+    # Registered last: boot time includes the other startup hooks
+    prefork.mark_ready()
 
 # Include routers
 app.include_router(stt.router, prefix="/api/stt", tags=["Speech-to-Text"])
 app.include_router(llm.router, prefix="/api/llm", tags=["Language Models"])
 app.include_router(tts.router, prefix="/api/tts", tags=["Text-to-Speech"])
 app.include_router(pipeline.router, prefix="/api/pipeline", tags=["Full Pipeline"])
+app.include_router(sessions.router, prefix="/api/sessions", tags=["Sessions"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 
 @app.get("/")
 async def root():
@@ -89,6 +170,25 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def runtime_metrics():
+    """Runtime metrics: event-loop lag, default executor saturation, in-flight requests, sessions, context trimming, response caches (semantic and shared), voice catalog, provider routing, degradation, background jobs, local STT batching, Ollama model residency and this worker process"""
+    return {
+        "runtime": runtime_monitor.snapshot(),
+        "process": prefork.process_stats(),
+        "sessions": get_session_store().stats(),
+        "context": get_context_window().stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "semantic_cache": get_semantic_cache().stats() if get_semantic_cache() else None,
+        "cache": cache_stats(),
+        "voices": get_voice_catalog().stats(),
+        "routing": get_router().stats(),
+        "degradation": get_degradation_policy().stats(),
+        "jobs": await jobs.get_job_queue().stats(),
+        "local_stt": local_stt_stats(),
+        "ollama": get_ollama_service().stats(),
+    }
+
 @app.get("/api/providers")
 async def get_providers():
     """Get available providers for each service"""
@@ -111,6 +211,12 @@ async def get_providers():
                 "display_name": "Azure Speech Services",
                 "languages": ["en-US", "es-ES", "fr-FR", "de-DE", "it-IT", "pt-BR", "ja-JP", "ko-KR", "zh-CN"],
                 "description": "Microsoft's speech recognition"
+            },
+            {
+                "name": "local",
+                "display_name": "Local Whisper (CPU)",
+                "languages": ["en-US", "es-ES", "fr-FR", "de-DE", "it-IT", "pt-BR", "ja-JP", "ko-KR", "zh-CN"],
+                "description": "Quantized Whisper model on this server, no API fees"
             }
         ],
         "llm": [
@@ -131,8 +237,8 @@ async def get_providers():
             {
                 "name": "ollama",
                 "display_name": "Ollama (Local)",
-                "models": ["llama2", "mistral", "codellama", "neural-chat"],
-                "default_model": "llama2",
+                "models": get_ollama_service().models,
+                "default_model": get_ollama_service().default_model,
                 "description": "Local models via Ollama"
             }
         ],
@@ -164,6 +270,13 @@ async def get_providers():
                 "voices": [],
                 "languages": ["en-US", "es-ES", "fr-FR", "de-DE", "it-IT", "pt-BR", "ja-JP", "ko-KR", "zh-CN"],
                 "description": "Free basic voice synthesis"
+            },
+            {
+                "name": "local",
+                "display_name": "Local Piper TTS (CPU)",
+                "voices": get_local_tts_service().available_voices(),
+                "languages": ["en-US", "es-ES", "fr-FR", "de-DE", "it-IT", "pt-BR", "ja-JP", "ko-KR", "zh-CN"],
+                "description": "Offline neural voices on this server"
             }
         ]
     } 
\ No newline at end of file
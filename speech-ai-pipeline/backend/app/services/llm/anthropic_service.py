@@ -1,7 +1,10 @@
 import os
 from anthropic import Anthropic
 from typing import Dict, Optional, List
-import asyncio
+
+from app.utils.tracing import span, run_in_executor
+from app.utils.context_window import fit_context, record_prompt_tokens
+from app.utils.prompt_cache import anthropic_request, anthropic_usage, record_usage
 
 class AnthropicService:
     def __init__(self):
@@ -50,12 +53,15 @@ class AnthropicService:
             raise Exception("Anthropic API key not configured")
         
         try:
+            # Only the system prompt is stable across calls, so it is the one cache breakpoint
+            system, _ = anthropic_request([system_prompt], [])
+            
             def _generate():
                 message = self.client.messages.create(
                     model=self._resolve_model(model),
                     max_tokens=max_tokens,
                     temperature=temperature,
-                    system=system_prompt,
+                    system=system,
                     messages=[
                         {"role": "user", "content": text}
                     ]
@@ -63,13 +69,17 @@ class AnthropicService:
                 return message
             
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, _generate)
+            with span("provider.anthropic.generate", model=self._resolve_model(model)) as provider_span:
+                response = await run_in_executor(_generate)
+                usage = anthropic_usage(response.usage)
+                provider_span.set_attribute("cached_tokens", usage["cached_tokens"])
+            record_usage("anthropic", usage)
             
             return {
                 "response": response.content[0].text if response.content else "",
                 "model": response.model,
-                "tokens_used": response.usage.output_tokens + response.usage.input_tokens if response.usage else 0,
+                "tokens_used": usage["prompt_tokens"] + usage["completion_tokens"],
+                "tokens_details": usage,
                 "finish_reason": response.stop_reason or "completed"
             }
         
@@ -90,34 +100,45 @@ class AnthropicService:
             raise Exception("Anthropic API key not configured")
         
         try:
-            # Convert messages format for Anthropic
-            system_message = ""
+            resolved_model = self._resolve_model(model)
+            messages, context = fit_context(messages, "anthropic", resolved_model, max_tokens)
+            
+            # Convert messages format for Anthropic (system messages, including a
+            # context roll-up, become system blocks)
+            system_parts = []
             claude_messages = []
             
             for msg in messages:
                 if msg["role"] == "system":
-                    system_message = msg["content"]
+                    system_parts.append(msg["content"])
                 else:
                     claude_messages.append(msg)
+            system, claude_messages = anthropic_request(system_parts or ["You are a helpful AI assistant."], claude_messages)
             
             def _chat():
                 message = self.client.messages.create(
-                    model=self._resolve_model(model),
+                    model=resolved_model,
                     max_tokens=max_tokens,
                     temperature=temperature,
-                    system=system_message or "You are a helpful AI assistant.",
+                    system=system,
                     messages=claude_messages
                 )
                 return message
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, _chat)
+            with span("provider.anthropic.chat", model=resolved_model, messages=len(claude_messages)) as provider_span:
+                response = await run_in_executor(_chat)
+                usage = anthropic_usage(response.usage)
+                provider_span.set_attribute("cached_tokens", usage["cached_tokens"])
+            record_usage("anthropic", usage)
+            record_prompt_tokens("anthropic", resolved_model, context, usage["prompt_tokens"])
             
             return {
                 "response": response.content[0].text if response.content else "",
                 "model": response.model,
-                "tokens_used": response.usage.output_tokens + response.usage.input_tokens if response.usage else 0,
-                "finish_reason": response.stop_reason or "completed"
+                "tokens_used": usage["prompt_tokens"] + usage["completion_tokens"],
+                "tokens_details": usage,
+                "finish_reason": response.stop_reason or "completed",
+                "context": context
             }
         
         except Exception as e:
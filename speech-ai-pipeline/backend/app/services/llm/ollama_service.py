@@ -1,13 +1,343 @@
 import os
-import httpx
-from typing import Dict, Optional, List
+import re
+import time
 import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, List, Set, Tuple, Union
+
+import httpx
+
+from app.utils.tracing import span
+from app.utils.context_window import fit_context, record_prompt_tokens
+from app.utils.prompt_cache import ollama_usage, record_usage
+
+logger = logging.getLogger("ollama")
+
+# Ollama unloads a model this long after its last request unless told otherwise
+OLLAMA_DEFAULT_KEEP_ALIVE_S = 300.0
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_FULL_RE = re.compile(r"(?:\d+(?:\.\d+)?(?:ms|s|m|h))+")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_keep_alive(value: Optional[str]) -> Optional[Union[int, str]]:
+    """An OLLAMA_KEEP_ALIVE value as the API takes it: seconds as a number ('-1': forever) or a duration ('30m')."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        if not DURATION_FULL_RE.fullmatch(value):
+            raise ValueError(f"Invalid Ollama keep_alive: {value!r}")
+        return value
+
+
+def keep_alive_seconds(keep_alive: Optional[Union[int, str]]) -> float:
+    """How long a model stays loaded after a request with this keep_alive (inf: until unloaded)."""
+    if keep_alive is None:
+        return OLLAMA_DEFAULT_KEEP_ALIVE_S
+    if isinstance(keep_alive, int):
+        return float("inf") if keep_alive < 0 else float(keep_alive)
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in DURATION_RE.findall(keep_alive))
+
+
+def model_key(name: str) -> str:
+    """'llama2:latest' and 'llama2' are the same model."""
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+def _parse_expires_at(value: Optional[str]) -> float:
+    # Ollama reports nanoseconds; fromisoformat takes at most microseconds
+    if not value:
+        return float("inf")
+    try:
+        expires = datetime.fromisoformat(re.sub(r"(\.\d{6})\d+", r"\1", value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("inf")
+    # A model kept forever (keep_alive < 0) expires centuries from now
+    return float("inf") if expires - time.time() > 50 * 365 * 86400 else expires
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+class OllamaHost:
+    """
+    One Ollama server of the pool: its connection pool, the models it has
+    loaded, its in-flight requests and its health. A host whose requests
+    fail to connect is ejected for a backoff that doubles with each failure;
+    once that has passed it takes one request at a time until one succeeds.
+    While every host is ejected, requests go to the one that failed longest
+    ago rather than failing outright.
+    """
+
+    def __init__(self, base_url: str, eject_backoff_s: float = 5.0, eject_max_s: float = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.eject_backoff_s = eject_backoff_s
+        self.eject_max_s = eject_max_s
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_owner = None
+        self._ps_lock: Optional[asyncio.Lock] = None
+        # Loaded model → when Ollama unloads it, from /api/ps and our own requests
+        self.resident: Dict[str, float] = {}
+        self.resident_checked = 0.0
+        # Models this host answered 404 for; forgotten at the next /api/ps check
+        self.missing: Set[str] = set()
+        self.outstanding = 0
+        self.requests = 0
+        self.cold_requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.failed_at = 0.0
+        self.ejected_until = 0.0
+        self.started_at = time.time()
+        self.busy_s = 0.0
+        self._busy_since = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # One connection pool per worker and event loop: connections don't
+        # survive a fork and belong to the loop that opened them
+        owner = (os.getpid(), asyncio.get_running_loop())
+        if self._client is None or self._client_owner != owner:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=60.0)
+            self._client_owner = owner
+            self._ps_lock = asyncio.Lock()
+        return self._client
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def accepts(self, now: float) -> bool:
+        # Back from ejection: one trial request at a time
+        return self.healthy(now) and not (self.failures and self.outstanding)
+
+    def is_loaded(self, model: str, now: float) -> bool:
+        return self.resident.get(model_key(model), 0.0) > now
+
+    def mark_used(self, model: str, keep_alive_s: float) -> None:
+        # A finished request leaves the model loaded for its keep_alive
+        if keep_alive_s > 0:
+            self.resident[model_key(model)] = time.time() + keep_alive_s
+        else:
+            self.resident.pop(model_key(model), None)
+
+    def started(self) -> None:
+        if self.outstanding == 0:
+            self._busy_since = time.time()
+        self.outstanding += 1
+        self.requests += 1
+
+    def finished(self) -> None:
+        self.outstanding -= 1
+        if self.outstanding == 0:
+            self.busy_s += time.time() - self._busy_since
+
+    def succeeded(self) -> None:
+        if self.failures:
+            logger.info(f"Ollama host {self.base_url} is back after {self.failures} failure(s)")
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def failed(self, error: Exception) -> None:
+        self.errors += 1
+        self.failures += 1
+        self.failed_at = time.time()
+        ejected_for = min(self.eject_max_s, self.eject_backoff_s * 2 ** (self.failures - 1))
+        self.ejected_until = self.failed_at + ejected_for
+        logger.warning(f"Ollama host {self.base_url} failed ({error!r}); ejected for {ejected_for:g}s")
+
+    async def refresh_resident(self, ttl_s: float) -> None:
+        """Ask /api/ps for the loaded models, at most every `ttl_s`."""
+        client = self.client
+        if time.time() - self.resident_checked < ttl_s:
+            return
+        async with self._ps_lock:
+            if time.time() - self.resident_checked < ttl_s:
+                return
+            try:
+                response = await client.get("/api/ps", timeout=5.0)
+                response.raise_for_status()
+                self.resident = {
+                    model_key(m.get("name") or m.get("model", "")): _parse_expires_at(m.get("expires_at"))
+                    for m in response.json().get("models", [])
+                }
+                self.missing.clear()
+                self.succeeded()
+            except Exception as e:
+                # Requests decide ejection: a failed probe ahead of every
+                # request would otherwise double the backoff each time
+                logger.debug(f"Listing loaded models on {self.base_url} failed: {e}")
+            self.resident_checked = time.time()
+
+    def stats(self, now: float) -> Dict:
+        busy_s = self.busy_s + (now - self._busy_since if self.outstanding else 0.0)
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy(now),
+            "ejected_for_s": round(self.ejected_until - now, 1) if not self.healthy(now) else None,
+            "failures": self.failures,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "cold_requests": self.cold_requests,
+            "errors": self.errors,
+            # Share of the time since startup with at least one request in flight
+            "utilization": round(busy_s / max(now - self.started_at, 1e-9), 3),
+            "loaded": {
+                model: (None if expires == float("inf") else round(expires - now, 1))
+                for model, expires in self.resident.items() if expires > now
+            },
+        }
+
 
 class OllamaService:
+    """
+    Local models through a pool of Ollama servers (OLLAMA_BASE_URL, comma-
+    separated), with model residency managed so requests rarely wait for a
+    model load: configured models are loaded at startup (`preload`), every
+    request carries the model's keep_alive, a request that names no model
+    goes to a model that is already loaded, and each request goes to the
+    host with the fewest requests in flight among those that have its model
+    loaded (unless they are `spill_outstanding` busier than the least busy).
+    """
+
     def __init__(self):
-        self.base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        self.default_model = "llama2"
-    
+        eject_backoff_s = float(os.getenv("OLLAMA_EJECT_BACKOFF_S", "5"))
+        eject_max_s = float(os.getenv("OLLAMA_EJECT_MAX_S", "300"))
+        self.hosts = [OllamaHost(url, eject_backoff_s, eject_max_s)
+                      for url in _env_list("OLLAMA_BASE_URL", "http://localhost:11434")]
+        self.default_model = os.getenv("OLLAMA_DEFAULT_MODEL", "llama2")
+        # Offered in /api/providers, and the models a request without one may be sent to
+        self.models = _env_list("OLLAMA_MODELS", "llama2,mistral,codellama,neural-chat")
+        if self.default_model not in self.models:
+            self.models.insert(0, self.default_model)
+        preload = _env_list("OLLAMA_PRELOAD_MODELS", "")
+        if "all" in preload:
+            preload = list(self.models)
+        self.preload_models = [self.default_model if m == "default" else m for m in preload]
+        self.default_keep_alive = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE"))
+        # Per-model overrides: OLLAMA_MODEL_KEEP_ALIVE="llama2=-1,mistral=10m"
+        self.model_keep_alive: Dict[str, Union[int, str]] = {}
+        for item in _env_list("OLLAMA_MODEL_KEEP_ALIVE", ""):
+            name, _, value = item.partition("=")
+            self.model_keep_alive[model_key(name.strip())] = parse_keep_alive(value)
+        self.ps_ttl_s = float(os.getenv("OLLAMA_PS_TTL_S", "10"))
+        self.spill_outstanding = int(os.getenv("OLLAMA_SPILL_OUTSTANDING", "4"))
+        self._preload_task: Optional[asyncio.Task] = None
+        self._stats = {"requests": 0, "cold_requests": 0, "warm_routed": 0, "retried": 0, "panic_routed": 0,
+                       "preloaded": [], "preload_failed": []}
+
+    def keep_alive(self, model: str) -> Optional[Union[int, str]]:
+        return self.model_keep_alive.get(model_key(model), self.default_keep_alive)
+
+    def _payload(self, model: str, **fields) -> Dict:
+        payload = {"model": model, **fields}
+        keep_alive = self.keep_alive(model)
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    async def loaded_models(self) -> Dict[str, float]:
+        """Models loaded on any healthy host, with when the last of them unloads."""
+        now = time.time()
+        hosts = [host for host in self.hosts if host.healthy(now)]
+        await asyncio.gather(*(host.refresh_resident(self.ps_ttl_s) for host in hosts))
+        now = time.time()
+        loaded: Dict[str, float] = {}
+        for host in hosts:
+            for model, expires in host.resident.items():
+                if expires > now:
+                    loaded[model] = max(expires, loaded.get(model, 0.0))
+        return loaded
+
+    async def choose_model(self, model: Optional[str] = None) -> str:
+        """The requested model; without one the default if it is loaded, else a loaded configured model, else the default."""
+        if model:
+            return model
+        loaded = await self.loaded_models()
+        if model_key(self.default_model) in loaded:
+            return self.default_model
+        warm = next((m for m in self.models if model_key(m) in loaded), None)
+        if warm is not None:
+            self._stats["warm_routed"] += 1
+            return warm
+        return self.default_model
+
+    def pick_host(self, model: str, exclude: List[OllamaHost] = ()) -> Optional[OllamaHost]:
+        """
+        The least busy host that has `model` loaded, else the least busy host.
+        When every host is ejected, the one that failed longest ago (a lone
+        host coming back from a restart shouldn't fail requests for the whole
+        backoff); None once all have been tried.
+        """
+        now = time.time()
+        usable = [host for host in self.hosts if host not in exclude and model_key(model) not in host.missing]
+        candidates = [host for host in usable if host.accepts(now)]
+        if not candidates:
+            if not usable:
+                return None
+            self._stats["panic_routed"] += 1
+            return min(usable, key=lambda host: host.failed_at)
+        # Ties go to the host with fewer requests so far, spreading an idle pool evenly
+        least_busy = min(candidates, key=lambda host: (host.outstanding, host.requests))
+        warm = [host for host in candidates if host.is_loaded(model, now)]
+        if warm:
+            warm_host = min(warm, key=lambda host: (host.outstanding, host.requests))
+            if warm_host.outstanding - least_busy.outstanding < self.spill_outstanding:
+                return warm_host
+        return least_busy
+
+    async def _post(self, path: str, model: str, payload: Dict) -> Tuple[Dict, OllamaHost]:
+        """
+        Send a request to the best host. A host that can't be reached, or
+        fails with a server error, is ejected and the request goes to the
+        next one; one without the model is skipped.
+        """
+        self._stats["requests"] += 1
+        # Where each model is loaded, as of the last /api/ps check
+        await self.loaded_models()
+        tried: List[OllamaHost] = []
+        error: Optional[Exception] = None
+        while True:
+            host = self.pick_host(model, tried)
+            if host is None:
+                # A host's answer says more than the hosts that couldn't be reached
+                raise error or Exception("Ollama service not available. Make sure Ollama is running.")
+            if tried:
+                self._stats["retried"] += 1
+            tried.append(host)
+            if not host.is_loaded(model, time.time()):
+                host.cold_requests += 1
+                self._stats["cold_requests"] += 1
+            host.started()
+            try:
+                response = await host.client.post(path, json=payload)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                host.failed(e)
+                continue
+            except httpx.TransportError as e:
+                # The request may have been processed: don't send it again
+                host.failed(e)
+                raise
+            finally:
+                host.finished()
+            if response.status_code == 404:
+                host.missing.add(model_key(model))
+                error = Exception(f"Ollama API error: {response.status_code}")
+                continue
+            if response.status_code >= 500:
+                host.failed(Exception(f"HTTP {response.status_code}"))
+                error = Exception(f"Ollama API error: {response.status_code}")
+                continue
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.status_code}")
+            host.succeeded()
+            host.mark_used(model, keep_alive_seconds(self.keep_alive(model)))
+            return response.json(), host
+
     async def generate(
         self,
         text: str,
@@ -19,43 +349,37 @@ class OllamaService:
         """
         Generate a response using Ollama local models
         """
-        if not await self.is_available():
-            raise Exception("Ollama service not available. Make sure Ollama is running.")
-        
         try:
-            async with httpx.AsyncClient() as client:
-                # Combine system prompt and user text
-                prompt = f"{system_prompt}\n\nUser: {text}\n\nAssistant:"
-                
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": model or self.default_model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": temperature,
-                            "num_predict": max_tokens
-                        }
-                    },
-                    timeout=60.0
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Ollama API error: {response.status_code}")
-                
-                result = response.json()
-                
-                return {
-                    "response": result.get("response", ""),
-                    "model": result.get("model", model or self.default_model),
-                    "tokens_used": result.get("eval_count", 0),
-                    "finish_reason": "completed" if result.get("done") else "length"
-                }
-        
+            model = await self.choose_model(model)
+            # Combine system prompt and user text
+            prompt = f"{system_prompt}\n\nUser: {text}\n\nAssistant:"
+
+            with span("provider.ollama.generate", model=model) as generate_span:
+                result, host = await self._post("/api/generate", model, self._payload(
+                    model,
+                    prompt=prompt,
+                    stream=False,
+                    options={
+                        "temperature": temperature,
+                        "num_predict": max_tokens
+                    }
+                ))
+                generate_span.set_attribute("host", host.base_url)
+
+            usage = ollama_usage(result)
+            record_usage("ollama", usage)
+
+            return {
+                "response": result.get("response", ""),
+                "model": result.get("model", model),
+                "tokens_used": result.get("eval_count", 0),
+                "tokens_details": usage,
+                "finish_reason": "completed" if result.get("done") else "length"
+            }
+
         except Exception as e:
             raise Exception(f"Ollama generation failed: {str(e)}")
-    
+
     async def chat(
         self,
         messages: List[Dict[str, str]],
@@ -66,58 +390,144 @@ class OllamaService:
         """
         Chat conversation with message history using Ollama
         """
-        if not await self.is_available():
-            raise Exception("Ollama service not available. Make sure Ollama is running.")
-        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json={
-                        "model": model or self.default_model,
-                        "messages": messages,
-                        "stream": False,
-                        "options": {
-                            "temperature": temperature,
-                            "num_predict": max_tokens
-                        }
-                    },
-                    timeout=60.0
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Ollama API error: {response.status_code}")
-                
-                result = response.json()
-                message = result.get("message", {})
-                
-                return {
-                    "response": message.get("content", ""),
-                    "model": result.get("model", model or self.default_model),
-                    "tokens_used": result.get("eval_count", 0),
-                    "finish_reason": "completed" if result.get("done") else "length"
-                }
-        
+            model = await self.choose_model(model)
+            messages, context = fit_context(messages, "ollama", model, max_tokens)
+            with span("provider.ollama.chat", model=model, messages=len(messages)) as chat_span:
+                result, host = await self._post("/api/chat", model, self._payload(
+                    model,
+                    messages=messages,
+                    stream=False,
+                    options={
+                        "temperature": temperature,
+                        "num_predict": max_tokens
+                    }
+                ))
+                chat_span.set_attribute("host", host.base_url)
+
+            message = result.get("message", {})
+            usage = ollama_usage(result)
+            record_usage("ollama", usage)
+            record_prompt_tokens("ollama", model, context, result.get("prompt_eval_count"))
+
+            return {
+                "response": message.get("content", ""),
+                "model": result.get("model", model),
+                "tokens_used": result.get("eval_count", 0),
+                "tokens_details": usage,
+                "finish_reason": "completed" if result.get("done") else "length",
+                "context": context
+            }
+
         except Exception as e:
             raise Exception(f"Ollama chat failed: {str(e)}")
-    
+
+    async def preload(self, models: Optional[List[str]] = None) -> Dict[str, Dict[str, bool]]:
+        """
+        Load models on every host ahead of their first request: a generate
+        request without a prompt only loads the model. Returns, per host,
+        whether each model loaded.
+        """
+        models = self.preload_models if models is None else models
+        await self.loaded_models()
+
+        async def load(host: OllamaHost) -> Dict[str, bool]:
+            # One at a time: Ollama loads models one after another anyway, and
+            # the first configured model should be ready first
+            results = {}
+            for model in models:
+                try:
+                    with span("provider.ollama.preload", model=model, host=host.base_url):
+                        # A cold load can take far longer than a request
+                        response = await host.client.post("/api/generate", json=self._payload(model), timeout=300.0)
+                    response.raise_for_status()
+                    host.mark_used(model, keep_alive_seconds(self.keep_alive(model)))
+                    results[model] = True
+                except Exception as e:
+                    logger.warning(f"Preloading Ollama model {model} on {host.base_url} failed: {e}")
+                    if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                        host.failed(e)
+                        return {model: False for model in models}
+                    results[model] = False
+            return results
+
+        results = dict(zip((host.base_url for host in self.hosts),
+                           await asyncio.gather(*(load(host) for host in self.hosts))))
+        self._stats["preloaded"] = [f"{m}@{url}" for url, loaded in results.items() for m, ok in loaded.items() if ok]
+        self._stats["preload_failed"] = [f"{m}@{url}" for url, loaded in results.items() for m, ok in loaded.items() if not ok]
+        if models:
+            logger.info(f"Preloaded Ollama models {self._stats['preloaded'] or 'none'}"
+                        f" (failed: {self._stats['preload_failed'] or 'none'})")
+        return results
+
+    def start_preload(self) -> Optional[asyncio.Task]:
+        """Preload in the background, so startup doesn't wait for model loads."""
+        if not self.preload_models or (self._preload_task is not None and not self._preload_task.done()):
+            return self._preload_task
+        self._preload_task = asyncio.get_running_loop().create_task(self.preload())
+        return self._preload_task
+
     async def is_available(self) -> bool:
-        """Check if Ollama service is running"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/tags", timeout=5.0)
-                return response.status_code == 200
-        except:
-            return False
-    
+        """Check if any Ollama host is running; probing also ejects or readmits hosts."""
+        now = time.time()
+
+        async def probe(host: OllamaHost) -> bool:
+            if not host.healthy(now):
+                return False
+            try:
+                response = await host.client.get("/api/tags", timeout=5.0)
+                response.raise_for_status()
+            except Exception as e:
+                host.failed(e)
+                return False
+            host.succeeded()
+            return True
+
+        return any(await asyncio.gather(*(probe(host) for host in self.hosts)))
+
     async def list_models(self) -> List[str]:
-        """List available models in Ollama"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/tags")
+        """List available models in Ollama, across every healthy host"""
+        now = time.time()
+
+        async def tags(host: OllamaHost) -> List[str]:
+            try:
+                response = await host.client.get("/api/tags")
                 if response.status_code == 200:
                     data = response.json()
                     return [model["name"] for model in data.get("models", [])]
                 return []
-        except:
-            return [] 
\ No newline at end of file
+            except Exception:
+                return []
+
+        names = await asyncio.gather(*(tags(host) for host in self.hosts if host.healthy(now)))
+        return list(dict.fromkeys(name for host_names in names for name in host_names))
+
+    def host_stats(self) -> List[Dict]:
+        now = time.time()
+        return [host.stats(now) for host in self.hosts]
+
+    def stats(self) -> Dict:
+        now = time.time()
+        loaded: Dict[str, Optional[float]] = {}
+        for host in self.hosts:
+            for model, expires_in in host.stats(now)["loaded"].items():
+                previous = loaded.get(model, 0.0)
+                loaded[model] = None if expires_in is None or previous is None else max(expires_in, previous)
+        return {
+            "default_model": self.default_model,
+            "keep_alive": {"default": self.default_keep_alive, **self.model_keep_alive},
+            "loaded": loaded,
+            **self._stats,
+            "hosts": self.host_stats(),
+        }
+
+
+_ollama_service: Optional[OllamaService] = None
+
+
+def get_ollama_service() -> OllamaService:
+    """One instance per worker process, so every router shares its connection pools, residency and host state."""
+    global _ollama_service
+    if _ollama_service is None:
+        _ollama_service = OllamaService()
+    return _ollama_service
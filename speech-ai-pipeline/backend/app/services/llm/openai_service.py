@@ -1,7 +1,10 @@
 import os
 from openai import OpenAI
 from typing import Dict, Optional, List, Any
-import asyncio
+
+from app.utils.tracing import span, run_in_executor
+from app.utils.context_window import fit_context, record_prompt_tokens
+from app.utils.prompt_cache import openai_usage, prompt_cache_key, record_usage
 
 class OpenAIService:
     def __init__(self):
@@ -23,21 +26,30 @@ class OpenAIService:
             raise Exception("OpenAI API key not configured")
         
         try:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ]
+            # Calls sharing a system prompt share a cache key; the user text varies
+            cache_key = prompt_cache_key(messages[:1])
+            
             def _generate():
                 response = self.client.chat.completions.create(
                     model=model or self.default_model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": text}
-                    ],
+                    messages=messages,
                     max_tokens=max_tokens,
-                    temperature=temperature
+                    temperature=temperature,
+                    **({"prompt_cache_key": cache_key} if cache_key else {})
                 )
                 return response
             
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, _generate)
+            with span("provider.openai.generate", model=model or self.default_model) as provider_span:
+                response = await run_in_executor(_generate)
+                usage = openai_usage(response.usage)
+                provider_span.set_attribute("tokens_used", response.usage.total_tokens if response.usage else 0)
+                provider_span.set_attribute("cached_tokens", usage["cached_tokens"])
+            record_usage("openai", usage)
             
             message = response.choices[0].message
             
@@ -45,6 +57,7 @@ class OpenAIService:
                 "response": message.content,
                 "model": response.model,
                 "tokens_used": response.usage.total_tokens if response.usage else 0,
+                "tokens_details": usage,
                 "finish_reason": response.choices[0].finish_reason
             }
         
@@ -65,17 +78,29 @@ class OpenAIService:
             raise Exception("OpenAI API key not configured")
         
         try:
+            model = model or self.default_model
+            # OpenAI caches prompt prefixes automatically; a per-conversation key (taken
+            # before trimming, so it survives it) routes every turn to the same cache
+            cache_key = prompt_cache_key(messages)
+            messages, context = fit_context(messages, "openai", model, max_tokens)
+            
             def _chat():
                 response = self.client.chat.completions.create(
-                    model=model or self.default_model,
+                    model=model,
                     messages=messages,
                     max_tokens=max_tokens,
-                    temperature=temperature
+                    temperature=temperature,
+                    **({"prompt_cache_key": cache_key} if cache_key else {})
                 )
                 return response
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, _chat)
+            with span("provider.openai.chat", model=model, messages=len(messages)) as provider_span:
+                response = await run_in_executor(_chat)
+                usage = openai_usage(response.usage)
+                provider_span.set_attribute("tokens_used", response.usage.total_tokens if response.usage else 0)
+                provider_span.set_attribute("cached_tokens", usage["cached_tokens"])
+            record_usage("openai", usage)
+            record_prompt_tokens("openai", model, context, usage["prompt_tokens"])
             
             message = response.choices[0].message
             
@@ -83,7 +108,9 @@ class OpenAIService:
                 "response": message.content,
                 "model": response.model,
                 "tokens_used": response.usage.total_tokens if response.usage else 0,
-                "finish_reason": response.choices[0].finish_reason
+                "tokens_details": usage,
+                "finish_reason": response.choices[0].finish_reason,
+                "context": context
             }
         
         except Exception as e:
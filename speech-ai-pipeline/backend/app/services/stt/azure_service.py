@@ -1,7 +1,8 @@
 import os
 import azure.cognitiveservices.speech as speechsdk
 from typing import Dict, Optional
-import asyncio
+
+from app.utils.tracing import span, run_in_executor
 
 class AzureSTTService:
     def __init__(self):
@@ -45,8 +46,8 @@ class AzureSTTService:
                 return result
             
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, recognize)
+            with span("provider.azure.recognize", language=language):
+                result = await run_in_executor(recognize)
             
             if result.reason == speechsdk.ResultReason.RecognizedSpeech:
                 return {
@@ -7,6 +7,8 @@ import tempfile
 
 from pydub import AudioSegment
 
+from app.utils.tracing import span, run_in_executor
+
 def _detect_audio_encoding(file_path: str) -> speech.RecognitionConfig.AudioEncoding:
     try:
         with open(file_path, "rb") as f:
@@ -26,18 +28,29 @@ def _detect_audio_encoding(file_path: str) -> speech.RecognitionConfig.AudioEnco
 
 class GoogleSTTService:
     def __init__(self):
-        # Initialize Google Cloud Speech client
         # Requires GOOGLE_APPLICATION_CREDENTIALS environment variable
-        self.client = speech.SpeechClient() if os.getenv("GOOGLE_APPLICATION_CREDENTIALS") else None
+        self.configured = bool(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+        self._client = None
+        self._client_pid = None
         self.logger = logging.getLogger("stt.google")
+
+    @property
+    def client(self) -> Optional[speech.SpeechClient]:
+        # gRPC channels don't survive a fork, so the client is built on first
+        # use in the process that uses it (see app.cli.serve)
+        if self.configured and (self._client is None or self._client_pid != os.getpid()):
+            self._client = speech.SpeechClient()
+            self._client_pid = os.getpid()
+        return self._client
     
     def _convert_to_wav_16k_mono(self, src_path: str) -> Optional[str]:
         try:
-            audio = AudioSegment.from_file(src_path)
-            audio = audio.set_frame_rate(16000).set_channels(1)
-            fd, out_path = tempfile.mkstemp(suffix=".wav")
-            os.close(fd)
-            audio.export(out_path, format="wav")
+            with span("audio.convert", target="wav_16k_mono"):
+                audio = AudioSegment.from_file(src_path)
+                audio = audio.set_frame_rate(16000).set_channels(1)
+                fd, out_path = tempfile.mkstemp(suffix=".wav")
+                os.close(fd)
+                audio.export(out_path, format="wav")
             return out_path
         except Exception as e:
             self.logger.warning(f"FFmpeg/pydub conversion failed: {e}")
@@ -81,7 +94,8 @@ class GoogleSTTService:
             )
             
             # Perform recognition
-            response = self.client.recognize(config=config, audio=audio)
+            with span("provider.google.recognize", encoding=encoding.name, language=language):
+                response = await run_in_executor(lambda: self.client.recognize(config=config, audio=audio))
             
             if response.results:
                 result = response.results[0]
@@ -112,7 +126,8 @@ class GoogleSTTService:
                             sample_rate_hertz=16000,
                             model="latest_short",
                         )
-                        response2 = self.client.recognize(config=config2, audio=audio2)
+                        with span("provider.google.recognize", encoding="LINEAR16", language=language, retry=True):
+                            response2 = await run_in_executor(lambda: self.client.recognize(config=config2, audio=audio2))
                         if response2.results:
                             result2 = response2.results[0]
                             alt2 = result2.alternatives[0]
@@ -136,4 +151,4 @@ class GoogleSTTService:
     
     def is_available(self) -> bool:
         """Check if the service is properly configured"""
-        return self.client is not None 
\ No newline at end of file
+        return self.configured 
\ No newline at end of file
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.batching import MicroBatcher
+from app.utils.tracing import span, run_in_executor
+
+try:
+    from faster_whisper import WhisperModel, decode_audio, download_model
+    from faster_whisper.tokenizer import Tokenizer
+except ImportError:  # optional: only needed for the "local" STT provider
+    WhisperModel = None
+
+SAMPLE_RATE = 16000
+# Whisper reads 30 s windows of 100 mel frames per second; longer audio is transcribed unbatched
+WINDOW_S = 30
+WINDOW_FRAMES = WINDOW_S * 100
+MAX_TOKENS = 448
+
+
+def _whisper_language(language: Optional[str]) -> Optional[str]:
+    """'en-US' -> 'en'; None or 'auto-detect' lets the model detect the language."""
+    if not language or language == "auto-detect":
+        return None
+    return language.replace("_", "-").split("-")[0].lower()
+
+
+class LocalWhisperService:
+    """
+    Whisper-family model (faster-whisper / CTranslate2, int8 by default) run
+    on this machine's CPU.
+
+    The model is loaded on first use and shared by every request of the
+    process. Utterances up to 30 s are grouped by a micro-batcher: requests
+    arriving within LOCAL_STT_BATCH_WINDOW_MS of each other (up to
+    LOCAL_STT_BATCH_SIZE) are encoded and decoded as one batch on a single
+    inference thread, which gives CTranslate2 all LOCAL_STT_THREADS cores.
+    """
+
+    def __init__(self):
+        self.model_name = os.getenv("LOCAL_STT_MODEL", "base")
+        self.compute_type = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+        self.cpu_threads = int(os.getenv("LOCAL_STT_THREADS", "0"))
+        self.beam_size = int(os.getenv("LOCAL_STT_BEAM_SIZE", "1"))
+        self.model_dir = os.getenv("LOCAL_STT_MODEL_DIR") or None
+        self.logger = logging.getLogger("local_stt")
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._tokenizers: Dict[str, object] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-stt")
+        self.batcher = MicroBatcher(
+            self._transcribe_batch,
+            max_batch=int(os.getenv("LOCAL_STT_BATCH_SIZE", "8")),
+            window_s=float(os.getenv("LOCAL_STT_BATCH_WINDOW_MS", "25")) / 1000.0,
+            executor=self._executor,
+        )
+        self._audio_s = 0.0
+        self._requests = 0
+
+    async def transcribe(self, audio_file_path: str, language: Optional[str] = None) -> Dict:
+        """
+        Transcribe audio with the local model
+
+        Args:
+            audio_file_path: Path to the audio file
+            language: Language code (optional, detected when missing)
+
+        Returns:
+            Dict with transcription text and confidence
+        """
+        if WhisperModel is None:
+            raise Exception("Local STT needs the faster-whisper package (pip install faster-whisper).")
+
+        try:
+            with span("provider.local.transcribe", model=self.model_name, language=language) as s:
+                await run_in_executor(self.load_model)
+                audio = await run_in_executor(decode_audio, audio_file_path, SAMPLE_RATE)
+                duration = len(audio) / SAMPLE_RATE
+                s.set_attribute("audio_s", round(duration, 2))
+                if duration > WINDOW_S:
+                    loop = asyncio.get_running_loop()
+                    text, confidence, detected = await loop.run_in_executor(
+                        self._executor, self._transcribe_long, audio, _whisper_language(language)
+                    )
+                else:
+                    features = await run_in_executor(self._features, audio)
+                    text, confidence, detected = await self.batcher.submit((features, _whisper_language(language)))
+            self._audio_s += duration
+            self._requests += 1
+            return {
+                "text": text,
+                "confidence": confidence,
+                "language": language or detected,
+                "duration": duration,
+            }
+
+        except Exception as e:
+            raise Exception(f"Local STT transcription failed: {str(e)}")
+
+    def load_model(self) -> None:
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = WhisperModel(
+                    self.model_name,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads,
+                    download_root=self.model_dir,
+                )
+                self.logger.info(f"Loaded local STT model {self.model_name} ({self.compute_type}) "
+                                 f"in {time.perf_counter() - start:.1f}s")
+
+    def fetch_model(self) -> str:
+        """Directory of the model files, downloaded on first use (a path in LOCAL_STT_MODEL is used as is)."""
+        if os.path.isdir(self.model_name):
+            return self.model_name
+        return download_model(self.model_name, cache_dir=self.model_dir)
+
+    def _features(self, audio: np.ndarray) -> np.ndarray:
+        """Log-mel features padded or cut to exactly one 30 s window."""
+        features = self._model.feature_extractor(audio)[:, :WINDOW_FRAMES]
+        if features.shape[-1] < WINDOW_FRAMES:
+            features = np.pad(features, ((0, 0), (0, WINDOW_FRAMES - features.shape[-1])))
+        return features.astype(np.float32)
+
+    def _tokenizer(self, language: str):
+        if language not in self._tokenizers:
+            multilingual = self._model.model.is_multilingual
+            self._tokenizers[language] = Tokenizer(self._model.hf_tokenizer, multilingual, task="transcribe",
+                                                   language=language if multilingual else "en")
+        return self._tokenizers[language]
+
+    def _transcribe_batch(self, items: List[Tuple[np.ndarray, Optional[str]]]) -> List:
+        """Encode and decode a batch of single-window utterances; runs on the inference thread."""
+        multilingual = self._model.model.is_multilingual
+        results: List = [None] * len(items)
+        valid = []
+        for i, (_, language) in enumerate(items):
+            if language and multilingual:
+                try:
+                    self._tokenizer(language)
+                except Exception as e:
+                    results[i] = ValueError(f"Unsupported language {language!r}: {e}")
+                    continue
+            valid.append(i)
+        if not valid:
+            return results
+
+        encoder_output = self._model.encode(np.stack([items[i][0] for i in valid]))
+        languages = [items[i][1] if multilingual else "en" for i in valid]
+        if any(language is None for language in languages):
+            detected = self._model.model.detect_language(encoder_output)
+            # Each entry is [("<|en|>", probability), ...], most likely first
+            languages = [language or detected[j][0][0][2:-2] for j, language in enumerate(languages)]
+        prompts = []
+        for language in languages:
+            tokenizer = self._tokenizer(language)
+            prompts.append(list(tokenizer.sot_sequence) + [tokenizer.no_timestamps])
+
+        generated = self._model.model.generate(
+            encoder_output,
+            prompts,
+            beam_size=self.beam_size,
+            max_length=MAX_TOKENS,
+            return_scores=True,
+            suppress_blank=True,
+            suppress_tokens=[-1],
+        )
+        for i, language, result in zip(valid, languages, generated):
+            text = self._tokenizer(language).decode(result.sequences_ids[0]).strip()
+            # The score is the length-normalized log probability of the transcript
+            confidence = round(math.exp(result.scores[0]), 3) if result.scores else 0.0
+            results[i] = (text, confidence, language)
+        return results
+
+    def _transcribe_long(self, audio: np.ndarray, language: Optional[str]) -> Tuple[str, float, str]:
+        segments, info = self._model.transcribe(audio, language=language, beam_size=self.beam_size)
+        segments = list(segments)
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        confidence = round(math.exp(sum(s.avg_logprob for s in segments) / len(segments)), 3) if segments else 0.0
+        return text, confidence, info.language
+
+    def stats(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "compute_type": self.compute_type,
+            "loaded": self._model is not None,
+            "requests": self._requests,
+            "audio_s": round(self._audio_s, 1),
+            "batching": self.batcher.stats(),
+        }
+
+    def is_available(self) -> bool:
+        """Check if the service can run: faster-whisper is installed"""
+        return WhisperModel is not None
+
+
+_local_whisper_service: Optional[LocalWhisperService] = None
+
+
+def get_local_whisper_service() -> LocalWhisperService:
+    """One instance (and so one loaded model) per worker process, shared by every router."""
+    global _local_whisper_service
+    if _local_whisper_service is None:
+        _local_whisper_service = LocalWhisperService()
+    return _local_whisper_service
+
+
+def local_stt_stats() -> Optional[Dict]:
+    return _local_whisper_service.stats() if _local_whisper_service is not None else None
@@ -3,6 +3,8 @@ from openai import OpenAI
 from typing import Dict, Optional
 import aiofiles
 
+from app.utils.tracing import span, run_in_executor
+
 class WhisperService:
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -19,14 +21,14 @@ class WhisperService:
             Dict with transcription text and confidence
         """
         try:
-            with open(audio_file_path, "rb") as audio_file:
-                # Use Whisper API
-                transcript = self.client.audio.transcriptions.create(
+            with open(audio_file_path, "rb") as audio_file, span("provider.whisper.transcribe", language=language):
+                # Use Whisper API (in the thread pool, so concurrent transcriptions don't block each other)
+                transcript = await run_in_executor(lambda: self.client.audio.transcriptions.create(
                     model="whisper-1",
                     file=audio_file,
                     language=language if language and language != "auto-detect" else None,
                     response_format="verbose_json"
-                )
+                ))
             
             return {
                 "text": transcript.text,
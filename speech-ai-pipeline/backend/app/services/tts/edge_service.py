@@ -2,9 +2,20 @@ import edge_tts
 from typing import List, Dict, Optional
 import tempfile
 import asyncio
-from app.utils.text_utils import strip_all_markup
+from app.utils.tracing import span
+from app.utils.voice_catalog import catalog_voice
 
 class EdgeTTSService:
+    # The service streams 24 kHz MP3 only; callers transcode for anything else
+    OUTPUT_FORMATS = {"mp3": (24000,)}
+    # Served by the voice catalog while the voice list can't be fetched
+    FALLBACK_VOICES = [
+        catalog_voice("en-US-AriaNeural", "en-US-AriaNeural", "en-US", "female", "Aria"),
+        catalog_voice("en-US-JennyNeural", "en-US-JennyNeural", "en-US", "female", "Jenny"),
+        catalog_voice("en-US-GuyNeural", "en-US-GuyNeural", "en-US", "male", "Guy"),
+        catalog_voice("en-US-DavisNeural", "en-US-DavisNeural", "en-US", "male", "Davis"),
+    ]
+
     def __init__(self):
         pass  # Edge TTS is free and requires no API key
     
@@ -14,10 +25,12 @@ class EdgeTTSService:
         voice: Optional[str] = None,
         language: str = "en-US",
         speed: float = 1.0,
-        pitch: float = 0.0
+        pitch: float = 0.0,
+        output_format: str = "mp3",
+        sample_rate: Optional[int] = None
     ) -> str:
         """
-        Synthesize speech using Microsoft Edge TTS
+        Synthesize speech using Microsoft Edge TTS (always 24 kHz MP3)
         
         Returns:
             Path to the generated audio file
@@ -34,55 +47,33 @@ class EdgeTTSService:
             rate = f"{int((speed - 1) * 100):+d}%" if speed != 1.0 else "+0%"
             pitch_value = f"{int(pitch):+d}Hz" if pitch != 0.0 else "+0Hz"
 
-            # Use plain text (not SSML) to avoid tags being read; sanitize markup
-            plain_text = strip_all_markup(text)
-
-            # Create TTS communication using parameters
+            # Use plain text (not SSML) to avoid tags being read. Callers pass
+            # text that has already been through strip_all_markup.
             communicate = edge_tts.Communicate(
-                plain_text,
+                text,
                 voice=voice_to_use,
                 rate=rate,
                 pitch=pitch_value,
             )
             
             # Generate and save audio
-            await communicate.save(temp_file.name)
+            with span("provider.edge.synthesize", voice=voice_to_use, chars=len(text)):
+                await communicate.save(temp_file.name)
             
             return temp_file.name
         
         except Exception as e:
             raise Exception(f"Edge TTS synthesis failed: {str(e)}")
     
-    async def get_voices(self, language: str = "en-US") -> List[Dict]:
-        """Get available Edge TTS voices"""
-        try:
+    async def list_voices(self) -> List[Dict]:
+        """Every Edge TTS voice, for the voice catalog"""
+        with span("provider.edge.list_voices"):
             voices = await edge_tts.list_voices()
-            
-            # Filter by language if specified
-            filtered_voices = [
-                voice for voice in voices
-                if language.split('-')[0] in voice['Locale'] or language in voice['Locale']
-            ] if language else voices
-            
-            return [
-                {
-                    "name": voice['ShortName'],
-                    "display_name": voice['FriendlyName'],
-                    "gender": voice['Gender'],
-                    "locale": voice['Locale']
-                }
-                for voice in filtered_voices[:10]  # Limit to first 10 voices
-            ]
-        
-        except Exception as e:
-            print(f"Failed to get Edge TTS voices: {e}")
-            # Return some default voices
-            return [
-                {"name": "en-US-AriaNeural", "display_name": "Aria", "gender": "Female", "locale": "en-US"},
-                {"name": "en-US-JennyNeural", "display_name": "Jenny", "gender": "Female", "locale": "en-US"},
-                {"name": "en-US-GuyNeural", "display_name": "Guy", "gender": "Male", "locale": "en-US"},
-                {"name": "en-US-DavisNeural", "display_name": "Davis", "gender": "Male", "locale": "en-US"}
-            ]
+        return [
+            catalog_voice(voice["ShortName"], voice["ShortName"], locale=voice["Locale"], gender=voice["Gender"],
+                          display_name=voice["FriendlyName"])
+            for voice in voices
+        ]
     
     def is_available(self) -> bool:
         """Edge TTS is always available (no API key required)"""
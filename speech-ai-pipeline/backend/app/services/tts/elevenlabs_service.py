@@ -2,9 +2,47 @@ import os
 from elevenlabs.client import ElevenLabs
 from typing import List, Dict, Optional
 import tempfile
-import asyncio
+import wave
+
+from app.utils.audio import EXTENSIONS
+from app.utils.tracing import span, run_in_executor
+from app.utils.voice_catalog import catalog_voice, get_voice_catalog
+
+# Premade voices resolve without listing the account's voices
+PREMADE_VOICE_IDS = {
+    "Rachel": "21m00Tcm4TlvDq8ikWAM",
+    "Drew": "29vD33N1CtxCmqQRPOHJ",
+    "Clyde": "2EiwWnXFnvU5JabPnv8n",
+    "Paul": "5Q0t7uMcjvnagumLfvZi",
+}
+VOICES_PAGE_SIZE = 100
+
+PCM_SAMPLE_RATES = (16000, 8000, 22050, 24000, 32000, 44100, 48000)
+
+def elevenlabs_output_format(output_format: str, sample_rate: int) -> str:
+    """The API's output_format for a format and one of its sample rates (WAV is PCM with a header added here)."""
+    if output_format == "mp3":
+        return {44100: "mp3_44100_128", 24000: "mp3_24000_48", 22050: "mp3_22050_32"}[sample_rate]
+    if output_format == "opus":
+        return "opus_48000_64"
+    return f"pcm_{sample_rate}"
 
 class ElevenLabsService:
+    # Sample rates the API returns for each format; the first is the default
+    OUTPUT_FORMATS = {"mp3": (44100, 24000, 22050), "opus": (48000,), "wav": PCM_SAMPLE_RATES,
+                      "pcm": PCM_SAMPLE_RATES}
+    # Served by the voice catalog while the account's voices can't be listed
+    FALLBACK_VOICES = [
+        catalog_voice(PREMADE_VOICE_IDS["Rachel"], "Rachel", gender="female", voice_id=PREMADE_VOICE_IDS["Rachel"],
+                      category="premade", description="Young American female"),
+        catalog_voice(PREMADE_VOICE_IDS["Drew"], "Drew", gender="male", voice_id=PREMADE_VOICE_IDS["Drew"],
+                      category="premade", description="Middle-aged American male"),
+        catalog_voice(PREMADE_VOICE_IDS["Clyde"], "Clyde", gender="male", voice_id=PREMADE_VOICE_IDS["Clyde"],
+                      category="premade", description="Middle-aged American male"),
+        catalog_voice(PREMADE_VOICE_IDS["Paul"], "Paul", gender="male", voice_id=PREMADE_VOICE_IDS["Paul"],
+                      category="premade", description="Middle-aged American male"),
+    ]
+
     def __init__(self):
         self.api_key = os.getenv("ELEVENLABS_API_KEY")
         if self.api_key:
@@ -16,10 +54,13 @@ class ElevenLabsService:
         text: str,
         voice: Optional[str] = None,
         language: str = "en-US",
-        speed: float = 1.0
+        speed: float = 1.0,
+        output_format: str = "mp3",
+        sample_rate: Optional[int] = None
     ) -> str:
         """
-        Synthesize speech using ElevenLabs
+        Synthesize speech using ElevenLabs, as `output_format` at one of the
+        `sample_rate`s in OUTPUT_FORMATS
         
         Returns:
             Path to the generated audio file
@@ -28,70 +69,78 @@ class ElevenLabsService:
             raise Exception("ElevenLabs API key not configured. Set ELEVENLABS_API_KEY.")
         
         try:
-            def _synthesize():
-                voice_name_to_id = {
-                    "Rachel": "21m00Tcm4TlvDq8ikWAM",
-                    "Drew": "29vD33N1CtxCmqQRPOHJ",
-                    "Clyde": "2EiwWnXFnvU5JabPnv8n",
-                    "Paul": "5Q0t7uMcjvnagumLfvZi",
-                }
-                selected = voice or "Rachel"
-                voice_id = voice_name_to_id.get(selected, selected)
+            sample_rate = sample_rate or self.OUTPUT_FORMATS[output_format][0]
+            api_format = elevenlabs_output_format(output_format, sample_rate)
+            voice_id = await self.resolve_voice(voice or "Rachel")
 
-                audio = self.client.text_to_speech.convert(
-                    text=text,
-                    voice_id=voice_id,
-                    model_id="eleven_multilingual_v2",
-                    output_format="mp3_44100_128",
-                )
+            def _synthesize():
+                with span("provider.elevenlabs.convert", voice_id=voice_id, chars=len(text), output_format=api_format):
+                    audio = self.client.text_to_speech.convert(
+                        text=text,
+                        voice_id=voice_id,
+                        model_id="eleven_multilingual_v2",
+                        output_format=api_format,
+                    )
 
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                    if isinstance(audio, (bytes, bytearray)):
-                        temp_file.write(audio)
-                    else:
-                        for chunk in audio:
-                            if isinstance(chunk, (bytes, bytearray)):
-                                temp_file.write(chunk)
-                    return temp_file.name
+                    # The SDK streams the body, so the write also covers the download
+                    with span("file.write", kind="tts_output"):
+                        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{EXTENSIONS[output_format]}") as temp_file:
+                            chunks = [audio] if isinstance(audio, (bytes, bytearray)) else audio
+                            chunks = (chunk for chunk in chunks if isinstance(chunk, (bytes, bytearray)))
+                            if output_format == "wav":
+                                # The API returns headerless PCM; wave fills in the length on close
+                                with wave.open(temp_file, "wb") as wav:
+                                    wav.setnchannels(1)
+                                    wav.setsampwidth(2)
+                                    wav.setframerate(sample_rate)
+                                    for chunk in chunks:
+                                        wav.writeframes(chunk)
+                            else:
+                                for chunk in chunks:
+                                    temp_file.write(chunk)
+                            return temp_file.name
 
-            loop = asyncio.get_event_loop()
-            audio_file = await loop.run_in_executor(None, _synthesize)
+            audio_file = await run_in_executor(_synthesize)
             return audio_file
         
         except Exception as e:
             raise Exception(f"ElevenLabs synthesis failed: {str(e)}")
     
-    async def get_voices(self) -> List[Dict]:
-        """Get available ElevenLabs voices"""
+    async def resolve_voice(self, voice: str) -> str:
+        """Voice id for a voice name (or id), from the voice catalog unless it is a premade voice"""
+        if voice in PREMADE_VOICE_IDS:
+            return PREMADE_VOICE_IDS[voice]
+        voice_id = await get_voice_catalog().resolve("elevenlabs", voice, self.list_voices, self.FALLBACK_VOICES)
+        return voice_id or voice
+    
+    async def list_voices(self) -> List[Dict]:
+        """Every voice of the account, for the voice catalog (voices are multilingual: no locale)"""
         if not self.is_available():
             return []
         
-        try:
-            def _get_voices():
-                response = self.client.voices.search()
-                return getattr(response, "voices", response)
+        def _list_voices():
+            voices, page_token = [], None
+            while True:
+                response = self.client.voices.search(page_size=VOICES_PAGE_SIZE, next_page_token=page_token)
+                voices.extend(response.voices)
+                page_token = getattr(response, "next_page_token", None)
+                if not getattr(response, "has_more", False) or not page_token:
+                    return voices
 
-            loop = asyncio.get_event_loop()
-            voice_list = await loop.run_in_executor(None, _get_voices)
+        with span("provider.elevenlabs.list_voices"):
+            voice_list = await run_in_executor(_list_voices)
 
-            return [
-                {
-                    "name": getattr(v, "name", getattr(v, "voice", "")),
-                    "voice_id": getattr(v, "voice_id", ""),
-                    "category": getattr(v, "category", ""),
-                    "description": getattr(v, "description", ""),
-                }
-                for v in voice_list
-            ]
-        
-        except Exception as e:
-            print(f"Failed to get ElevenLabs voices: {e}")
-            return [
-                {"name": "Rachel", "voice_id": "21m00Tcm4TlvDq8ikWAM", "category": "premade", "description": "Young American female"},
-                {"name": "Drew", "voice_id": "29vD33N1CtxCmqQRPOHJ", "category": "premade", "description": "Middle-aged American male"},
-                {"name": "Clyde", "voice_id": "2EiwWnXFnvU5JabPnv8n", "category": "premade", "description": "Middle-aged American male"},
-                {"name": "Paul", "voice_id": "5Q0t7uMcjvnagumLfvZi", "category": "premade", "description": "Middle-aged American male"}
-            ]
+        return [
+            catalog_voice(
+                v.voice_id,
+                v.name or v.voice_id,
+                gender=(getattr(v, "labels", None) or {}).get("gender"),
+                voice_id=v.voice_id,
+                category=getattr(v, "category", None) or "",
+                description=getattr(v, "description", None) or "",
+            )
+            for v in voice_list
+        ]
     
     def is_available(self) -> bool:
         """Check if the service is properly configured"""
@@ -2,12 +2,37 @@ import os
 from google.cloud import texttospeech
 from typing import List, Dict, Optional
 import tempfile
-import asyncio
+
+from app.utils.audio import EXTENSIONS, wav_to_pcm
+from app.utils.tracing import span, run_in_executor
+from app.utils.voice_catalog import catalog_voice
+
+# LINEAR16 output comes with a WAV header, which is dropped for raw PCM
+AUDIO_ENCODINGS = {
+    "mp3": texttospeech.AudioEncoding.MP3,
+    "opus": texttospeech.AudioEncoding.OGG_OPUS,
+    "wav": texttospeech.AudioEncoding.LINEAR16,
+    "pcm": texttospeech.AudioEncoding.LINEAR16,
+}
 
 class GoogleTTSService:
+    # Every format at any sample rate (the API resamples)
+    OUTPUT_FORMATS = {"mp3": None, "opus": None, "wav": None, "pcm": None}
+
     def __init__(self):
-        # Initialize Google Cloud TTS client
-        self.client = texttospeech.TextToSpeechClient() if os.getenv("GOOGLE_APPLICATION_CREDENTIALS") else None
+        # Requires GOOGLE_APPLICATION_CREDENTIALS environment variable
+        self.configured = bool(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+        self._client = None
+        self._client_pid = None
+
+    @property
+    def client(self) -> Optional[texttospeech.TextToSpeechClient]:
+        # gRPC channels don't survive a fork, so the client is built on first
+        # use in the process that uses it (see app.cli.serve)
+        if self.configured and (self._client is None or self._client_pid != os.getpid()):
+            self._client = texttospeech.TextToSpeechClient()
+            self._client_pid = os.getpid()
+        return self._client
     
     async def synthesize(
         self,
@@ -15,10 +40,13 @@ class GoogleTTSService:
         voice: Optional[str] = None,
         language: str = "en-US",
         speed: float = 1.0,
-        pitch: float = 0.0
+        pitch: float = 0.0,
+        output_format: str = "mp3",
+        sample_rate: Optional[int] = None
     ) -> str:
         """
-        Synthesize speech using Google Cloud Text-to-Speech
+        Synthesize speech using Google Cloud Text-to-Speech, as `output_format`
+        at `sample_rate` (default: the voice's own rate)
         
         Returns:
             Path to the generated audio file
@@ -40,9 +68,10 @@ class GoogleTTSService:
                 
                 # Select the audio file type
                 audio_config = texttospeech.AudioConfig(
-                    audio_encoding=texttospeech.AudioEncoding.MP3,
+                    audio_encoding=AUDIO_ENCODINGS[output_format],
                     speaking_rate=speed,
-                    pitch=pitch
+                    pitch=pitch,
+                    sample_rate_hertz=sample_rate or 0
                 )
                 
                 # Perform synthesis
@@ -55,43 +84,37 @@ class GoogleTTSService:
                 return response.audio_content
             
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            audio_content = await loop.run_in_executor(None, _synthesize)
+            with span("provider.google_tts.synthesize", voice=voice, language=language, chars=len(text)):
+                audio_content = await run_in_executor(_synthesize)
+            if output_format == "pcm":
+                audio_content = wav_to_pcm(audio_content)
             
             # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                temp_file.write(audio_content)
-                return temp_file.name
+            with span("file.write", kind="tts_output", bytes=len(audio_content)):
+                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{EXTENSIONS[output_format]}") as temp_file:
+                    temp_file.write(audio_content)
+                    return temp_file.name
         
         except Exception as e:
             raise Exception(f"Google TTS synthesis failed: {str(e)}")
     
-    async def get_voices(self, language_code: str = "en-US") -> List[Dict]:
-        """Get available voices for the specified language"""
+    async def list_voices(self) -> List[Dict]:
+        """Every voice in every language, for the voice catalog"""
         if not self.client:
             return []
-        
-        try:
-            def _get_voices():
-                voices = self.client.list_voices(language_code=language_code)
-                return voices.voices
-            
-            loop = asyncio.get_event_loop()
-            voices = await loop.run_in_executor(None, _get_voices)
-            
-            return [
-                {
-                    "name": voice.name,
-                    "language": voice.language_codes[0] if voice.language_codes else language_code,
-                    "gender": voice.ssml_gender.name.lower()
-                }
-                for voice in voices
-            ]
-        
-        except Exception as e:
-            print(f"Failed to get Google TTS voices: {e}")
-            return []
+        with span("provider.google_tts.list_voices"):
+            voices = await run_in_executor(lambda: self.client.list_voices().voices)
+        return [
+            catalog_voice(
+                voice.name,
+                voice.name,
+                locale=voice.language_codes[0] if voice.language_codes else None,
+                gender=voice.ssml_gender.name,
+                natural_sample_rate=voice.natural_sample_rate_hertz,
+            )
+            for voice in voices
+        ]
     
     def is_available(self) -> bool:
         """Check if the service is properly configured"""
-        return self.client is not None 
\ No newline at end of file
+        return self.configured 
\ No newline at end of file
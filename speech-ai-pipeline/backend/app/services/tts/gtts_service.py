@@ -1,9 +1,15 @@
 from gtts import gTTS
+from gtts.lang import tts_langs
 from typing import List, Dict, Optional
 import tempfile
-import asyncio
+
+from app.utils.tracing import span, run_in_executor
+from app.utils.voice_catalog import catalog_voice
 
 class GTTSService:
+    # Google Translate returns 24 kHz MP3 only; callers transcode for anything else
+    OUTPUT_FORMATS = {"mp3": (24000,)}
+
     def __init__(self):
         pass  # gTTS is free and requires no API key
     
@@ -11,10 +17,12 @@ class GTTSService:
         self,
         text: str,
         language: str = "en",
-        speed: float = 1.0
+        speed: float = 1.0,
+        output_format: str = "mp3",
+        sample_rate: Optional[int] = None
     ) -> str:
         """
-        Synthesize speech using Google Translate TTS (gTTS)
+        Synthesize speech using Google Translate TTS (gTTS), always 24 kHz MP3
         
         Returns:
             Path to the generated audio file
@@ -35,47 +43,25 @@ class GTTSService:
                 temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
                 temp_file.close()
                 
-                # Save audio
-                tts.save(temp_file.name)
+                # Save audio (gTTS downloads while writing)
+                with span("provider.gtts.save", lang=lang_code, chars=len(text)):
+                    tts.save(temp_file.name)
                 
                 return temp_file.name
             
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            audio_file = await loop.run_in_executor(None, _synthesize)
+            audio_file = await run_in_executor(_synthesize)
             
             return audio_file
         
         except Exception as e:
             raise Exception(f"gTTS synthesis failed: {str(e)}")
     
-    async def get_voices(self, language: str = "en") -> List[Dict]:
-        """Get available gTTS 'voices' (languages)"""
-        # gTTS doesn't have different voices, just languages
-        supported_languages = {
-            "en": "English",
-            "es": "Spanish", 
-            "fr": "French",
-            "de": "German",
-            "it": "Italian",
-            "pt": "Portuguese",
-            "zh": "Chinese",
-            "ja": "Japanese",
-            "ko": "Korean",
-            "ar": "Arabic",
-            "hi": "Hindi",
-            "ru": "Russian"
-        }
-        
-        lang_code = language.split('-')[0] if '-' in language else language
-        
+    async def list_voices(self) -> List[Dict]:
+        """gTTS 'voices' for the voice catalog: one per language, named by its code"""
         return [
-            {
-                "name": "default",
-                "display_name": f"Default {supported_languages.get(lang_code, lang_code)} Voice",
-                "language": lang_code,
-                "gender": "neutral"
-            }
+            catalog_voice(code, code, locale=code, gender="neutral", display_name=f"Default {name} Voice")
+            for code, name in tts_langs().items()
         ]
     
     def is_available(self) -> bool:
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from app.utils.segmenter import SentenceSegmenter
+from app.utils.tracing import span, run_in_executor
+from app.utils.voice_catalog import catalog_voice
+
+try:
+    from piper import PiperVoice
+except ImportError:  # optional: only needed for the "local" TTS provider
+    PiperVoice = None
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+class LocalTTSService:
+    """
+    Offline neural TTS with Piper voices (small ONNX models) on the CPU.
+
+    Voices are `<name>.onnx` files with their `<name>.onnx.json` config in
+    LOCAL_TTS_VOICES_DIR, named like `en_US-lessac-medium`; they are loaded
+    at startup (LOCAL_TTS_PRELOAD, default all) and shared by all requests.
+    A text is split into sentences which are synthesized in parallel on a
+    dedicated pool of LOCAL_TTS_WORKERS threads, each ONNX session run
+    using LOCAL_TTS_SENTENCE_THREADS cores, then joined into one WAV file.
+    """
+
+    # WAV at the voice's own rate; callers resample or encode for anything else
+    OUTPUT_FORMATS = {"wav": ()}
+
+    def __init__(self):
+        self.voices_dir = os.getenv("LOCAL_TTS_VOICES_DIR", "voices")
+        self.default_voice = os.getenv("LOCAL_TTS_DEFAULT_VOICE", "en_US-lessac-medium")
+        self.preload = os.getenv("LOCAL_TTS_PRELOAD", "all")
+        self.sentence_threads = int(os.getenv("LOCAL_TTS_SENTENCE_THREADS", "1"))
+        self.sentence_pause_s = float(os.getenv("LOCAL_TTS_SENTENCE_PAUSE_MS", "150")) / 1000.0
+        workers = int(os.getenv("LOCAL_TTS_WORKERS", "0")) or (os.cpu_count() or 1)
+        self.logger = logging.getLogger("local_tts")
+        self._voices: Dict[str, object] = {}
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-tts")
+
+    def available_voices(self) -> List[str]:
+        """Names of the voices installed in the voices directory."""
+        if not os.path.isdir(self.voices_dir):
+            return []
+        return sorted(
+            name[:-len(".onnx")] for name in os.listdir(self.voices_dir)
+            if name.endswith(".onnx") and os.path.exists(os.path.join(self.voices_dir, f"{name}.json"))
+        )
+
+    async def list_voices(self) -> List[Dict]:
+        """Installed voices for the voice catalog; the locale is the first part of the name"""
+        return [catalog_voice(name, name, locale=name.split("-")[0]) for name in self.available_voices()]
+
+    def load_voices(self) -> List[str]:
+        """Load the voices named by LOCAL_TTS_PRELOAD ('all', 'none' or a comma-separated list)."""
+        if self.preload == "none":
+            return []
+        names = self.available_voices() if self.preload == "all" else [n.strip() for n in self.preload.split(",") if n.strip()]
+        for name in names:
+            self._voice(name)
+        return names
+
+    def _voice(self, name: str):
+        if name in self._voices:
+            return self._voices[name]
+        with self._load_lock:
+            if name not in self._voices:
+                model_path = os.path.join(self.voices_dir, f"{name}.onnx")
+                if not os.path.exists(model_path):
+                    raise Exception(f"Local TTS voice {name!r} is not installed in {self.voices_dir}")
+                start = time.perf_counter()
+                voice = PiperVoice.load(model_path, config_path=f"{model_path}.json")
+                if onnxruntime is not None:
+                    # Sentences run in parallel, so each session run gets a few cores instead of all of them
+                    options = onnxruntime.SessionOptions()
+                    options.intra_op_num_threads = self.sentence_threads
+                    options.inter_op_num_threads = 1
+                    voice.session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                                 providers=["CPUExecutionProvider"])
+                self._voices[name] = voice
+                self.logger.info(f"Loaded local TTS voice {name} in {time.perf_counter() - start:.1f}s")
+        return self._voices[name]
+
+    def select_voice(self, voice: Optional[str], language: Optional[str]) -> str:
+        """The requested voice, else the default or first installed voice for `language`."""
+        installed = self.available_voices()
+        if voice:
+            if voice not in installed:
+                raise Exception(f"Local TTS voice {voice!r} is not installed")
+            return voice
+        locale = (language or "en-US").replace("-", "_")
+        primary = locale.split("_")[0].lower()
+        for prefix in (locale, primary):
+            matches = [name for name in installed if name.split("-")[0] == prefix or name.split("_")[0] == prefix]
+            if self.default_voice in matches:
+                return self.default_voice
+            if matches:
+                return matches[0]
+        raise Exception(f"No local TTS voice installed for {language}")
+
+    async def synthesize(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        language: str = "en-US",
+        speed: float = 1.0,
+        pitch: float = 0.0,
+        output_format: str = "wav",
+        sample_rate: Optional[int] = None
+    ) -> str:
+        """
+        Synthesize speech with a local Piper voice (pitch is not supported),
+        as WAV at the voice's sample rate
+
+        Returns:
+            Path to the generated WAV file
+        """
+        if not self.is_available():
+            raise Exception("Local TTS needs the piper-tts package and at least one voice in "
+                            f"{self.voices_dir} (LOCAL_TTS_VOICES_DIR).")
+
+        try:
+            name = self.select_voice(voice, language)
+            piper_voice = await run_in_executor(self._voice, name)
+            segmenter = SentenceSegmenter(language, max_wait_s=None, strip_markup=False)
+            sentences = [s for s in segmenter.feed(text) + segmenter.flush() if s.strip()] or [text]
+            length_scale = getattr(piper_voice.config, "length_scale", 1.0) / (speed or 1.0)
+
+            with span("provider.local.synthesize", voice=name, chars=len(text), sentences=len(sentences)):
+                loop = asyncio.get_running_loop()
+                pcm = await asyncio.gather(*(
+                    loop.run_in_executor(self._executor, self._synthesize_sentence, piper_voice, sentence, length_scale)
+                    for sentence in sentences
+                ))
+                return await run_in_executor(self._write_wav, pcm, piper_voice.config.sample_rate)
+
+        except Exception as e:
+            raise Exception(f"Local TTS synthesis failed: {str(e)}")
+
+    @staticmethod
+    def _synthesize_sentence(voice, text: str, length_scale: float) -> bytes:
+        """16-bit mono PCM for one sentence."""
+        if hasattr(voice, "synthesize_stream_raw"):
+            # piper-tts 1.2
+            return b"".join(voice.synthesize_stream_raw(text, length_scale=length_scale))
+        from piper import SynthesisConfig
+        return b"".join(chunk.audio_int16_bytes for chunk in voice.synthesize(text, SynthesisConfig(length_scale=length_scale)))
+
+    def _write_wav(self, pcm: List[bytes], sample_rate: int) -> str:
+        pause = b"\x00\x00" * int(self.sentence_pause_s * sample_rate)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+            with wave.open(temp_file, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(sample_rate)
+                wav.writeframes(pause.join(pcm))
+            return temp_file.name
+
+    def is_available(self) -> bool:
+        """Check if the service can run: piper-tts is installed and a voice is present"""
+        return PiperVoice is not None and bool(self.available_voices())
+
+
+_local_tts_service: Optional[LocalTTSService] = None
+
+
+def get_local_tts_service() -> LocalTTSService:
+    """One instance (and one copy of each voice) per worker process, shared by every router."""
+    global _local_tts_service
+    if _local_tts_service is None:
+        _local_tts_service = LocalTTSService()
+    return _local_tts_service
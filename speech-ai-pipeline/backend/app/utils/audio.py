@@ -0,0 +1,98 @@
+import io
+import os
+import tempfile
+import wave
+from typing import Optional, Tuple, Union
+
+from pydub import AudioSegment
+
+# Output formats a client can ask for, with the extension and media type of each:
+# MP3, Opus in an Ogg container, 16-bit mono WAV, and the same samples as raw
+# little-endian PCM (no header, so its media type carries the rate)
+OUTPUT_FORMATS = ("mp3", "opus", "wav", "pcm")
+EXTENSIONS = {"mp3": "mp3", "opus": "ogg", "wav": "wav", "pcm": "pcm"}
+MEDIA_TYPES = {"mp3": "audio/mpeg", "opus": "audio/ogg; codecs=opus", "wav": "audio/wav", "pcm": "audio/pcm"}
+SAMPLE_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+DEFAULT_PCM_SAMPLE_RATE = 16000
+
+
+def audio_format(audio: Union[str, bytes]) -> str:
+    """
+    Output format of a TTS result, from its file name or, for bytes, its
+    header. Raw PCM has no header: bytes are never detected as 'pcm'.
+    """
+    if isinstance(audio, (bytes, bytearray)):
+        if audio[:4] == b"RIFF" and audio[8:12] == b"WAVE":
+            return "wav"
+        return "opus" if audio[:4] == b"OggS" else "mp3"
+    extension = os.path.splitext(audio)[1].lower().lstrip(".")
+    return {"wav": "wav", "ogg": "opus", "opus": "opus", "pcm": "pcm"}.get(extension, "mp3")
+
+
+def media_type(output_format: str, sample_rate: Optional[int] = None) -> str:
+    if output_format == "pcm":
+        return f"{MEDIA_TYPES['pcm']}; rate={sample_rate or DEFAULT_PCM_SAMPLE_RATE}; channels=1"
+    return MEDIA_TYPES[output_format]
+
+
+def audio_media_type(audio: Union[str, bytes], sample_rate: Optional[int] = None) -> str:
+    return media_type(audio_format(audio), sample_rate)
+
+
+def check_output(output_format: Optional[str], sample_rate: Optional[int]) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Validate a requested output format and sample rate (None: the provider's
+    own). Raises ValueError; raw PCM without a rate gets DEFAULT_PCM_SAMPLE_RATE.
+    """
+    if output_format is None:
+        if sample_rate is not None:
+            raise ValueError("sample_rate needs a format")
+        return None, None
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+    rates = OPUS_SAMPLE_RATES if output_format == "opus" else SAMPLE_RATES
+    if sample_rate is not None and sample_rate not in rates:
+        raise ValueError(f"sample_rate for {output_format} must be one of {', '.join(map(str, rates))}")
+    if output_format == "pcm" and sample_rate is None:
+        sample_rate = DEFAULT_PCM_SAMPLE_RATE
+    return output_format, sample_rate
+
+
+def wav_to_pcm(data: bytes) -> bytes:
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.readframes(wav.getnframes())
+
+
+def transcode(path: str, output_format: str, sample_rate: Optional[int] = None) -> str:
+    """
+    Convert a TTS result file to `output_format` at `sample_rate` (else its
+    own rate), replacing the file. WAV and PCM output from WAV input is
+    converted in-process; decoding MP3 or encoding MP3/Opus needs ffmpeg.
+    """
+    source_format = audio_format(path)
+    if source_format == "pcm":
+        raise ValueError("Raw PCM has no header to read its sample rate from")
+    segment = AudioSegment.from_file(path, format="ogg" if source_format == "opus" else source_format)
+    if output_format == "opus" and (sample_rate or segment.frame_rate) not in OPUS_SAMPLE_RATES:
+        sample_rate = 48000
+    if sample_rate and segment.frame_rate != sample_rate:
+        segment = segment.set_frame_rate(sample_rate)
+    if output_format in ("wav", "pcm"):
+        segment = segment.set_sample_width(2).set_channels(1)
+
+    fd, output_path = tempfile.mkstemp(suffix=f".{EXTENSIONS[output_format]}")
+    os.close(fd)
+    try:
+        if output_format == "pcm":
+            segment.export(output_path, format="raw")
+        elif output_format == "opus":
+            segment.export(output_path, format="ogg", codec="libopus")
+        else:
+            segment.export(output_path, format=output_format)
+    except Exception:
+        os.unlink(output_path)
+        raise
+    os.unlink(path)
+    return output_path
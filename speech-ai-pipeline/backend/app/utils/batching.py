@@ -0,0 +1,85 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Groups concurrent calls into batches for a blocking batch function.
+
+    The first waiting item opens a window of `window_s`; everything submitted
+    before it closes (up to `max_batch` items) becomes one call of
+    `process(items)` on `executor`. `process` returns one result per item, and
+    an Exception in place of a result fails only that item. Items that arrive
+    while a batch is running wait for the next one, so under load batches
+    fill up without waiting for the window.
+    """
+
+    def __init__(self, process: Callable[[List[Any]], List[Any]], max_batch: int = 8, window_s: float = 0.02,
+                 executor: Optional[Executor] = None):
+        self.process = process
+        self.max_batch = max(max_batch, 1)
+        self.window_s = window_s
+        self.executor = executor
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._filled: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches = 0
+        self._items = 0
+        self._busy_s = 0.0
+        self._sizes: Dict[int, int] = {}
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if self._filled is None:
+            self._filled = asyncio.Event()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._filled.set()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                self._filled.clear()
+                try:
+                    await asyncio.wait_for(self._filled.wait(), self.window_s)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [(item, future) for item, future in self._pending[:self.max_batch] if not future.cancelled()]
+            del self._pending[:self.max_batch]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, functools.partial(self.process, [item for item, _ in batch]))
+            except Exception as e:
+                results = [e] * len(batch)
+            self._busy_s += time.perf_counter() - start
+            self._batches += 1
+            self._items += len(batch)
+            self._sizes[len(batch)] = self._sizes.get(len(batch), 0) + 1
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "batch_sizes": dict(sorted(self._sizes.items())),
+            "mean_batch_ms": round(self._busy_s / self._batches * 1000, 1) if self._batches else 0.0,
+            "queued": len(self._pending),
+        }
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.tracing import run_in_executor
+
+logger = logging.getLogger("cache")
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable key for a tuple of request parameters (the same in every worker process)."""
+    return hashlib.sha256("\x1f".join("" if p is None else str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class CacheBackend:
+    """
+    Byte-valued cache with per-entry TTL and a size limit in bytes.
+
+    `get`/`set`/`delete` are blocking and thread-safe; request handlers use the
+    `*_async` variants, which move the call off the event loop when the backend
+    does I/O. Least recently used entries are evicted beyond `max_bytes`.
+    """
+
+    blocking = False
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def usage(self) -> Tuple[int, int]:
+        """(entries, bytes) currently stored."""
+        raise NotImplementedError
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        return await run_in_executor(self.get, key) if self.blocking else self.get(key)
+
+    async def set_async(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        if self.blocking:
+            await run_in_executor(self.set, key, value, ttl_s)
+        else:
+            self.set(key, value, ttl_s)
+
+    async def get_json(self, key: str) -> Any:
+        value = await self.get_async(key)
+        return json.loads(value) if value is not None else None
+
+    async def set_json(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        await self.set_async(key, json.dumps(value).encode("utf-8"), ttl_s)
+
+    def _count(self, hit: bool) -> None:
+        self._stats["hits" if hit else "misses"] += 1
+
+    def stats(self) -> Dict:
+        entries, size = self.usage()
+        stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(
+            backend=type(self).__name__,
+            entries=entries,
+            bytes=size,
+            max_bytes=self.max_bytes,
+            hit_ratio=round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        )
+        return stats
+
+
+class MemoryLRUCache(CacheBackend):
+    """In-process LRU; each worker process has its own copy."""
+
+    def __init__(self, name: str, max_bytes: int):
+        super().__init__(name, max_bytes)
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            self._count(entry is not None)
+            return entry[0] if entry is not None else None
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.time() + ttl_s if ttl_s else None)
+            self._bytes += len(value)
+            self._stats["sets"] += 1
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def usage(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a SQLite database in WAL mode, shared by every worker process on
+    the host (each cache is one table of the file).
+
+    Readers never block each other or the writer. Access times are refreshed
+    at most every `touch_interval_s` so hits stay read-only; after every
+    5% of `max_bytes` written by this process, the least recently used rows
+    are deleted until the table is back under 90% of `max_bytes`.
+    """
+
+    blocking = True
+
+    def __init__(self, name: str, max_bytes: int, path: str = "cache.db", touch_interval_s: float = 60.0):
+        super().__init__(name, max_bytes)
+        self.path = path
+        self.touch_interval_s = touch_interval_s
+        self._table = "cache_" + re.sub(r"\W", "_", name)
+        self._lock = threading.Lock()
+        self._written = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Other workers may hold the write lock briefly; wait instead of failing
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_accessed ON {self._table} (accessed_at)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT value, expires_at, accessed_at FROM {self._table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                self._db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                row = None
+            elif row is not None and now - row[2] > self.touch_interval_s:
+                self._db.execute(f"UPDATE {self._table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count(row is not None)
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now + ttl_s if ttl_s else None, now),
+            )
+            self._stats["sets"] += 1
+            self._written += len(value)
+            if self._written >= self.max_bytes // 20:
+                self._written = 0
+                self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def _evict(self, now: float) -> None:
+        self._db.execute(f"DELETE FROM {self._table} WHERE expires_at < ?", (now,))
+        total = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self._table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        victims = []
+        for key, size in self._db.execute(f"SELECT key, size FROM {self._table} ORDER BY accessed_at"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany(f"DELETE FROM {self._table} WHERE key = ?", victims)
+        self._stats["evictions"] += len(victims)
+        logger.info(f"Cache {self.name}: evicted {len(victims)} entries")
+
+    def usage(self) -> Tuple[int, int]:
+        with self._lock:
+            return tuple(self._db.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self._table}").fetchone())
+
+
+_caches: Dict[str, CacheBackend] = {}
+
+
+def get_cache(name: str, default_max_mb: float = 64) -> CacheBackend:
+    """
+    The process's cache called `name`: in-process (CACHE_BACKEND=memory, the
+    default) or shared through CACHE_SQLITE_PATH by all workers on the host
+    (CACHE_BACKEND=sqlite). Its size limit is `<NAME>_CACHE_MAX_MB`.
+    """
+    if name not in _caches:
+        backend = os.getenv("CACHE_BACKEND", "memory").lower()
+        max_bytes = int(float(os.getenv(f"{name.upper()}_CACHE_MAX_MB", str(default_max_mb))) * 1024 * 1024)
+        if backend == "sqlite":
+            _caches[name] = SQLiteCache(name, max_bytes, path=os.getenv("CACHE_SQLITE_PATH", "cache.db"))
+        elif backend == "memory":
+            _caches[name] = MemoryLRUCache(name, max_bytes)
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+        logger.info(f"Cache {name}: {type(_caches[name]).__name__}, {max_bytes // (1024 * 1024)} MB")
+    return _caches[name]
+
+
+def cache_stats() -> Dict[str, Dict]:
+    return {name: cache.stats() for name, cache in _caches.items()}
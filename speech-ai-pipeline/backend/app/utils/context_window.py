@@ -0,0 +1,290 @@
+import logging
+import math
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.tracing import span
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact counts for OpenAI models
+    tiktoken = None
+
+logger = logging.getLogger("context")
+
+# Context window of each model family (prefix match, longest prefix wins).
+# Ollama truncates the front of the prompt (system prompt included) beyond
+# its num_ctx, which defaults to 2048 tokens, so that is its limit here.
+MODEL_CONTEXT_TOKENS: Dict[str, Dict[str, int]] = {
+    "openai": {"gpt-3.5-turbo": 16385, "gpt-4": 8192, "gpt-4-32k": 32768, "gpt-4-turbo": 128000, "gpt-4o": 128000, "gpt-4.1": 1000000, "o1": 200000, "o3": 200000, "o4": 200000},
+    "anthropic": {"claude": 200000},
+    "ollama": {"": 2048},
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Average characters per token for Latin-script text, per provider tokenizer
+# family; non-ASCII characters (CJK in particular) count as about one token each.
+CHARS_PER_TOKEN = {"openai": 4.0, "anthropic": 3.5, "ollama": 3.6}
+NON_ASCII_TOKENS_PER_CHAR = 0.9
+# Per-message framing (role markers, separators) and reply priming
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?。！？])\s")
+
+
+def _content_text(message: Dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, str):
+        return content
+    # Content blocks ([{"type": "text", "text": ...}, ...])
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def _lookup(table: Dict[str, int], model: str) -> Optional[int]:
+    best = None
+    for prefix, value in table.items():
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, value)
+    return best[1] if best else None
+
+
+def context_limit(provider: str, model: Optional[str]) -> int:
+    return _lookup(MODEL_CONTEXT_TOKENS.get(provider, {}), model or "") or DEFAULT_CONTEXT_TOKENS
+
+
+@lru_cache(maxsize=32)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=8192)
+def _text_tokens(provider: str, model: str, text: str) -> int:
+    # Session histories resend the same messages every turn, so counts are memoized
+    if provider == "openai":
+        encoding = _encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    non_ascii = len(text) - ascii_chars
+    return math.ceil(ascii_chars / CHARS_PER_TOKEN.get(provider, 4.0) + non_ascii * NON_ASCII_TOKENS_PER_CHAR)
+
+
+class TokenCounter:
+    """
+    Prompt token counts per provider and model.
+
+    OpenAI models use tiktoken when it is installed. Everything else uses a
+    character-based estimate, calibrated at runtime against the prompt token
+    counts providers report: each model keeps a moving average of
+    reported / estimated which scales later estimates.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self._corrections: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def exact(self, provider: str) -> bool:
+        return provider == "openai" and tiktoken is not None
+
+    def count_text(self, provider: str, model: str, text: str) -> int:
+        return _text_tokens(provider, model, text)
+
+    def count_message(self, provider: str, model: str, message: Dict) -> int:
+        raw = MESSAGE_OVERHEAD_TOKENS + _text_tokens(provider, model, _content_text(message))
+        return math.ceil(raw * self._corrections.get((provider, model), 1.0))
+
+    def count_messages(self, provider: str, model: str, messages: List[Dict]) -> int:
+        return REPLY_OVERHEAD_TOKENS + sum(self.count_message(provider, model, m) for m in messages)
+
+    def calibrate(self, provider: str, model: str, estimated: int, reported: Optional[int]) -> None:
+        """Fold a provider-reported prompt token count into the model's correction factor."""
+        if not reported or estimated <= 0:
+            return
+        key = (provider, model)
+        with self._lock:
+            current = self._corrections.get(key, 1.0)
+            observed = reported / (estimated / current)
+            # Ignore implausible reports (e.g. Ollama only counting tokens missing from its prompt cache)
+            if not 0.33 <= observed <= 3.0:
+                return
+            self._corrections[key] = current + self.smoothing * (observed - current)
+
+    def corrections(self) -> Dict[str, float]:
+        return {f"{provider}:{model}": round(value, 3) for (provider, model), value in self._corrections.items()}
+
+
+class ContextWindow:
+    """
+    Fits chat messages into a token budget before they are sent to a provider.
+
+    The budget is `budget_tokens`, capped by the model's context window minus
+    the reply's `max_tokens`. Leading system messages and the latest user turn
+    (with anything after it) are always kept. Older turns are dropped oldest
+    first, whole user/assistant exchanges at a time, and the cut point only
+    advances `trim_step` exchanges at a time so the prompt prefix stays the
+    same across turns (provider prompt caches depend on it). With overflow="rollup"
+    the dropped turns are replaced by a short extractive summary (the first
+    sentence of the most recent dropped user turns, up to `rollup_tokens`) so
+    the model keeps the gist without another LLM call; overflow="trim" just
+    drops them.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = 4000,
+        overflow: str = "rollup",
+        rollup_tokens: int = 200,
+        trim_step: int = 4,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.budget_tokens = budget_tokens
+        self.overflow = overflow
+        self.rollup_tokens = rollup_tokens
+        self.trim_step = max(1, trim_step)
+        self.counter = counter or TokenCounter()
+        self._stats = {"requests": 0, "trimmed_requests": 0, "tokens_before": 0, "tokens_after": 0, "dropped_messages": 0}
+
+    def budget_for(self, provider: str, model: str, max_tokens: Optional[int]) -> int:
+        available = context_limit(provider, model) - (max_tokens or 0)
+        return max(0, min(self.budget_tokens, available) if self.budget_tokens > 0 else available)
+
+    def fit(self, messages: List[Dict], provider: str, model: str, max_tokens: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+        """Returns (messages to send, report). The report holds token counts before and after."""
+        counter = self.counter
+        budget = self.budget_for(provider, model, max_tokens)
+        counts = [counter.count_message(provider, model, m) for m in messages]
+        tokens_before = REPLY_OVERHEAD_TOKENS + sum(counts)
+
+        head = 0
+        while head < len(messages) and messages[head].get("role") == "system":
+            head += 1
+        tail = len(messages)
+        for i in range(len(messages) - 1, head - 1, -1):
+            if messages[i].get("role") == "user":
+                tail = i
+                break
+
+        kept, dropped = messages, []
+        if tokens_before > budget and tail > head:
+            fixed = REPLY_OVERHEAD_TOKENS + sum(counts[:head]) + sum(counts[tail:])
+            # Room for the roll-up is reserved so kept turns cannot crowd it out
+            limit = budget - (self.rollup_tokens if self.overflow == "rollup" else 0)
+            # Exchanges start at each user message (the first may be a stray assistant turn)
+            starts = [i for i in range(head, tail) if i == head or messages[i].get("role") == "user"]
+            ends = starts[1:] + [tail]
+            # Walk back from the newest exchange, keeping whole exchanges that fit
+            used = fixed
+            first = len(starts)
+            while first > 0:
+                cost = sum(counts[starts[first - 1]:ends[first - 1]])
+                if used + cost > limit:
+                    break
+                used += cost
+                first -= 1
+            # The cut only moves in steps of `trim_step` exchanges, so consecutive turns
+            # send the same prefix and provider prompt caches keep hitting
+            first = -(-first // self.trim_step) * self.trim_step
+            start = starts[first] if first < len(starts) else tail
+            used = fixed + sum(counts[start:tail])
+            if start > head:
+                dropped = messages[head:start]
+                rollup = self._rollup(dropped, provider, model, budget - used) if self.overflow == "rollup" else None
+                kept = messages[:head] + ([rollup] if rollup else []) + messages[start:]
+
+        tokens_after = tokens_before if kept is messages else counter.count_messages(provider, model, kept)
+        report = {
+            "budget_tokens": budget,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "messages_before": len(messages),
+            "messages_after": len(kept),
+            "dropped_messages": len(dropped),
+            "rolled_up": len(kept) != len(messages) - len(dropped),
+            "exact": counter.exact(provider),
+        }
+        self._stats["requests"] += 1
+        self._stats["tokens_before"] += tokens_before
+        self._stats["tokens_after"] += tokens_after
+        if dropped:
+            self._stats["trimmed_requests"] += 1
+            self._stats["dropped_messages"] += len(dropped)
+        if tokens_after > budget:
+            logger.warning(f"Prompt still over budget after trimming: {tokens_after} > {budget} tokens ({provider}/{model})")
+        return kept, report
+
+    def _rollup(self, dropped: List[Dict], provider: str, model: str, room: int) -> Optional[Dict]:
+        limit = min(self.rollup_tokens, room)
+        header = "Earlier in this conversation the user asked:"
+        used = self.counter.count_message(provider, model, {"content": header})
+        lines: List[str] = []
+        # User turns carry the topics; assistant openings are mostly filler
+        for message in reversed(dropped):
+            text = " ".join(_content_text(message).split())
+            if not text or message.get("role") != "user":
+                continue
+            line = "- " + _SENTENCE_END_RE.split(text, 1)[0][:200]
+            cost = self.counter.count_text(provider, model, line) + 1
+            if used + cost > limit:
+                break
+            used += cost
+            lines.append(line)
+        if not lines:
+            return None
+        return {"role": "system", "content": "\n".join([header] + lines[::-1])}
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+        stats["budget_tokens"] = self.budget_tokens
+        stats["overflow"] = self.overflow
+        stats["tokenizer"] = "tiktoken" if tiktoken is not None else "estimate"
+        stats["calibration"] = self.counter.corrections()
+        return stats
+
+
+_context_window: Optional[ContextWindow] = None
+
+
+def get_context_window() -> ContextWindow:
+    """The process-wide context window manager, configured from the environment on first use."""
+    global _context_window
+    if _context_window is None:
+        _context_window = ContextWindow(
+            budget_tokens=int(os.getenv("CONTEXT_BUDGET_TOKENS", "4000")),
+            overflow=os.getenv("CONTEXT_OVERFLOW", "rollup").lower(),
+            rollup_tokens=int(os.getenv("CONTEXT_ROLLUP_TOKENS", "200")),
+            trim_step=int(os.getenv("CONTEXT_TRIM_STEP", "4")),
+        )
+    return _context_window
+
+
+def fit_context(messages: List[Dict], provider: str, model: str, max_tokens: Optional[int]) -> Tuple[List[Dict], Dict]:
+    """Fit `messages` to the configured budget, recording the reduction on a span."""
+    with span("llm.context", provider=provider, model=model) as context_span:
+        fitted, report = get_context_window().fit(messages, provider, model, max_tokens)
+        context_span.set_attribute("tokens_before", report["tokens_before"])
+        context_span.set_attribute("tokens_after", report["tokens_after"])
+        context_span.set_attribute("dropped_messages", report["dropped_messages"])
+    if report["dropped_messages"]:
+        logger.info(
+            f"Context trimmed for {provider}/{model}: {report['tokens_before']} -> {report['tokens_after']} tokens, "
+            f"{report['dropped_messages']} message(s) dropped{' (rolled up)' if report['rolled_up'] else ''}"
+        )
+    return fitted, report
+
+
+def record_prompt_tokens(provider: str, model: str, report: Dict, reported: Optional[int]) -> None:
+    """Calibrate the estimator with the prompt token count a provider reported for a fitted request."""
+    report["provider_prompt_tokens"] = reported
+    if not report.get("exact"):
+        get_context_window().counter.calibrate(provider, model, report["tokens_after"], reported)
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from app.utils.monitor import runtime_monitor
+
+logger = logging.getLogger("degradation")
+
+# Each rule fires when any of its `when` limits is reached and stays active for
+# `hold_s` after the last time it did, so a rule doesn't flap around its limit.
+# Limits: in_flight (pipeline requests in progress), p95_ms (pipeline latency
+# over LATENCY_WINDOW_S), loop_lag_ms, executor_queue.
+# Actions: llm_model (model name prefix -> smaller model), llm_max_tokens (cap),
+# tts_provider (provider -> cheaper provider), skip_whisper_fallback.
+DEFAULT_RULES = [
+    {"name": "skip_whisper_fallback", "when": {"in_flight": 8, "p95_ms": 8000},
+     "skip_whisper_fallback": True},
+    {"name": "cheaper_tts", "when": {"in_flight": 12, "p95_ms": 10000},
+     "tts_provider": {"elevenlabs": "edge"}},
+    {"name": "smaller_llm", "when": {"in_flight": 16, "p95_ms": 12000},
+     "llm_model": {
+         "gpt-4": "gpt-4o-mini",
+         "claude-3-opus": "claude-3-haiku-20240307",
+         "claude-3-7-sonnet": "claude-3-5-haiku-20241022",
+         "claude-sonnet-4": "claude-3-5-haiku-20241022",
+         "claude-opus-4": "claude-sonnet-4-20250514",
+         "opus-4": "claude-sonnet-4-20250514",
+     }},
+    {"name": "shorter_answers", "when": {"in_flight": 24, "p95_ms": 15000},
+     "llm_max_tokens": 80},
+]
+
+SIGNALS = ("in_flight", "p95_ms", "loop_lag_ms", "executor_queue")
+
+
+def load_rules(spec: Optional[str]) -> List[Dict]:
+    """Rules from DEGRADATION_RULES: inline JSON, a path to a JSON file, or unset for the defaults."""
+    if not spec:
+        return DEFAULT_RULES
+    if spec.lstrip().startswith("["):
+        rules = json.loads(spec)
+    else:
+        with open(spec, encoding="utf-8") as f:
+            rules = json.load(f)
+    for rule in rules:
+        unknown = set(rule.get("when", {})) - set(SIGNALS)
+        if "name" not in rule or not rule.get("when") or unknown:
+            raise ValueError(f"Invalid degradation rule {rule!r}: needs a name and `when` limits from {SIGNALS}")
+    return rules
+
+
+def _map_prefix(mapping: Dict[str, str], value: Optional[str]) -> Optional[str]:
+    """The target of the longest key `value` starts with, if any."""
+    if not value:
+        return None
+    matches = [key for key in mapping if value.startswith(key)]
+    if not matches:
+        return None
+    target = mapping[max(matches, key=len)]
+    return target if target != value else None
+
+
+class DegradationPolicy:
+    """
+    Applies degradation rules to pipeline requests while the server is overloaded.
+
+    Load is read from the runtime monitor (in-flight pipeline requests,
+    pipeline p95 latency, event-loop lag, executor queue) at most once per
+    `eval_interval_s`. `apply()` returns the request's parameters after the
+    active rules have been applied, with the list of changes made.
+    """
+
+    def __init__(self, rules: List[Dict], enabled: bool = True, hold_s: float = 15.0, eval_interval_s: float = 1.0):
+        self.rules = rules
+        self.enabled = enabled
+        self.hold_s = hold_s
+        self.eval_interval_s = eval_interval_s
+        self._active_until: Dict[str, float] = {}
+        self._evaluated_at = 0.0
+        self._signals: Dict[str, float] = {}
+        self._applied: Dict[str, int] = {rule["name"]: 0 for rule in rules}
+        self._degraded_requests = 0
+
+    def signals(self) -> Dict[str, float]:
+        return {
+            "in_flight": runtime_monitor.in_flight.get("pipeline", 0),
+            "p95_ms": runtime_monitor.latency_percentile_ms("pipeline") or 0.0,
+            "loop_lag_ms": runtime_monitor.loop_lag_ms,
+            "executor_queue": runtime_monitor.executor_stats()["queue_depth"],
+        }
+
+    def active_rules(self) -> List[Dict]:
+        if not self.enabled:
+            return []
+        now = time.monotonic()
+        if now - self._evaluated_at >= self.eval_interval_s:
+            self._evaluated_at = now
+            self._signals = self.signals()
+            for rule in self.rules:
+                tripped = [f"{signal}={self._signals[signal]:.0f}>={limit}"
+                           for signal, limit in rule["when"].items() if self._signals[signal] >= limit]
+                if tripped:
+                    if rule["name"] not in self._active_until:
+                        logger.warning(f"Degradation '{rule['name']}' on: {', '.join(tripped)}")
+                    self._active_until[rule["name"]] = now + self.hold_s
+                elif rule["name"] in self._active_until and self._active_until[rule["name"]] < now:
+                    del self._active_until[rule["name"]]
+                    logger.info(f"Degradation '{rule['name']}' off")
+        return [rule for rule in self.rules if rule["name"] in self._active_until]
+
+    def apply(self, llm_model: Optional[str], llm_max_tokens: Optional[int], tts_provider: str,
+              tts_voice: Optional[str]) -> Dict:
+        """
+        Request parameters with the active degradations applied.
+
+        `llm_model` should already be resolved to the provider's default when
+        the client didn't name one. Switching TTS provider drops `tts_voice`,
+        since voice names are provider specific.
+        """
+        result = {
+            "llm_model": llm_model,
+            "llm_max_tokens": llm_max_tokens,
+            "tts_provider": tts_provider,
+            "tts_voice": tts_voice,
+            "skip_whisper_fallback": False,
+            "applied": [],
+        }
+        for rule in self.active_rules():
+            changes = []
+            smaller = _map_prefix(rule.get("llm_model") or {}, result["llm_model"])
+            if smaller:
+                changes.append(f"{result['llm_model']}->{smaller}")
+                result["llm_model"] = smaller
+            cap = rule.get("llm_max_tokens")
+            if cap and (result["llm_max_tokens"] is None or result["llm_max_tokens"] > cap):
+                changes.append(f"max_tokens={cap}")
+                result["llm_max_tokens"] = cap
+            cheaper = (rule.get("tts_provider") or {}).get(result["tts_provider"])
+            if cheaper and cheaper != result["tts_provider"]:
+                changes.append(f"{result['tts_provider']}->{cheaper}")
+                result["tts_provider"] = cheaper
+                result["tts_voice"] = None
+            if rule.get("skip_whisper_fallback") and not result["skip_whisper_fallback"]:
+                result["skip_whisper_fallback"] = True
+                changes.append("no_whisper_fallback")
+            if changes:
+                self._applied[rule["name"]] = self._applied.get(rule["name"], 0) + 1
+                result["applied"].append(f"{rule['name']}({', '.join(changes)})")
+        if result["applied"]:
+            self._degraded_requests += 1
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "signals": {name: round(value, 1) for name, value in self._signals.items()},
+            "active": list(self._active_until),
+            "degraded_requests": self._degraded_requests,
+            "applied": dict(self._applied),
+        }
+
+
+def degradation_header(applied: List[str]) -> str:
+    return "; ".join(applied) if applied else "none"
+
+
+_policy: Optional[DegradationPolicy] = None
+
+
+def get_degradation_policy() -> DegradationPolicy:
+    global _policy
+    if _policy is None:
+        _policy = DegradationPolicy(
+            load_rules(os.getenv("DEGRADATION_RULES")),
+            enabled=os.getenv("DEGRADATION", "on").lower() not in ("0", "off", "false", "no"),
+            hold_s=float(os.getenv("DEGRADATION_HOLD_S", "15")),
+        )
+    return _policy
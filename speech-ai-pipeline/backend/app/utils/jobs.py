@@ -0,0 +1,365 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.utils import tracing
+from app.utils.audio import EXTENSIONS, audio_format
+from app.utils.tracing import run_in_executor, span
+
+logger = logging.getLogger("jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+TERMINAL = (SUCCEEDED, FAILED, CANCELLED)
+
+_COLUMNS = ("id", "kind", "status", "params", "input_path", "created_at", "updated_at", "started_at",
+            "finished_at", "attempts", "lease_until", "error", "result", "audio_path")
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Persistent queue of pipeline jobs, run by a pool of asyncio workers.
+
+    Jobs, their parameters and results are rows in SQLite; uploaded input and
+    the reply audio are files in `files_dir`. A worker claims the oldest
+    queued job under a lease of `lease_s` that it renews while the job runs,
+    so a job whose process died is picked up again once its lease runs out
+    (at most `max_attempts` runs in total). Several processes can share one
+    database. Finished jobs and their files are deleted `ttl_s` after they
+    finish.
+
+    `runner(job)` does the work and returns the result dict; its `audio_file`
+    (a path, moved into `files_dir`) or `audio` (bytes) becomes the job's
+    audio.
+    """
+
+    def __init__(
+        self,
+        sqlite_path: str,
+        files_dir: str,
+        runner: Callable[[Dict], Awaitable[Dict]],
+        workers: int = 2,
+        ttl_s: float = 86400.0,
+        lease_s: float = 60.0,
+        max_attempts: int = 3,
+        max_queued: int = 1000,
+        poll_interval_s: float = 1.0,
+    ):
+        self.sqlite_path = sqlite_path
+        self.files_dir = files_dir
+        self.runner = runner
+        self.workers = workers
+        self.ttl_s = ttl_s
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.max_queued = max_queued
+        self.poll_interval_s = poll_interval_s
+        self._db_lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._running = 0
+        self._open_db(sqlite_path)
+        os.makedirs(files_dir, exist_ok=True)
+
+    # -- public API -----------------------------------------------------------
+
+    async def submit(self, kind: str, params: Dict, input_bytes: Optional[bytes] = None, input_suffix: str = "") -> Dict:
+        """Queue a job; `input_bytes` (e.g. uploaded audio) is stored next to it. Raises JobQueueFull."""
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.files_dir, f"{job_id}.in{input_suffix}") if input_bytes is not None else None
+        with span("jobs.submit", kind=kind, bytes=len(input_bytes or b"")):
+            job = await run_in_executor(self._db_submit, job_id, kind, params, input_path, input_bytes, time.time())
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"Job {job_id} queued ({kind})")
+        return job
+
+    async def get(self, job_id: str) -> Dict:
+        job = await run_in_executor(self._db_get, job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    async def delete(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a queued job or delete a finished one with its files. Returns
+        the job as it was, or None if it is running (it can't be interrupted).
+        """
+        job = await run_in_executor(self._db_delete, job_id, time.time())
+        if job is None:
+            raise JobNotFound(job_id)
+        if job["status"] == RUNNING:
+            return None
+        self._notify(job_id)
+        return job
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> bool:
+        """Wait until this process updates the job, or `timeout`; True if it changed."""
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stats(self) -> Dict:
+        counts = await run_in_executor(self._db_counts)
+        return {
+            "workers": self.workers,
+            "running_here": self._running,
+            "jobs": counts,
+            "ttl_s": self.ttl_s,
+        }
+
+    # -- workers --------------------------------------------------------------
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(loop.create_task(self._janitor()))
+        logger.info(f"Job queue started: {self.workers} worker(s), database {self.sqlite_path}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await run_in_executor(self._db_claim, time.time())
+            except Exception as e:
+                logger.exception(f"Job worker {index}: claiming a job failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict) -> None:
+        job_id = job["id"]
+        self._notify(job_id)
+        trace_token = tracing.start_trace(job_id)
+        lease = asyncio.get_running_loop().create_task(self._renew_lease(job_id))
+        self._running += 1
+        status, result, audio_path, error = FAILED, None, None, None
+        try:
+            logger.info(f"Job {job_id} started (attempt {job['attempts']})")
+            with span("jobs.run", job_id=job_id, kind=job["kind"], attempt=job["attempts"]):
+                result = dict(await self.runner(job))
+            audio_path = await run_in_executor(self._store_audio, job_id, result.pop("audio_file", None),
+                                               result.pop("audio", None), result.get("audio_format"))
+            status = SUCCEEDED
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so another worker (or the next start) runs it
+            self._db_release(job_id)
+            raise
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e) or type(e).__name__
+            logger.warning(f"Job {job_id} failed: {error}")
+        finally:
+            lease.cancel()
+            self._running -= 1
+            tracing.end_trace(trace_token)
+        await run_in_executor(self._db_finish, job_id, status, result, audio_path, error, time.time())
+        self._notify(job_id)
+        logger.info(f"Job {job_id} {status}")
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            await run_in_executor(self._db_renew, job_id, time.time())
+
+    async def _janitor(self) -> None:
+        while True:
+            try:
+                await run_in_executor(self._db_purge_expired, time.time())
+            except Exception as e:
+                logger.warning(f"Purging expired jobs failed: {e}")
+            await asyncio.sleep(min(self.ttl_s, 300.0))
+
+    def _notify(self, job_id: str) -> None:
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    # -- files and SQLite (called on executor threads) ---------------------------
+
+    def _store_audio(self, job_id: str, audio_file: Optional[str], audio: Optional[bytes],
+                     fmt: Optional[str] = None) -> Optional[str]:
+        # Cached raw PCM can't be told from MP3 by its bytes, so the result's format names the file
+        if audio_file:
+            path = os.path.join(self.files_dir, f"{job_id}.{EXTENSIONS[fmt or audio_format(audio_file)]}")
+            shutil.move(audio_file, path)
+        elif audio is not None:
+            path = os.path.join(self.files_dir, f"{job_id}.{EXTENSIONS[fmt or audio_format(audio)]}")
+            with open(path, "wb") as f:
+                f.write(audio)
+        else:
+            return None
+        return path
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, input_path TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, error TEXT, result TEXT, audio_path TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        job = dict(zip(_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _select(self, job_id: str) -> Optional[Dict]:
+        row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _db_submit(self, job_id: str, kind: str, params: Dict, input_path: Optional[str],
+                   input_bytes: Optional[bytes], now: float) -> Dict:
+        with self._db_lock:
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"{queued} jobs already queued")
+            if input_path:
+                with open(input_path, "wb") as f:
+                    f.write(input_bytes)
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, params, input_path, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), input_path, now, now),
+            )
+            return self._select(job_id)
+
+    def _db_get(self, job_id: str) -> Optional[Dict]:
+        with self._db_lock:
+            return self._select(job_id)
+
+    def _db_claim(self, now: float) -> Optional[Dict]:
+        with self._db_lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't claim the same job
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, "Worker stopped during the last attempt", now, now, RUNNING, now, self.max_attempts),
+                )
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_until = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (RUNNING, now, now + self.lease_s, now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            return self._select(row[0]) if row is not None else None
+
+    def _db_renew(self, job_id: str, now: float) -> None:
+        with self._db_lock:
+            self._db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?", (now + self.lease_s, job_id, RUNNING))
+
+    def _db_release(self, job_id: str) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = ?",
+                (QUEUED, job_id, RUNNING),
+            )
+
+    def _db_finish(self, job_id: str, status: str, result: Optional[Dict], audio_path: Optional[str],
+                   error: Optional[str], now: float) -> None:
+        with self._db_lock:
+            job = self._select(job_id)
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, audio_path = ?, error = ?, finished_at = ?, updated_at = ?, "
+                "lease_until = NULL WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, audio_path, error, now, now, job_id),
+            )
+        # The input is no longer needed once the job has finished
+        if job and job["input_path"]:
+            self._remove_file(job["input_path"])
+
+    def _db_delete(self, job_id: str, now: float) -> Optional[Dict]:
+        with self._db_lock:
+            job = self._select(job_id)
+            if job is None or job["status"] == RUNNING:
+                return job
+            if job["status"] == QUEUED:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, updated_at = ? WHERE id = ?", (CANCELLED, now, now, job_id)
+                )
+            else:
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        for path in (job["input_path"], job["audio_path"]):
+            if path:
+                self._remove_file(path)
+        return job
+
+    def _db_counts(self) -> Dict[str, int]:
+        with self._db_lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _db_purge_expired(self, now: float) -> None:
+        cutoff = now - self.ttl_s
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT id, input_path, audio_path FROM jobs WHERE status IN ({', '.join('?' * len(TERMINAL))}) "
+                "AND finished_at < ?",
+                (*TERMINAL, cutoff),
+            ).fetchall()
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(row[0],) for row in rows])
+        for _, input_path, audio_path in rows:
+            for path in (input_path, audio_path):
+                if path:
+                    self._remove_file(path)
+        if rows:
+            logger.info(f"Purged {len(rows)} expired job(s)")
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
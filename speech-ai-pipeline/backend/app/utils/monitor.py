@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+logger = logging.getLogger("monitor")
+
+MONITOR_INTERVAL_S = float(os.getenv("MONITOR_INTERVAL_S", "0.5"))
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "100"))
+EXECUTOR_QUEUE_WARN = int(os.getenv("EXECUTOR_QUEUE_WARN", "8"))
+# Minimum seconds between two warnings of the same kind, so a stall doesn't flood the log
+MONITOR_WARN_COOLDOWN_S = float(os.getenv("MONITOR_WARN_COOLDOWN_S", "10"))
+
+# Request durations kept per router for latency percentiles
+LATENCY_WINDOW_S = float(os.getenv("LATENCY_WINDOW_S", "60"))
+LATENCY_SAMPLES = 500
+
+# Route prefixes reported as separate routers; anything else is counted as "other"
+ROUTER_PREFIXES = ("/api/pipeline", "/api/stt", "/api/llm", "/api/tts")
+
+
+def router_for_path(path: str) -> str:
+    for prefix in ROUTER_PREFIXES:
+        if path.startswith(prefix):
+            return prefix.rsplit("/", 1)[-1]
+    return "other"
+
+
+class RuntimeMonitor:
+    """
+    Samples event-loop lag and default-executor saturation in the background,
+    counts in-flight requests per router and keeps recent request durations.
+    """
+
+    def __init__(self, interval: float = MONITOR_INTERVAL_S):
+        self.interval = interval
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self.loop_lag_ms = 0.0
+        self.loop_lag_max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._last_warning: Dict[str, float] = {}
+
+    # -- request accounting -------------------------------------------------
+
+    def request_started(self, path: str) -> str:
+        router = router_for_path(path)
+        self.in_flight[router] += 1
+        return router
+
+    def request_finished(self, router: str, duration_s: Optional[float] = None) -> None:
+        self.in_flight[router] = max(0, self.in_flight[router] - 1)
+        if duration_s is not None:
+            self.durations[router].append((time.monotonic(), duration_s))
+
+    def latency_percentile_ms(self, router: str, percentile: float = 95.0, window_s: float = LATENCY_WINDOW_S) -> Optional[float]:
+        """Percentile of the router's request durations over the last `window_s`; None without samples."""
+        cutoff = time.monotonic() - window_s
+        recent = sorted(duration for finished, duration in self.durations.get(router, ()) if finished >= cutoff)
+        if not recent:
+            return None
+        index = min(len(recent) - 1, int(len(recent) * percentile / 100.0))
+        return recent[index] * 1000.0
+
+    # -- sampling -----------------------------------------------------------
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self.loop_lag_ms = lag_ms
+            self.loop_lag_max_ms = max(self.loop_lag_max_ms, lag_ms)
+            if lag_ms >= LOOP_LAG_WARN_MS:
+                self._warn("loop_lag", f"Event loop lag {lag_ms:.0f}ms (threshold {LOOP_LAG_WARN_MS:.0f}ms), in-flight={dict(self.in_flight)}")
+            executor = self.executor_stats()
+            if executor["queue_depth"] >= EXECUTOR_QUEUE_WARN:
+                self._warn(
+                    "executor_queue",
+                    f"Default executor saturated: queue={executor['queue_depth']} "
+                    f"active={executor['active_threads']}/{executor['max_workers']}",
+                )
+
+    def _warn(self, kind: str, message: str) -> None:
+        now = time.monotonic()
+        if now - self._last_warning.get(kind, 0.0) >= MONITOR_WARN_COOLDOWN_S:
+            self._last_warning[kind] = now
+            logger.warning(message)
+
+    @staticmethod
+    def executor_stats() -> Dict[str, int]:
+        """Inspect the loop's default ThreadPoolExecutor (created on first use)."""
+        try:
+            executor = getattr(asyncio.get_running_loop(), "_default_executor", None)
+        except RuntimeError:
+            executor = None
+        if executor is None:
+            return {"queue_depth": 0, "threads": 0, "active_threads": 0, "max_workers": 0}
+        threads = len(getattr(executor, "_threads", ()))
+        queue_depth = executor._work_queue.qsize()
+        if queue_depth > 0:
+            # A backlog means every worker is busy
+            active = threads
+        else:
+            idle_semaphore = getattr(executor, "_idle_semaphore", None)
+            idle = getattr(idle_semaphore, "_value", 0) if idle_semaphore is not None else 0
+            active = max(0, threads - idle)
+        return {
+            "queue_depth": queue_depth,
+            "threads": threads,
+            "active_threads": active,
+            "max_workers": getattr(executor, "_max_workers", 0),
+        }
+
+    def snapshot(self, reset_max: bool = False) -> Dict:
+        data = {
+            "loop_lag_ms": round(self.loop_lag_ms, 2),
+            "loop_lag_max_ms": round(self.loop_lag_max_ms, 2),
+            "executor": self.executor_stats(),
+            "in_flight": dict(self.in_flight),
+            "p95_ms": {},
+        }
+        for router in list(self.durations):
+            p95 = self.latency_percentile_ms(router)
+            if p95 is not None:
+                data["p95_ms"][router] = round(p95, 1)
+        if reset_max:
+            self.loop_lag_max_ms = self.loop_lag_ms
+        return data
+
+
+runtime_monitor = RuntimeMonitor()
@@ -0,0 +1,178 @@
+import gc
+import importlib
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("prefork")
+
+# Modules the SDKs import only when a client is first built or used; importing
+# them in the pre-fork parent keeps them in the pages every worker shares
+PRELOAD_MODULES = (
+    "openai.resources.chat",
+    "openai.resources.audio",
+    "anthropic.resources.messages",
+    "google.cloud.speech_v1.services.speech.transports.grpc",
+    "google.cloud.texttospeech_v1.services.text_to_speech.transports.grpc",
+    "elevenlabs.text_to_speech",
+)
+TIKTOKEN_ENCODINGS = ("cl100k_base", "o200k_base")
+
+
+def _process_start_time() -> float:
+    """When this process started (Linux), else now: the app is imported right after start."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its closing parenthesis
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+_state: Dict = {"mode": "single", "worker": None, "started_at": _process_start_time(), "preload_s": None, "boot_s": None}
+
+
+def preload() -> Dict:
+    """
+    Load what every worker needs and never changes, in the parent before it
+    forks: SDK submodules, HTTP client machinery, tokenizer tables, local TTS
+    voices and the local STT model files.
+
+    Nothing here may open a socket or start a thread: the children would
+    inherit a connection they share with each other, or a thread pool that
+    no longer exists. Network clients are built lazily in each worker.
+    """
+    start = time.perf_counter()
+    report: Dict = {"modules": 0, "encodings": [], "local_tts_voices": [], "local_stt_model": None}
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+            report["modules"] += 1
+        except Exception as e:
+            logger.debug(f"Not preloading {name}: {e}")
+    _warm_http_clients()
+    report["encodings"] = _load_encodings()
+    report["local_tts_voices"] = _load_local_tts_voices()
+    report["local_stt_model"] = _fetch_local_stt_model()
+    _state["preload_s"] = round(time.perf_counter() - start, 2)
+    report["preload_s"] = _state["preload_s"]
+    return report
+
+
+def _warm_http_clients() -> None:
+    # Building a client imports its transport stack (httpx, anyio, h11 and the
+    # resource classes); the throwaway clients never connect
+    try:
+        from openai import OpenAI
+        client = OpenAI(api_key="preload")
+        client.chat.completions, client.audio.transcriptions
+        client.close()
+    except Exception as e:
+        logger.debug(f"Not warming the OpenAI client: {e}")
+    try:
+        from anthropic import Anthropic
+        client = Anthropic(api_key="preload")
+        client.messages
+        client.close()
+    except Exception as e:
+        logger.debug(f"Not warming the Anthropic client: {e}")
+
+
+def _load_encodings() -> List[str]:
+    from app.utils.context_window import tiktoken
+    if tiktoken is None:
+        return []
+    loaded = []
+    for name in TIKTOKEN_ENCODINGS:
+        try:
+            tiktoken.get_encoding(name)
+            loaded.append(name)
+        except Exception as e:
+            logger.warning(f"Could not preload tiktoken encoding {name}: {e}")
+    return loaded
+
+
+def _load_local_tts_voices() -> List[str]:
+    from app.services.tts.local_service import get_local_tts_service
+    service = get_local_tts_service()
+    if not service.is_available():
+        return []
+    # An ONNX session with more than one intra-op thread starts its thread pool
+    # when it is created, which would not survive the fork
+    if service.sentence_threads != 1:
+        logger.info("Local TTS voices load in each worker (LOCAL_TTS_SENTENCE_THREADS > 1)")
+        return []
+    try:
+        return service.load_voices()
+    except Exception as e:
+        logger.warning(f"Preloading local TTS voices failed: {e}")
+        return []
+
+
+def _fetch_local_stt_model() -> Optional[str]:
+    # CTranslate2 starts its worker threads when the model is constructed, so
+    # the model itself loads after the fork; the parent downloads the files and
+    # reads them into the page cache so every worker loads them from memory
+    from app.services.stt.local_whisper_service import WhisperModel, get_local_whisper_service
+    if WhisperModel is None or os.getenv("LOCAL_STT_PRELOAD", "off").lower() not in ("1", "on", "true", "yes"):
+        return None
+    try:
+        path = get_local_whisper_service().fetch_model()
+        for root, _, files in os.walk(path):
+            for name in files:
+                with open(os.path.join(root, name), "rb") as f:
+                    while f.read(8 * 1024 * 1024):
+                        pass
+        return path
+    except Exception as e:
+        logger.warning(f"Fetching the local STT model failed: {e}")
+        return None
+
+
+def after_fork(worker: int) -> None:
+    """First thing a forked worker runs."""
+    _state.update(mode="prefork", worker=worker, started_at=time.time(), boot_s=None)
+    # The parent disabled the collector and froze its objects so that
+    # collections here don't write to (and so copy) the shared pages
+    gc.enable()
+
+
+def mark_ready() -> None:
+    _state["boot_s"] = round(time.time() - _state["started_at"], 2)
+    logger.info(f"Worker ready: pid {os.getpid()} booted in {_state['boot_s']:.2f}s ({_state['mode']})")
+
+
+def _memory_mb() -> Dict[str, float]:
+    """Resident, proportional (shared pages split between their users) and private memory."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        import resource
+        return {"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "private_mb": round(private / 1024, 1),
+        "shared_mb": round((fields.get("Rss", 0) - private) / 1024, 1),
+    }
+
+
+def process_stats() -> Dict:
+    return {
+        "pid": os.getpid(),
+        "mode": _state["mode"],
+        "worker": _state["worker"],
+        "preload_s": _state["preload_s"],
+        "boot_s": _state["boot_s"],
+        **_memory_mb(),
+    }
@@ -0,0 +1,158 @@
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+from app.utils.monitor import ROUTER_PREFIXES
+from app.utils.tracing import valid_trace_id
+
+logger = logging.getLogger("profiling")
+
+# Profiling is disabled unless a token is configured
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "30"))
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+# Whether this module started tracemalloc, as opposed to PYTHONTRACEMALLOC or other code
+_tracemalloc_owned = False
+
+
+def profiling_requested(request) -> bool:
+    """
+    True when the request carries a valid profiling token in the `X-Profile`
+    header or `profile` query parameter on one of the API routers.
+    """
+    if not PROFILE_TOKEN:
+        return False
+    supplied = request.headers.get("X-Profile") or request.query_params.get("profile")
+    if not supplied or not request.url.path.startswith(ROUTER_PREFIXES):
+        return False
+    return hmac.compare_digest(supplied, PROFILE_TOKEN)
+
+
+class StackSampler:
+    """Periodically samples the Python stacks of all threads into folded-stack counts."""
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def folded(self) -> str:
+        """Collapsed stacks, compatible with flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+def _tracemalloc_acquire() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _tracemalloc_release() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+class RequestProfile:
+    """
+    CPU sampling profile plus tracemalloc allocation diff for one request.
+
+    Both are process-wide: the sampler records every thread (the event loop and
+    the shared executor threads serve other requests too), and tracemalloc
+    counts all allocations, so work from requests running at the same time is
+    included in the folded stacks and the diff.
+    """
+
+    def __init__(self, trace_id: str, label: str):
+        # The id names the output files, so it must not be a path
+        if not valid_trace_id(trace_id):
+            raise ValueError(f"Invalid trace id for a profile: {trace_id!r}")
+        self.trace_id = trace_id
+        self.label = label
+        self.sampler = StackSampler()
+        self._snapshot_before = None
+        self._start = 0.0
+        self._acquired = False
+
+    def start(self) -> None:
+        _tracemalloc_acquire()
+        self._acquired = True
+        self._snapshot_before = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self) -> str:
+        """Stop profiling and write the results; returns the output file prefix."""
+        self.sampler.stop()
+        if not self._acquired:
+            raise RuntimeError("Profile was never started")
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        try:
+            if self._snapshot_before is None:
+                raise RuntimeError("Profile start did not complete")
+            snapshot_after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            self._acquired = False
+            _tracemalloc_release()
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        prefix = os.path.join(PROFILE_DIR, self.trace_id)
+        with open(f"{prefix}.cpu.folded", "w", encoding="utf-8") as f:
+            f.write(self.sampler.folded())
+
+        stats = snapshot_after.compare_to(self._snapshot_before, "lineno")
+        with open(f"{prefix}.mem.txt", "w", encoding="utf-8") as f:
+            f.write(f"# {self.label}\n")
+            f.write(f"# duration_ms={duration_ms:.1f} cpu_samples={self.sampler.sample_count} "
+                    f"traced_current={current} traced_peak={peak}\n")
+            for stat in stats[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        logger.info(f"Profile written to {prefix}.* ({duration_ms:.0f}ms, {self.sampler.sample_count} samples)")
+        return prefix
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Anthropic allows at most four cache breakpoints per request
+ANTHROPIC_MAX_BREAKPOINTS = 4
+_EPHEMERAL = {"type": "ephemeral"}
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def prompt_caching_enabled() -> bool:
+    return os.getenv("PROMPT_CACHING", "on").lower() not in ("0", "off", "false", "no")
+
+
+def _text_block(text: str, cached: bool) -> Dict:
+    block = {"type": "text", "text": text}
+    if cached:
+        block["cache_control"] = _EPHEMERAL
+    return block
+
+
+def _with_breakpoint(message: Dict) -> Dict:
+    """A copy of `message` whose last content block carries a cache breakpoint."""
+    content = message.get("content") or ""
+    if isinstance(content, str):
+        blocks = [_text_block(content, True)]
+    else:
+        blocks = [dict(block) for block in content]
+        if blocks:
+            blocks[-1]["cache_control"] = _EPHEMERAL
+    return {**message, "content": blocks}
+
+
+def anthropic_request(system_parts: List[str], messages: List[Dict]) -> Tuple[object, List[Dict]]:
+    """
+    System prompt and messages for `messages.create` with cache breakpoints.
+
+    Breakpoints go on the first system block (the stable system prompt), the
+    last one (which also covers a context roll-up) and the last two user
+    turns: the newest writes the conversation prefix to the cache and the one
+    before it reads what the previous turn wrote. Input messages are not
+    modified. With caching disabled the system prompt is a plain string.
+    """
+    if not prompt_caching_enabled():
+        return "\n\n".join(system_parts), messages
+    system = [_text_block(text, i == 0 or i == len(system_parts) - 1) for i, text in enumerate(system_parts) if text]
+    remaining = min(2, ANTHROPIC_MAX_BREAKPOINTS - sum(1 for block in system if "cache_control" in block))
+    marked = list(messages)
+    for i in range(len(marked) - 1, -1, -1):
+        if remaining <= 0:
+            break
+        if marked[i].get("role") == "user":
+            marked[i] = _with_breakpoint(marked[i])
+            remaining -= 1
+    return system, marked
+
+
+def prompt_cache_key(messages: List[Dict]) -> Optional[str]:
+    """
+    Routing key for OpenAI prompt caching: the same for every turn of a
+    conversation (system prompt plus first user message), so its requests
+    land where the shared prefix is already cached.
+    """
+    if not prompt_caching_enabled():
+        return None
+    head = []
+    for message in messages:
+        head.append(f"{message.get('role')}:{message.get('content')}")
+        if message.get("role") == "user":
+            break
+    return hashlib.sha256("\n".join(head).encode("utf-8")).hexdigest()[:32]
+
+
+def openai_usage(usage) -> Dict:
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    return {
+        "prompt_tokens": usage.prompt_tokens if usage else 0,
+        "completion_tokens": usage.completion_tokens if usage else 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "cache_write_tokens": 0,
+    }
+
+
+def anthropic_usage(usage) -> Dict:
+    # Anthropic's input_tokens only counts the uncached part of the prompt
+    cached = (getattr(usage, "cache_read_input_tokens", None) or 0) if usage else 0
+    written = (getattr(usage, "cache_creation_input_tokens", None) or 0) if usage else 0
+    return {
+        "prompt_tokens": (usage.input_tokens if usage else 0) + cached + written,
+        "completion_tokens": usage.output_tokens if usage else 0,
+        "cached_tokens": cached,
+        "cache_write_tokens": written,
+    }
+
+
+def ollama_usage(result: Dict) -> Dict:
+    # Ollama reuses the KV cache of a matching prompt prefix on its own but does not
+    # report how much was reused; prompt_eval_count covers only the evaluated part
+    return {
+        "prompt_tokens": result.get("prompt_eval_count") or 0,
+        "completion_tokens": result.get("eval_count") or 0,
+        "cached_tokens": None,
+        "cache_write_tokens": None,
+    }
+
+
+def record_usage(provider: str, details: Dict) -> None:
+    """Add a response's token details to the per-provider totals shown in /metrics."""
+    with _stats_lock:
+        totals = _stats.setdefault(provider, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0})
+        totals["requests"] += 1
+        for key in ("prompt_tokens", "cached_tokens", "cache_write_tokens"):
+            totals[key] += details.get(key) or 0
+
+
+def prompt_cache_stats() -> Dict:
+    with _stats_lock:
+        stats = {provider: dict(totals) for provider, totals in _stats.items()}
+    for totals in stats.values():
+        totals["cached_ratio"] = round(totals["cached_tokens"] / totals["prompt_tokens"], 3) if totals["prompt_tokens"] else 0.0
+    return {"enabled": prompt_caching_enabled(), "providers": stats}
@@ -0,0 +1,285 @@
+import inspect
+import logging
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("routing")
+
+AUTO = "auto"
+
+# Providers considered for `auto`, in tie-break order
+PROVIDERS = {
+    "stt": ["google", "azure", "whisper", "local"],
+    "llm": ["openai", "anthropic", "ollama"],
+    "tts": ["edge", "google", "elevenlabs", "gtts", "local"],
+}
+
+# Latency assumed before a provider has been measured (ms)
+PRIOR_LATENCY_MS = {
+    "stt": {"google": 900, "azure": 900, "whisper": 1500, "local": 1500},
+    "llm": {"openai": 1000, "anthropic": 1200, "ollama": 2000},
+    "tts": {"edge": 700, "google": 600, "elevenlabs": 1000, "gtts": 1200, "local": 800},
+}
+
+# Supported languages, matched on the primary subtag ("en-GB" matches "en-US"); None means any.
+# Local TTS speaks whatever voices are installed; a language without one fails over to the next provider.
+_COMMON_LANGUAGES = ["en", "es", "fr", "de", "it", "pt", "ja", "ko", "zh"]
+LANGUAGES = {
+    "stt": {"google": _COMMON_LANGUAGES, "azure": _COMMON_LANGUAGES, "whisper": None, "local": None},
+    "tts": {"edge": _COMMON_LANGUAGES, "google": _COMMON_LANGUAGES, "elevenlabs": _COMMON_LANGUAGES,
+            "gtts": _COMMON_LANGUAGES, "local": None},
+}
+
+# Model name prefixes served by each cloud provider; any other name is taken to be an Ollama model
+MODEL_PREFIXES = {
+    "openai": ("gpt-", "chatgpt-", "o1", "o3", "o4"),
+    "anthropic": ("claude-",),
+}
+
+_EDGE_VOICE = re.compile(r"^[a-z]{2,3}-[A-Z]{2}-\w+Neural$")
+_GOOGLE_VOICE = re.compile(r"^[a-z]{2,3}-[A-Z]{2}-\w+-[A-Z]$")
+_PIPER_VOICE = re.compile(r"^[a-z]{2,3}_[A-Z]{2}-\w+-(x_low|low|medium|high)$")
+
+
+class NoProviderAvailable(RuntimeError):
+    pass
+
+
+def _primary_language(language: Optional[str]) -> str:
+    return (language or "").replace("_", "-").split("-")[0].lower()
+
+
+def supports_model(provider: str, model: Optional[str]) -> bool:
+    if not model:
+        return True
+    owner = next((name for name, prefixes in MODEL_PREFIXES.items() if model.startswith(prefixes)), "ollama")
+    return provider == owner
+
+
+def supports_voice(provider: str, voice: Optional[str]) -> bool:
+    """Voice names are provider specific, so a named voice pins `auto` TTS to the providers that know it."""
+    if not voice:
+        return True
+    if _EDGE_VOICE.match(voice):
+        return provider == "edge"
+    if _GOOGLE_VOICE.match(voice):
+        return provider == "google"
+    if _PIPER_VOICE.match(voice):
+        return provider == "local"
+    if voice == "default":
+        return provider == "gtts"
+    return provider == "elevenlabs"
+
+
+class _ProviderStats:
+    __slots__ = ("latency_ms", "success", "samples", "failures", "consecutive_failures", "cooldown_until", "last_error")
+
+    def __init__(self, prior_ms: float):
+        self.latency_ms = prior_ms
+        self.success = 1.0
+        self.samples = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+
+class ProviderRouter:
+    """
+    Picks a provider per pipeline stage for `auto` requests.
+
+    Each provider keeps an EWMA of its latency and of its success rate, fed
+    by every pipeline call (explicit or routed). Candidates are ranked by
+    latency divided by success rate; unmeasured providers start from
+    PRIOR_LATENCY_MS. A provider that fails `failure_threshold` times in a
+    row is skipped for `cooldown_s` while others remain, and with
+    probability `explore` the runner-up is tried so that a provider which
+    was slow once can be measured again.
+    """
+
+    def __init__(self, alpha: float = 0.3, failure_threshold: int = 3, cooldown_s: float = 30.0,
+                 explore: float = 0.05, availability_ttl_s: float = 15.0):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.explore = explore
+        self.availability_ttl_s = availability_ttl_s
+        self._stats: Dict[Tuple[str, str], _ProviderStats] = {}
+        self._availability: Dict[Tuple[str, str], Tuple[float, bool]] = {}
+        self._routed = {stage: 0 for stage in PROVIDERS}
+        self._failovers = {stage: 0 for stage in PROVIDERS}
+
+    def _entry(self, stage: str, provider: str) -> _ProviderStats:
+        key = (stage, provider)
+        if key not in self._stats:
+            self._stats[key] = _ProviderStats(PRIOR_LATENCY_MS.get(stage, {}).get(provider, 1000.0))
+        return self._stats[key]
+
+    def record(self, stage: str, provider: str, elapsed_s: float, ok: bool, error: Optional[str] = None) -> None:
+        entry = self._entry(stage, provider)
+        if ok:
+            elapsed_ms = elapsed_s * 1000.0
+            # The first sample replaces the prior instead of being averaged with it
+            entry.latency_ms = elapsed_ms if entry.samples == 0 else entry.latency_ms + self.alpha * (elapsed_ms - entry.latency_ms)
+            entry.samples += 1
+            entry.consecutive_failures = 0
+        else:
+            entry.failures += 1
+            entry.consecutive_failures += 1
+            entry.last_error = error
+            if entry.consecutive_failures >= self.failure_threshold:
+                entry.cooldown_until = time.monotonic() + self.cooldown_s
+        entry.success += self.alpha * ((1.0 if ok else 0.0) - entry.success)
+
+    def score(self, stage: str, provider: str) -> float:
+        entry = self._entry(stage, provider)
+        return entry.latency_ms / max(entry.success, 0.05)
+
+    def candidates(self, stage: str, language: Optional[str] = None, model: Optional[str] = None,
+                   voice: Optional[str] = None) -> List[str]:
+        """Providers of `stage` that support the requested language, model and voice."""
+        primary = _primary_language(language)
+        supported = []
+        for provider in PROVIDERS[stage]:
+            languages = LANGUAGES.get(stage, {}).get(provider)
+            if primary and languages is not None and primary not in languages:
+                continue
+            if stage == "llm" and not supports_model(provider, model):
+                continue
+            if stage == "tts" and not supports_voice(provider, voice):
+                continue
+            supported.append(provider)
+        return supported
+
+    async def is_available(self, stage: str, provider: str, service) -> bool:
+        """The service's own is_available(), cached for `availability_ttl_s` (Ollama's is an HTTP call)."""
+        if service is None:
+            return False
+        now = time.monotonic()
+        cached = self._availability.get((stage, provider))
+        if cached and now - cached[0] < self.availability_ttl_s:
+            return cached[1]
+        try:
+            available = service.is_available()
+            if inspect.isawaitable(available):
+                available = await available
+            available = bool(available)
+        except Exception:
+            available = False
+        self._availability[(stage, provider)] = (now, available)
+        return available
+
+    def rank(self, stage: str, providers: List[str]) -> List[Tuple[str, str]]:
+        """Order `providers` best first, each with the reason it got its place."""
+        now = time.monotonic()
+        cooling = [p for p in providers if self._entry(stage, p).cooldown_until > now]
+        ready = [p for p in providers if p not in cooling]
+        ordered = sorted(ready, key=lambda p: self.score(stage, p)) + sorted(cooling, key=lambda p: self._entry(stage, p).cooldown_until)
+        ranked = []
+        for provider in ordered:
+            entry = self._entry(stage, provider)
+            label = "only_candidate" if len(ordered) == 1 else "lowest_latency"
+            if provider in cooling:
+                reason = f"cooling_down; consecutive_failures={entry.consecutive_failures}"
+            elif entry.samples == 0:
+                reason = f"{label}; prior_ms={entry.latency_ms:.0f}"
+            else:
+                reason = f"{label}; ewma_ms={entry.latency_ms:.0f}; success={entry.success:.2f}"
+            ranked.append((provider, reason))
+        if len(ready) > 1 and self.explore > 0 and random.random() < self.explore:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+            ranked[0] = (ranked[0][0], "explore; " + ranked[0][1].split("; ", 1)[1])
+        return ranked
+
+    async def call(
+        self,
+        stage: str,
+        requested: str,
+        get_service: Callable[[str], object],
+        call: Callable[[str, object], Awaitable[Dict]],
+        language: Optional[str] = None,
+        model: Optional[str] = None,
+        voice: Optional[str] = None,
+    ) -> Tuple[object, str, Optional[str]]:
+        """
+        Run one pipeline stage and return (result, provider, route).
+
+        An explicit provider is called directly; its latency still feeds the
+        router. For `auto` the supported, available providers are tried best
+        first until one succeeds, and `route` describes the choice for the
+        response headers (None for explicit providers). Raises
+        NoProviderAvailable when nothing can serve the request, or the last
+        provider's error when every candidate failed.
+        """
+        if requested != AUTO:
+            service = get_service(requested)
+            if service is None:
+                raise ValueError(f"Unknown {stage.upper()} provider: {requested}")
+            start = time.perf_counter()
+            try:
+                result = await call(requested, service)
+            except Exception as e:
+                self.record(stage, requested, time.perf_counter() - start, False, type(e).__name__)
+                raise
+            self.record(stage, requested, time.perf_counter() - start, True)
+            return result, requested, None
+
+        supported = self.candidates(stage, language, model, voice)
+        available = [p for p in supported if await self.is_available(stage, p, get_service(p))]
+        if not available:
+            raise NoProviderAvailable(f"No available {stage.upper()} provider supports this request")
+        self._routed[stage] += 1
+        ranked = self.rank(stage, available)
+        failed: List[str] = []
+        last_error: Optional[Exception] = None
+        for provider, reason in ranked:
+            start = time.perf_counter()
+            try:
+                result = await call(provider, get_service(provider))
+            except Exception as e:
+                self.record(stage, provider, time.perf_counter() - start, False, type(e).__name__)
+                logger.warning(f"{stage}: {provider} failed ({type(e).__name__}: {e}), trying next candidate")
+                failed.append(f"{provider}({type(e).__name__})")
+                last_error = e
+                continue
+            self.record(stage, provider, time.perf_counter() - start, True)
+            if failed:
+                self._failovers[stage] += 1
+                reason = f"failover; from={','.join(failed)}; {reason.split('; ', 1)[1]}"
+            route = f"{provider}; reason={reason}; candidates={'>'.join(p for p, _ in ranked)}"
+            logger.info(f"{stage}: auto routed to {route}")
+            return result, provider, route
+        raise last_error
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        providers: Dict[str, Dict] = {}
+        for (stage, provider), entry in sorted(self._stats.items()):
+            providers.setdefault(stage, {})[provider] = {
+                "ewma_latency_ms": round(entry.latency_ms, 1),
+                "success_rate": round(entry.success, 3),
+                "samples": entry.samples,
+                "failures": entry.failures,
+                "cooling_down": entry.cooldown_until > now,
+                "last_error": entry.last_error,
+            }
+        return {"routed": dict(self._routed), "failovers": dict(self._failovers), "providers": providers}
+
+
+_router: Optional[ProviderRouter] = None
+
+
+def get_router() -> ProviderRouter:
+    global _router
+    if _router is None:
+        _router = ProviderRouter(
+            alpha=float(os.getenv("ROUTING_EWMA_ALPHA", "0.3")),
+            failure_threshold=int(os.getenv("ROUTING_FAILURE_THRESHOLD", "3")),
+            cooldown_s=float(os.getenv("ROUTING_COOLDOWN_S", "30")),
+            explore=float(os.getenv("ROUTING_EXPLORE", "0.05")),
+            availability_ttl_s=float(os.getenv("ROUTING_AVAILABILITY_TTL_S", "15")),
+        )
+    return _router
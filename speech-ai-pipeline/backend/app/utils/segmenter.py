@@ -0,0 +1,354 @@
+import re
+import time
+from typing import Callable, List, Optional
+
+from app.utils.text_utils import strip_all_markup
+
+# Sentence-final punctuation. Western terminals need whitespace after them to
+# count; CJK terminals end a sentence on their own.
+_TERMINALS = ".!?…"
+_CJK_TERMINALS = "。！？"
+# Closing quotes and brackets that belong to the sentence they follow
+_CLOSERS = "\"')]}»”’」』）】"
+# Clause punctuation used as a fallback cut point for forced flushes
+_SOFT = ",;:—"
+_CJK_SOFT = "、，；："
+
+# A line that starts a list item, header or quote is its own segment
+_LINE_MARKER_RE = re.compile(r"[ \t]*(?:[-*+]|\d{1,3}[.)]|#{1,6}|>)[ \t]")
+# Not enough of the line yet to tell whether it starts with a marker
+_PARTIAL_LINE_MARKER_RE = re.compile(r"[ \t]*(?:[-*+]|\d{1,3}[.)]?|#{1,6}|>)?\Z")
+# A number alone at the start of a line is a list marker ("1. First step")
+_LIST_NUMBER_RE = re.compile(r"[ \t]*\d{1,3}\Z")
+_FENCE_LINE_RE = re.compile(r"^[ \t]*```[^\n]*$", re.MULTILINE)
+# Links and tags that are still open at the end of a candidate segment
+_OPEN_MARKUP_RE = re.compile(r"\[[^\]]*\Z|\]\([^)]*\Z|<[A-Za-z/!][^>]*\Z")
+_CLOSE_TAG_RE = re.compile(r"</[A-Za-z][A-Za-z0-9]*\s*>")
+_PARTIAL_CLOSE_TAG_RE = re.compile(r"<(?:/[A-Za-z0-9]*\s*)?\Z")
+_GUILLEMET_SPACES = " \u00a0\u202f"
+_WORD_LEAD = "\"'([{¿¡«“‘"
+
+# Words ending in a period that do not end a sentence, keyed by base language
+ABBREVIATIONS = {
+    "en": {"mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.", "vs.", "e.g.", "i.e.", "approx.",
+           "fig.", "no.", "inc.", "ltd.", "co.", "u.s.", "a.m.", "p.m.", "cf.", "mt.", "ft."},
+    "es": {"sr.", "sra.", "srta.", "dr.", "dra.", "ud.", "uds.", "p.ej.", "núm.", "pág.", "aprox.", "av.", "ej."},
+    "fr": {"m.", "mme.", "mlle.", "dr.", "p.ex.", "env.", "cf.", "av.", "apr.", "st.", "ste."},
+    "de": {"z.b.", "bzw.", "usw.", "d.h.", "ca.", "dr.", "hr.", "fr.", "nr.", "evtl.", "ggf.", "vgl.",
+           "u.a.", "str.", "inkl.", "zzgl.", "bspw."},
+    "it": {"sig.", "sigg.", "dott.", "ecc.", "es.", "pag.", "prof.", "ing.", "avv.", "n."},
+    "pt": {"sr.", "sra.", "dr.", "dra.", "p.ex.", "pág.", "av.", "prof.", "aprox."},
+}
+
+# Languages whose ordinals are written "3." ("am 3. Oktober")
+_ORDINAL_PERIOD_LANGUAGES = {"de"}
+
+
+def _has_open_markup(text: str) -> bool:
+    """Whether cutting after `text` would split an inline code span, link or tag."""
+    if text.count("`") % 2:
+        return True
+    return _OPEN_MARKUP_RE.search(text) is not None
+
+
+class SentenceSegmenter:
+    """
+    Split streamed LLM text into speakable segments for incremental TTS.
+
+    Tokens go in through `feed()`; whole sentences (or list items,
+    paragraphs and fenced code blocks) come out as soon as the text after
+    them shows they are finished. Each segment is run through
+    `strip_all_markup`, so it can go straight to a TTS provider.
+
+    Latency vs. prosody is tuned with:
+    - `min_chars`: sentences shorter than this are merged with the next one,
+      so the voice does not reset its intonation every few words.
+    - `max_wait_s` / `max_chars`: once the pending text has waited this long
+      or grown this big, it is flushed at the best cut available (a sentence
+      boundary, then clause punctuation, then whitespace). `feed()` checks
+      this on every token; call `poll()` from a timer to also flush while
+      the token stream stalls.
+    """
+
+    def __init__(
+        self,
+        language: str = "en-US",
+        min_chars: int = 20,
+        max_wait_s: Optional[float] = 1.5,
+        max_chars: Optional[int] = 300,
+        strip_markup: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.language = (language or "en").split("-")[0].lower()
+        self.min_chars = min_chars
+        self.max_wait_s = max_wait_s
+        self.max_chars = max_chars
+        self.strip_markup = strip_markup
+        self.clock = clock
+        self._abbreviations = ABBREVIATIONS.get(self.language, set())
+        self._reset()
+
+    def _reset(self) -> None:
+        self._buffer = ""
+        # Everything before `_scanned` has been checked for boundaries
+        self._scanned = 0
+        # Sentence boundaries in the buffer whose text was too short to send alone
+        self._boundaries: List[int] = []
+        # Clause punctuation in the buffer, for forced flushes
+        self._soft: List[int] = []
+        self._in_fence = False
+        self._prev_char = "\n"
+        self._pending_since: Optional[float] = None
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token; return the segments that are now complete."""
+        if token:
+            self._buffer += token
+            if self._pending_since is None and token.strip():
+                self._pending_since = self.clock()
+        found = len(self._boundaries)
+        self._advance()
+        # Short sentences held back only need another look once a new boundary shows up
+        segments = self._take_ready() if len(self._boundaries) > found else []
+        if self._overdue():
+            segments.extend(self._force())
+        return segments
+
+    @property
+    def pending_text(self) -> str:
+        """Raw text received but not yet emitted."""
+        return self._buffer
+
+    def poll(self) -> List[str]:
+        """Force out pending text if it has waited longer than `max_wait_s`."""
+        return self._force() if self._overdue() else []
+
+    def flush(self) -> List[str]:
+        """End of stream: return whatever is left."""
+        self._advance()
+        segments = self._take_ready()
+        text = self._speakable(self._buffer)
+        if text:
+            segments.append(text)
+        self._reset()
+        return segments
+
+    def _speakable(self, raw: str) -> str:
+        if not self.strip_markup:
+            return " ".join(raw.split())
+        # Read the code of a fenced block, not the fence lines around it
+        if "```" in raw:
+            raw = _FENCE_LINE_RE.sub("", raw)
+        return strip_all_markup(raw)
+
+    # ------------------------------------------------------------------
+    # Boundary detection
+    # ------------------------------------------------------------------
+
+    def _advance(self) -> None:
+        """Scan new text for boundaries, stopping where more text is needed to decide."""
+        buf = self._buffer
+        n = len(buf)
+        i = self._scanned
+        while i < n:
+            c = buf[i]
+            line_start = (buf[i - 1] if i else self._prev_char) == "\n"
+
+            if line_start and c == "`":
+                if n - i < 3:
+                    break
+                if buf.startswith("```", i):
+                    if self._in_fence:
+                        # The whole fenced block is one segment
+                        eol = buf.find("\n", i)
+                        if eol == -1:
+                            break
+                        self._in_fence = False
+                        self._add_boundary(eol)
+                        i = eol
+                        continue
+                    self._in_fence = True
+                    self._add_boundary(i)
+                    i += 3
+                    continue
+            if self._in_fence:
+                i += 1
+                continue
+
+            if c == "\n":
+                if i + 1 >= n:
+                    break
+                if buf[i + 1] == "\n" or _LINE_MARKER_RE.match(buf, i + 1) or self._line_has_marker(buf, i):
+                    self._add_boundary(i)
+                elif _PARTIAL_LINE_MARKER_RE.match(buf, i + 1):
+                    break
+                i += 1
+                continue
+
+            if c in _CJK_TERMINALS or c in _CJK_SOFT:
+                j = i + 1
+                while j < n and (buf[j] in _CJK_TERMINALS or buf[j] in _CLOSERS):
+                    j += 1
+                if j >= n:
+                    break
+                if c in _CJK_SOFT:
+                    self._soft.append(j)
+                else:
+                    self._add_boundary(j)
+                i = j
+                continue
+
+            if c in _TERMINALS:
+                j = i + 1
+                while j < n and buf[j] in _TERMINALS:
+                    j += 1
+                j = self._skip_closers(buf, j)
+                if j < 0:
+                    break
+                # French spacing puts a space before the closing guillemet: « Oui. »
+                k = j
+                while k < n and buf[k] in _GUILLEMET_SPACES:
+                    k += 1
+                if k >= n:
+                    break
+                if k > j and buf[k] == "»":
+                    j = k + 1
+                    if j >= n:
+                        break
+                # "3.14", "example.com", "e.g" mid-word
+                if not buf[j].isspace():
+                    i = j
+                    continue
+                if c in ".…":
+                    if c == "." and self._is_abbreviation(buf, i):
+                        i = j
+                        continue
+                    k = j
+                    while k < n and buf[k] in " \t":
+                        k += 1
+                    if k >= n:
+                        break
+                    # "approx. five", "well... maybe"
+                    if buf[k].islower():
+                        i = j
+                        continue
+                self._add_boundary(j)
+                i = j
+                continue
+
+            if c in _SOFT and i + 1 < n and buf[i + 1].isspace():
+                self._soft.append(i + 1)
+            i += 1
+        self._scanned = i
+
+    @staticmethod
+    def _skip_closers(buf: str, j: int) -> int:
+        """
+        Skip quotes, brackets, emphasis markers and closing tags after a
+        terminal ("**Done.**", "<b>Done.</b>"). Returns -1 if a closing tag
+        has not fully arrived yet.
+        """
+        n = len(buf)
+        while j < n:
+            if buf[j] in _CLOSERS or buf[j] in "*_":
+                j += 1
+            elif buf[j] == "<":
+                if buf.find(">", j) == -1:
+                    return -1 if _PARTIAL_CLOSE_TAG_RE.match(buf, j) else j
+                m = _CLOSE_TAG_RE.match(buf, j)
+                if not m:
+                    break
+                j = m.end()
+            else:
+                break
+        return j
+
+    def _is_abbreviation(self, buf: str, dot: int) -> bool:
+        """Whether the period at `dot` ends an abbreviation, initial or list number."""
+        line_start = buf.rfind("\n", 0, dot) + 1
+        if line_start == 0 and self._prev_char != "\n":
+            line_start = -1
+        if line_start >= 0 and _LIST_NUMBER_RE.match(buf, line_start, dot):
+            return True
+        word_start = dot
+        while word_start > 0 and not buf[word_start - 1].isspace():
+            word_start -= 1
+        word = buf[word_start:dot + 1].lstrip(_WORD_LEAD).lower()
+        if len(word) == 2 and buf[dot - 1].isupper():
+            # A single-letter initial ("J. R. R. Tolkien")
+            return True
+        if word[:-1].isdigit() and self.language in _ORDINAL_PERIOD_LANGUAGES:
+            return True
+        return word in self._abbreviations
+
+    def _line_has_marker(self, buf: str, eol: int) -> bool:
+        """Whether the line ending at `eol` is a header, list item or quote."""
+        line_start = buf.rfind("\n", 0, eol) + 1
+        if line_start == 0 and self._prev_char != "\n":
+            return False
+        return _LINE_MARKER_RE.match(buf, line_start, eol) is not None
+
+    def _add_boundary(self, pos: int) -> None:
+        if pos > 0 and (not self._boundaries or self._boundaries[-1] < pos):
+            self._boundaries.append(pos)
+
+    # ------------------------------------------------------------------
+    # Emission
+    # ------------------------------------------------------------------
+
+    def _take_ready(self) -> List[str]:
+        """Emit every pending sentence that is long enough to be spoken alone."""
+        segments = []
+        start = 0
+        for boundary in self._boundaries:
+            raw = self._buffer[start:boundary]
+            if _has_open_markup(raw):
+                continue
+            text = self._speakable(raw)
+            if not text:
+                start = boundary
+            elif len(text) >= self.min_chars:
+                segments.append(text)
+                start = boundary
+        self._consume(start)
+        return segments
+
+    def _overdue(self) -> bool:
+        if not self._buffer.strip():
+            return False
+        if self.max_chars is not None and len(self._buffer) >= self.max_chars:
+            return True
+        return (
+            self.max_wait_s is not None
+            and self._pending_since is not None
+            and self.clock() - self._pending_since >= self.max_wait_s
+        )
+
+    def _force(self) -> List[str]:
+        """Flush pending text at the best cut point, ignoring `min_chars`."""
+        candidates = list(self._boundaries) or list(self._soft)
+        if not candidates:
+            # Fall back to the last few word breaks in the scanned text
+            pos = self._scanned
+            while len(candidates) < 8:
+                pos = max(self._buffer.rfind(" ", 0, pos), self._buffer.rfind("\n", 0, pos))
+                if pos <= 0:
+                    break
+                candidates.insert(0, pos)
+        for cut in reversed(candidates):
+            raw = self._buffer[:cut]
+            if self._in_fence or not _has_open_markup(raw):
+                text = self._speakable(raw)
+                self._consume(cut)
+                return [text] if text else []
+        return []
+
+    def _consume(self, cut: int) -> None:
+        if cut <= 0:
+            return
+        self._prev_char = self._buffer[cut - 1]
+        self._buffer = self._buffer[cut:]
+        self._scanned -= cut
+        self._boundaries = [b - cut for b in self._boundaries if b > cut]
+        self._soft = [s - cut for s in self._soft if s > cut]
+        self._pending_since = self.clock() if self._buffer.strip() else None
@@ -0,0 +1,274 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("semantic_cache")
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_DIGITS_RE = re.compile(r"\d+")
+# Spoken fillers that STT keeps but that never change the question. Words that
+# can carry meaning ("you", "well", "so", "okay") are kept.
+FILLER_WORDS = frozenset({"um", "umm", "uh", "uhh", "erm", "er", "hmm", "mm", "please"})
+# Spoken contractions (apostrophes are dropped first) expanded so both forms match
+CONTRACTIONS = {
+    "whats": "what is", "wheres": "where is", "whos": "who is", "hows": "how is", "whens": "when is",
+    "thats": "that is", "theres": "there is", "im": "i am", "youre": "you are",
+    "dont": "do not", "doesnt": "does not", "didnt": "did not", "isnt": "is not", "arent": "are not",
+    "cant": "can not", "cannot": "can not", "wont": "will not", "shouldnt": "should not", "wouldnt": "would not",
+}
+# Function words carry little of a question's meaning; their features are down-weighted
+STOP_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "did", "can", "could", "would", "will", "should",
+    "i", "me", "my", "we", "our", "your", "it", "its", "this", "that", "there", "of", "to", "for", "at", "by",
+    "with", "about", "from", "and", "or", "what", "how", "who", "when", "where", "which", "tell", "like", "am",
+})
+# Words that flip the answer while barely moving the vector. Two questions whose
+# word sets differ in any of these (or in any number) never match.
+CONTRAST_WORDS = frozenset({
+    "not", "no", "never", "without",
+    "on", "off", "up", "down", "in", "out", "open", "close", "start", "stop", "before", "after",
+    "more", "less", "min", "max", "minimum", "maximum", "first", "last", "yesterday", "today", "tomorrow",
+})
+
+
+def normalize_query(text: str) -> str:
+    """Case-folded words without punctuation, accents or filler words."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    words = _PUNCT_RE.sub(" ", text.replace("'", "").replace("\u2019", "")).split()
+    words = " ".join(CONTRACTIONS.get(w, w) for w in words).split()
+    kept = [w for w in words if w not in FILLER_WORDS]
+    return " ".join(kept or words)
+
+
+def _guard_words(normalized: str) -> frozenset:
+    # Negating prefixes ("unpair", "disable") are kept too, at the cost of a few misses
+    words = normalized.split()
+    return frozenset(
+        w for w in words if w in CONTRAST_WORDS or _DIGITS_RE.search(w) or w.startswith(("un", "dis"))
+    )
+
+
+class HashedNgramEmbedder:
+    """
+    Dense vectors from hashed n-grams: character n-grams of each padded word
+    (robust to STT misspellings and inflection) and word unigrams/bigrams
+    (word order), signed-hashed into `dim` buckets with log-scaled counts and
+    L2-normalized, so a dot product is the cosine similarity. Features of
+    stop words are down-weighted so content words decide the match.
+    """
+
+    def __init__(self, dim: int = 1024, char_ngrams: Tuple[int, ...] = (3, 4), word_weight: float = 1.5,
+                 stop_word_weight: float = 0.2):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.word_weight = word_weight
+        self.stop_word_weight = stop_word_weight
+
+    def _features(self, normalized: str) -> Iterable[Tuple[str, float]]:
+        words = normalized.split()
+        weights = [self.stop_word_weight if w in STOP_WORDS else 1.0 for w in words]
+        for word, weight in zip(words, weights):
+            padded = f" {word} "
+            for n in self.char_ngrams:
+                for i in range(max(1, len(padded) - n + 1)):
+                    yield padded[i:i + n], weight
+            yield "w:" + word, self.word_weight * weight
+        for i in range(len(words) - 1):
+            yield f"b:{words[i]} {words[i + 1]}", self.word_weight * min(weights[i], weights[i + 1])
+
+    def embed(self, normalized: str) -> np.ndarray:
+        counts: Dict[int, float] = {}
+        for feature, weight in self._features(normalized):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign so colliding features tend to cancel out
+            key = (h % self.dim) * (1 if h & 0x80000000 else -1)
+            counts[key] = counts.get(key, 0.0) + weight
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for key, count in counts.items():
+            vector[abs(key)] += np.log1p(count) if key > 0 else -np.log1p(count)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+class CacheEntry:
+    __slots__ = ("key", "partition", "row", "query", "normalized", "guard", "response", "created_at", "hits")
+
+    def __init__(self, key: int, partition: str, query: str, normalized: str, response: Dict):
+        self.key = key
+        self.partition = partition
+        self.row = -1
+        self.query = query
+        self.normalized = normalized
+        self.guard = _guard_words(normalized)
+        self.response = response
+        self.created_at = time.time()
+        self.hits = 0
+
+
+class _Partition:
+    """Vectors of one partition in a growable matrix; rows are swap-removed."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.entries: List[CacheEntry] = []
+
+    def add(self, entry: CacheEntry, vector: np.ndarray) -> None:
+        if len(self.entries) == len(self.vectors):
+            grown = np.zeros((len(self.vectors) * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.entries)] = self.vectors
+            self.vectors = grown
+        entry.row = len(self.entries)
+        self.vectors[entry.row] = vector
+        self.entries.append(entry)
+
+    def remove(self, entry: CacheEntry) -> None:
+        last = self.entries.pop()
+        if last is not entry:
+            self.vectors[entry.row] = self.vectors[last.row]
+            self.entries[entry.row] = last
+            last.row = entry.row
+        entry.row = -1
+
+    def nearest(self, vector: np.ndarray, k: int) -> List[Tuple[float, CacheEntry]]:
+        count = len(self.entries)
+        if not count:
+            return []
+        scores = self.vectors[:count] @ vector
+        if count <= k:
+            order = np.argsort(-scores)
+        else:
+            top = np.argpartition(-scores, k)[:k]
+            order = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.entries[i]) for i in order]
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of single-turn LLM answers keyed by the meaning
+    of the question.
+
+    Questions are normalized, embedded with `HashedNgramEmbedder` and compared
+    by cosine similarity against earlier questions in the same partition
+    (provider, model, system prompt and max_tokens), so answers never cross
+    system prompts. A candidate at or above `threshold` is a hit unless the
+    two questions differ in a number, a contrast word ("on"/"off", "not") or
+    a negating prefix ("unpair").
+    Entries expire after `ttl_s`; beyond `max_entries` the least recently
+    used entries are evicted. The answer's synthesized audio is cached by the
+    pipeline under the exact TTS request instead (`tts_audio_cache_key`).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        max_entries: int = 2000,
+        ttl_s: float = 86400.0,
+        embedder: Optional[HashedNgramEmbedder] = None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.embedder = embedder or HashedNgramEmbedder()
+        self._partitions: Dict[str, _Partition] = {}
+        self._lru: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "stores": 0, "evictions": 0, "guard_rejections": 0}
+
+    @staticmethod
+    def partition_key(provider: str, model: Optional[str], system_prompt: Optional[str],
+                      max_tokens: Optional[int], temperature: Optional[float]) -> str:
+        temp = "" if temperature is None else repr(float(temperature))
+        raw = "\x1f".join([provider, model or "", system_prompt or "", str(max_tokens or ""), temp])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+    def lookup(self, query: str, partition: str) -> Optional[Tuple[CacheEntry, float]]:
+        """(entry, similarity) of the closest cached question, or None below the threshold."""
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        vector = self.embedder.embed(normalized)
+        guard = _guard_words(normalized)
+        now = time.time()
+        with self._lock:
+            self._stats["lookups"] += 1
+            part = self._partitions.get(partition)
+            if part is None:
+                return None
+            for similarity, entry in part.nearest(vector, 4):
+                if similarity < self.threshold:
+                    break
+                if now - entry.created_at > self.ttl_s:
+                    self._evict(entry)
+                    continue
+                if entry.guard != guard:
+                    self._stats["guard_rejections"] += 1
+                    continue
+                entry.hits += 1
+                self._stats["hits"] += 1
+                self._lru.move_to_end(entry.key)
+                return entry, similarity
+        return None
+
+    def store(self, query: str, partition: str, response: Dict) -> Optional[CacheEntry]:
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        entry = None
+        vector = self.embedder.embed(normalized)
+        with self._lock:
+            entry = CacheEntry(self._next_key, partition, query, normalized, response)
+            self._next_key += 1
+            self._partitions.setdefault(partition, _Partition(self.embedder.dim)).add(entry, vector)
+            self._lru[entry.key] = entry
+            self._stats["stores"] += 1
+            self._enforce_limits()
+        return entry
+
+    def _evict(self, entry: CacheEntry) -> None:
+        if entry.row < 0:
+            return
+        part = self._partitions[entry.partition]
+        part.remove(entry)
+        if not part.entries:
+            del self._partitions[entry.partition]
+        self._lru.pop(entry.key, None)
+        self._stats["evictions"] += 1
+
+    def _enforce_limits(self) -> None:
+        while self._lru and (len(self._lru) > self.max_entries):
+            self._evict(next(iter(self._lru.values())))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._lru)
+            stats["partitions"] = len(self._partitions)
+        stats["hit_ratio"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        return stats
+
+
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """The process-wide semantic cache, or None unless SEMANTIC_CACHE is enabled."""
+    global _semantic_cache
+    if _semantic_cache is None and os.getenv("SEMANTIC_CACHE", "off").lower() in ("1", "on", "true", "yes"):
+        _semantic_cache = SemanticCache(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000")),
+            ttl_s=float(os.getenv("SEMANTIC_CACHE_TTL_S", "86400")),
+        )
+    return _semantic_cache
@@ -0,0 +1,245 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.utils.tracing import run_in_executor, span
+
+logger = logging.getLogger("sessions")
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class _Session:
+    __slots__ = ("messages", "chars", "updated_at", "next_seq")
+
+    def __init__(self, messages: Optional[List[Dict]] = None, updated_at: float = 0.0, next_seq: int = 0):
+        self.messages: List[Dict] = messages or []
+        self.chars = sum(len(m.get("content") or "") for m in self.messages)
+        self.updated_at = updated_at
+        # Sequence number of the next message, used as its row key in SQLite
+        self.next_seq = next_seq
+
+
+class SessionStore:
+    """
+    Server-side chat history keyed by session id.
+
+    Sessions live in an in-memory LRU of at most `max_sessions` entries. With
+    a `sqlite_path` every change is also written to SQLite (new messages are
+    appended, never the whole history), so sessions survive restarts and LRU
+    eviction. Sessions idle for longer than `ttl_s` expire. Each session keeps
+    at most `max_messages` messages and `max_chars` characters of content;
+    the oldest messages are dropped first.
+    """
+
+    def __init__(
+        self,
+        ttl_s: float = 3600.0,
+        max_sessions: int = 1000,
+        max_messages: int = 100,
+        max_chars: int = 100_000,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self.sqlite_path = sqlite_path
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._last_purge = time.time()
+        if sqlite_path:
+            self._open_db(sqlite_path)
+
+    # -- public API -----------------------------------------------------------
+
+    async def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        self._remember(session_id, _Session(updated_at=now))
+        if self._db is not None:
+            await run_in_executor(self._db_create, session_id, now)
+            if now - self._last_purge > min(self.ttl_s, 300.0):
+                self._last_purge = now
+                await run_in_executor(self._db_purge_expired, now)
+        return session_id
+
+    async def get_messages(self, session_id: str) -> List[Dict]:
+        """Stored history of a session (oldest first). Raises SessionNotFound if unknown or expired."""
+        session = await self._load(session_id)
+        return list(session.messages)
+
+    async def append(self, session_id: str, messages: List[Dict]) -> None:
+        """Append turns to a session, trimming it back under its caps."""
+        session = await self._load(session_id)
+        now = time.time()
+        first_seq = session.next_seq
+        new = [{"role": m.get("role"), "content": m.get("content") or ""} for m in messages]
+        session.messages.extend(new)
+        session.chars += sum(len(m["content"]) for m in new)
+        session.next_seq += len(new)
+        session.updated_at = now
+        dropped = self._trim(session)
+        if self._db is not None:
+            await run_in_executor(self._db_append, session_id, first_seq, new, session.next_seq - len(session.messages), now)
+        if dropped:
+            logger.debug(f"Session {session_id}: dropped {dropped} old message(s) to stay under caps")
+
+    async def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        if self._db is not None:
+            await run_in_executor(self._db_delete, session_id)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "sqlite" if self._db is not None else "memory",
+            "cached_sessions": len(self._sessions),
+            "cached_messages": sum(len(s.messages) for s in self._sessions.values()),
+            "cached_chars": sum(s.chars for s in self._sessions.values()),
+            "ttl_s": self.ttl_s,
+            "max_sessions": self.max_sessions,
+            "max_messages": self.max_messages,
+            "max_chars": self.max_chars,
+        }
+
+    # -- memory ---------------------------------------------------------------
+
+    async def _load(self, session_id: str) -> _Session:
+        now = time.time()
+        session = self._sessions.get(session_id)
+        if session is None and self._db is not None:
+            with span("sessions.load", backend="sqlite"):
+                session = await run_in_executor(self._db_load, session_id)
+            if session is not None:
+                self._remember(session_id, session)
+        if session is None:
+            raise SessionNotFound(session_id)
+        if now - session.updated_at > self.ttl_s:
+            await self.delete(session_id)
+            raise SessionNotFound(session_id)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _remember(self, session_id: str, session: _Session) -> None:
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            # Evicted sessions are still in SQLite when it is enabled
+            self._sessions.popitem(last=False)
+
+    def _trim(self, session: _Session) -> int:
+        dropped = 0
+        while session.messages and (len(session.messages) > self.max_messages or session.chars > self.max_chars):
+            removed = session.messages.pop(0)
+            session.chars -= len(removed["content"])
+            dropped += 1
+        # Never start the history with an assistant turn
+        while session.messages and session.messages[0]["role"] == "assistant":
+            removed = session.messages.pop(0)
+            session.chars -= len(removed["content"])
+            dropped += 1
+        return dropped
+
+    # -- SQLite (called on executor threads) -----------------------------------
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, seq))"
+        )
+        logger.info(f"Session store persisting to {path}")
+
+    def _db_create(self, session_id: str, now: float) -> None:
+        with self._db_lock:
+            self._db.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?)", (session_id, now, now))
+
+    def _db_load(self, session_id: str) -> Optional[_Session]:
+        with self._db_lock:
+            row = self._db.execute("SELECT updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            rows = self._db.execute(
+                "SELECT seq, role, content FROM session_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        messages = [{"role": role, "content": content} for _, role, content in rows]
+        next_seq = rows[-1][0] + 1 if rows else 0
+        return _Session(messages, updated_at=row[0], next_seq=next_seq)
+
+    def _db_append(self, session_id: str, first_seq: int, messages: List[Dict], keep_from_seq: int, now: float) -> None:
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO session_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                    [(session_id, first_seq + i, m["role"], m["content"]) for i, m in enumerate(messages)],
+                )
+                self._db.execute("DELETE FROM session_messages WHERE session_id = ? AND seq < ?", (session_id, keep_from_seq))
+                self._db.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _db_delete(self, session_id: str) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _db_purge_expired(self, now: float) -> None:
+        cutoff = now - self.ttl_s
+        with self._db_lock:
+            self._db.execute(
+                "DELETE FROM session_messages WHERE session_id IN (SELECT id FROM sessions WHERE updated_at < ?)", (cutoff,)
+            )
+            purged = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+        if purged:
+            logger.info(f"Purged {purged} expired session(s)")
+
+
+def build_turn_messages(history: List[Dict], system_prompt: Optional[str], user_text: str) -> List[Dict]:
+    """
+    Messages for a chat call: the history with the system prompt prepended
+    when missing and the current user turn appended unless it is already last.
+    """
+    messages = list(history)
+    if system_prompt and (not messages or messages[0].get("role") != "system"):
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    last = messages[-1] if messages else {}
+    if not (last.get("role") == "user" and last.get("content") == user_text):
+        messages.append({"role": "user", "content": user_text})
+    return messages
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """The process-wide session store, configured from the environment on first use."""
+    global _session_store
+    if _session_store is None:
+        backend = os.getenv("SESSION_BACKEND", "memory").lower()
+        _session_store = SessionStore(
+            ttl_s=float(os.getenv("SESSION_TTL_S", "3600")),
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+            max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "100")),
+            max_chars=int(os.getenv("SESSION_MAX_CHARS", "100000")),
+            sqlite_path=os.getenv("SESSION_SQLITE_PATH", "sessions.db") if backend == "sqlite" else None,
+        )
+    return _session_store
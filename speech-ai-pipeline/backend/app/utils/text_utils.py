@@ -1,5 +1,26 @@
 import re
 import html
+from typing import Callable, List, Tuple
+
+# ---------------------------------------------------------------------------
+# Step-by-step helpers. `strip_all_markup` and `MarkupStreamNormalizer` run the
+# same steps through `_STEPS` below; these stay for callers that only need one
+# step and as the reference both are checked against (see
+# benchmarks/markup_equivalence.py).
+# ---------------------------------------------------------------------------
+
+_SCRIPT_STYLE_RE = re.compile(r"<\s*(script|style)[^>]*>[\s\S]*?<\s*/\s*\1\s*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_MD_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_INLINE_CODE_RE = re.compile(r"`([^`]+)`")
+_MD_CODE_BLOCK_RE = re.compile(r"```[\s\S]*?```")
+_MD_EMPHASIS_RE = re.compile(r"\*\*|__|\*|_")
+_MD_HEADER_RE = re.compile(r"^\s{0,3}#{1,6}\s*", re.MULTILINE)
+_MD_BLOCKQUOTE_RE = re.compile(r"^\s{0,3}>\s?", re.MULTILINE)
+_MD_BULLET_RE = re.compile(r"^\s*[-*+]\s+", re.MULTILINE)
+_MD_NUMBERED_RE = re.compile(r"^\s*\d+\.\s+", re.MULTILINE)
+_WHITESPACE_RE = re.compile(r"\s+")
 
 
 def strip_html_tags(text: str) -> str:
@@ -7,9 +28,9 @@ def strip_html_tags(text: str) -> str:
     if not text:
         return ""
     # Remove script and style blocks
-    text = re.sub(r"<\s*(script|style)[^>]*>[\s\S]*?<\s*/\s*\1\s*>", " ", text, flags=re.IGNORECASE)
+    text = _SCRIPT_STYLE_RE.sub(" ", text)
     # Remove all remaining tags
-    text = re.sub(r"<[^>]+>", " ", text)
+    text = _TAG_RE.sub(" ", text)
     return text
 
 
@@ -18,20 +39,20 @@ def strip_markdown(text: str) -> str:
     if not text:
         return ""
     # Images: ![alt](url) -> alt
-    text = re.sub(r"!\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = _MD_IMAGE_RE.sub(r"\1", text)
     # Links: [text](url) -> text
-    text = re.sub(r"\[([^\]]+)\]\([^)]*\)", r"\1", text)
+    text = _MD_LINK_RE.sub(r"\1", text)
     # Inline code: `code` -> code
-    text = re.sub(r"`([^`]+)`", r"\1", text)
+    text = _MD_INLINE_CODE_RE.sub(r"\1", text)
     # Code blocks: ```lang\ncode\n``` -> code
-    text = re.sub(r"```[\s\S]*?```", " ", text)
+    text = _MD_CODE_BLOCK_RE.sub(" ", text)
     # Bold/italic markers
-    text = re.sub(r"\*\*|__|\*|_", "", text)
+    text = _MD_EMPHASIS_RE.sub("", text)
     # Headers, blockquotes, lists
-    text = re.sub(r"^\s{0,3}#{1,6}\s*", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^\s{0,3}>\s?", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^\s*[-*+]\s+", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^\s*\d+\.\s+", "", text, flags=re.MULTILINE)
+    text = _MD_HEADER_RE.sub("", text)
+    text = _MD_BLOCKQUOTE_RE.sub("", text)
+    text = _MD_BULLET_RE.sub("", text)
+    text = _MD_NUMBERED_RE.sub("", text)
     return text
 
 
@@ -40,13 +61,273 @@ def normalize_whitespace(text: str) -> str:
     if not text:
         return ""
     text = html.unescape(text)
-    text = re.sub(r"\s+", " ", text)
+    text = _WHITESPACE_RE.sub(" ", text)
     return text.strip()
 
 
+# ---------------------------------------------------------------------------
+# The same chain as separate steps
+# ---------------------------------------------------------------------------
+#
+# Each step is (apply, hold). `apply(text, line_start)` is one step of the
+# chain, skipped when the characters it looks for are absent; `line_start`
+# says whether `text` starts a line, which only the line-marker step needs.
+# `hold(text)` is the index up to which `text` can go through the step on its
+# own: applying the step to text[:hold] and to what follows it separately
+# gives the same result as applying it once, however the text continues.
+# Everything a step holds back waits in the stream normalizer for more text.
+
+# Text from here to the end that could still become a match with more text
+_PARTIAL_BLOCK_RE = re.compile(
+    r"<\s*(?:(?:script|style)[^>]*(?:>[\s\S]*)?|s(?:c(?:r(?:i(?:p)?)?)?)?|st(?:y(?:l)?)?)?\Z", re.IGNORECASE)
+_PARTIAL_IMAGE_RE = re.compile(r"!(?:\[[^\]]*(?:\](?:\([^)]*)?)?)?\Z")
+_PARTIAL_LINK_RE = re.compile(r"\[(?:[^\]]+(?:\](?:\([^)]*)?)?)?\Z")
+_PARTIAL_CODE_RE = re.compile(r"`[^`]*\Z")
+# What may follow "&" in an entity html.unescape hasn't seen the end of
+_ENTITY_TAIL_RE = re.compile(r"(?:#[0-9]*|#[xX][0-9a-fA-F]*|[^\t\n\f <&#;]{0,32})\Z")
+_MARKER_CHARS = "#>-*+0123456789"
+# A character no line-start marker pattern can match
+_SETTLED_RE = re.compile(r"[^\s#>+\-*\d.]")
+
+
+def _last_match_end(pattern: re.Pattern, text: str) -> int:
+    end = 0
+    for m in pattern.finditer(text):
+        end = m.end()
+    return end
+
+
+def _hold_partial(pattern: re.Pattern, partial: re.Pattern, opener: str, text: str) -> int:
+    # Matches are found left to right, so only an opener after the last one
+    # can still change; the first that could grow into a match is held back
+    if opener not in text:
+        return len(text)
+    pos = text.find(opener, _last_match_end(pattern, text))
+    while pos != -1:
+        if partial.match(text, pos):
+            return pos
+        pos = text.find(opener, pos + 1)
+    return len(text)
+
+
+def _strip_blocks(text: str, line_start: bool) -> str:
+    return _SCRIPT_STYLE_RE.sub(" ", text) if "<" in text else text
+
+
+def _hold_blocks(text: str) -> int:
+    # The closing tag must repeat the opening one, so an opening tag left
+    # unclosed before a later block can still close after it
+    if "<" not in text:
+        return len(text)
+    pos = 0
+    for m in list(_SCRIPT_STYLE_RE.finditer(text)) + [None]:
+        gap_end = m.start() if m is not None else len(text)
+        opener = text.find("<", pos, gap_end)
+        while opener != -1:
+            if _PARTIAL_BLOCK_RE.match(text, opener):
+                return opener
+            opener = text.find("<", opener + 1, gap_end)
+        if m is None:
+            break
+        pos = m.end()
+    return len(text)
+
+
+def _strip_tags(text: str, line_start: bool) -> str:
+    return _TAG_RE.sub(" ", text) if "<" in text else text
+
+
+def _hold_tags(text: str) -> int:
+    # A tag runs to the first ">" after its "<"
+    opener = text.find("<", text.rfind(">") + 1)
+    return len(text) if opener == -1 else opener
+
+
+def _strip_images(text: str, line_start: bool) -> str:
+    return _MD_IMAGE_RE.sub(r"\1", text) if "![" in text else text
+
+
+def _hold_images(text: str) -> int:
+    return _hold_partial(_MD_IMAGE_RE, _PARTIAL_IMAGE_RE, "!", text)
+
+
+def _strip_links(text: str, line_start: bool) -> str:
+    return _MD_LINK_RE.sub(r"\1", text) if "](" in text else text
+
+
+def _hold_links(text: str) -> int:
+    return _hold_partial(_MD_LINK_RE, _PARTIAL_LINK_RE, "[", text)
+
+
+def _strip_inline_code(text: str, line_start: bool) -> str:
+    return _MD_INLINE_CODE_RE.sub(r"\1", text) if "`" in text else text
+
+
+def _hold_inline_code(text: str) -> int:
+    return _hold_partial(_MD_INLINE_CODE_RE, _PARTIAL_CODE_RE, "`", text)
+
+
+def _strip_code_blocks(text: str, line_start: bool) -> str:
+    if "```" in text:
+        text = _MD_CODE_BLOCK_RE.sub(" ", text)
+    # Emphasis markers go afterwards, as in strip_markdown, so "``_`" is no fence
+    if "*" in text or "_" in text:
+        text = text.replace("*", "").replace("_", "")
+    return text
+
+
+def _hold_code_blocks(text: str) -> int:
+    if "`" not in text:
+        return len(text)
+    end = _last_match_end(_MD_CODE_BLOCK_RE, text)
+    opener = text.find("```", end)
+    if opener != -1:
+        return opener
+    # Trailing backticks may still become a fence
+    trailing = min(len(text) - len(text.rstrip("`")), len(text) - end)
+    return len(text) - trailing
+
+
+def _strip_line_prefixes(text: str, line_start: bool) -> str:
+    if "\n" not in text:
+        # At most one line start, at the very beginning
+        if not line_start or text.lstrip()[:1] not in _MARKER_CHARS:
+            return text
+    if not line_start:
+        # Text that continues a line must not be taken for a line start
+        text = "x" + text
+    if "#" in text:
+        text = _MD_HEADER_RE.sub("", text)
+    if ">" in text:
+        text = _MD_BLOCKQUOTE_RE.sub("", text)
+    if "-" in text or "*" in text or "+" in text:
+        text = _MD_BULLET_RE.sub("", text)
+    if "." in text:
+        text = _MD_NUMBERED_RE.sub("", text)
+    return text if line_start else text[1:]
+
+
+def _hold_line_prefixes(text: str) -> int:
+    # A marker match only crosses whitespace and marker characters, so it is
+    # settled once its line has anything else in it. Trailing lines without
+    # such a character are held back from their start: the next text may
+    # still complete their marker, or a marker match may run on into it.
+    start = text.rfind("\n") + 1
+    if _SETTLED_RE.search(text, start):
+        return len(text)
+    while start > 0:
+        previous = text.rfind("\n", 0, start - 1) + 1
+        if _SETTLED_RE.search(text, previous, start):
+            return start
+        start = previous
+    return 0
+
+
+def _unescape(text: str, line_start: bool) -> str:
+    return html.unescape(text) if "&" in text else text
+
+
+def _hold_entity(text: str) -> int:
+    amp = text.rfind("&")
+    if amp != -1 and _ENTITY_TAIL_RE.match(text, amp + 1):
+        return amp
+    return len(text)
+
+
+_STEPS: List[Tuple[Callable[[str, bool], str], Callable[[str], int]]] = [
+    (_strip_blocks, _hold_blocks),
+    (_strip_tags, _hold_tags),
+    (_strip_images, _hold_images),
+    (_strip_links, _hold_links),
+    (_strip_inline_code, _hold_inline_code),
+    (_strip_code_blocks, _hold_code_blocks),
+    (_strip_line_prefixes, _hold_line_prefixes),
+    (_unescape, _hold_entity),
+]
+
+
 def strip_all_markup(text: str) -> str:
     """Strip HTML and Markdown, unescape entities, and normalize whitespace."""
-    return normalize_whitespace(strip_markdown(strip_html_tags(text)))
+    if not text:
+        return ""
+    # The steps of _STEPS, inlined because this is the hot path
+    if "<" in text:
+        text = _TAG_RE.sub(" ", _SCRIPT_STYLE_RE.sub(" ", text))
+    if "](" in text:
+        if "![" in text:
+            text = _MD_IMAGE_RE.sub(r"\1", text)
+        text = _MD_LINK_RE.sub(r"\1", text)
+    if "`" in text:
+        text = _MD_INLINE_CODE_RE.sub(r"\1", text)
+    text = _strip_line_prefixes(_strip_code_blocks(text, True), True)
+    if "&" in text:
+        text = html.unescape(text)
+    return " ".join(text.split())
+
+
+class MarkupStreamNormalizer:
+    """
+    Incremental version of `strip_all_markup` for streamed LLM output.
+
+    `feed()` accepts text as it arrives and returns the plain text that can no
+    longer change. Each step of the chain holds back what later text could
+    still change (an unclosed tag, link, code span or fence, an entity, a line
+    that may still turn into a list/header marker) and passes the rest on.
+    `flush()` returns the rest at end of stream. The concatenated output
+    equals `strip_all_markup` of the whole input, unless a step holds back
+    more than `max_pending` characters, in which case it is given up on and
+    passed on as it stands.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        self.max_pending = max_pending
+        # Text each step is holding back, and whether its next text starts a line
+        self._buffers = [""] * len(_STEPS)
+        self._line_starts = [True] * len(_STEPS)
+        self._started = False
+        self._pending_space = False
+
+    def feed(self, chunk: str) -> str:
+        text = chunk
+        for i, (apply, hold) in enumerate(_STEPS):
+            if not text:
+                # Nothing new reached this step, so nothing after it changes
+                return ""
+            buffer = self._buffers[i] + text
+            cut = hold(buffer)
+            if len(buffer) - cut > self.max_pending:
+                cut = len(buffer)
+            self._buffers[i] = buffer[cut:]
+            text = self._apply(i, apply, buffer[:cut])
+        return self._emit(text)
+
+    def flush(self) -> str:
+        text = ""
+        for i, (apply, _) in enumerate(_STEPS):
+            buffer = self._buffers[i] + text
+            self._buffers[i] = ""
+            text = self._apply(i, apply, buffer)
+        text = self._emit(text)
+        self._pending_space = False
+        return text
+
+    def _apply(self, i: int, apply: Callable[[str, bool], str], text: str) -> str:
+        if not text:
+            return ""
+        out = apply(text, self._line_starts[i])
+        self._line_starts[i] = text[-1] == "\n"
+        return out
+
+    def _emit(self, piece: str) -> str:
+        words = piece.split()
+        if not words:
+            if piece and self._started:
+                self._pending_space = True
+            return ""
+        lead = " " if self._started and (self._pending_space or piece[0].isspace()) else ""
+        self._started = True
+        self._pending_space = piece[-1].isspace()
+        return lead + " ".join(words)
 
 
 def escape_ssml(text: str) -> str:
@@ -63,5 +344,3 @@ def escape_ssml(text: str) -> str:
             .replace('"', "&quot;")
             .replace("'", "&apos;"))
     return text
-
-
@@ -0,0 +1,291 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger("tracing")
+
+# Exporter configuration: "none" (default), "jsonl" or "otlp"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+# OTLP/HTTP JSON endpoint, e.g. http://localhost:4318/v1/traces
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "speech-ai-pipeline")
+
+# A client's X-Trace-Id is used only if it is a UUID or 16-32 hex digits: it
+# ends up in file names (profiles) and exported trace ids
+TRACE_ID_RE = re.compile(r"[0-9a-f]{16,32}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+OTLP_TRACE_ID_RE = re.compile(r"[0-9a-f]{1,32}")
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_time = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.duration_ms = round((time.perf_counter() - self._start_perf) * 1000, 3)
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """What `span()` yields outside a trace: attributes set on it are dropped."""
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_time)
+        root = spans[0] if spans else None
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "duration_ms": root.duration_ms if root else None,
+            "spans": [s.to_dict() for s in spans],
+        }
+
+
+def current_trace_id() -> Optional[str]:
+    """Return the trace id of the request being handled, if any."""
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def valid_trace_id(value: Optional[str]) -> bool:
+    return bool(value) and TRACE_ID_RE.fullmatch(value) is not None
+
+
+def trace_id_from_header(value: Optional[str]) -> str:
+    """The client's trace id (lowercased) if it is valid, else a new UUID."""
+    value = (value or "").strip().lower()
+    return value if valid_trace_id(value) else str(uuid.uuid4())
+
+
+def start_trace(trace_id: Optional[str] = None) -> contextvars.Token:
+    """Bind a new trace to the current context. Returns a token for `end_trace`."""
+    return _current_trace.set(Trace(trace_id or str(uuid.uuid4())))
+
+
+def end_trace(token: contextvars.Token) -> Optional[Trace]:
+    """Unbind the current trace and hand it to the configured exporter."""
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    if trace is not None:
+        export_trace(trace)
+    return trace
+
+
+def span(name: str, **attributes: Any):
+    """
+    Time a block of work as a child of the current span.
+
+    Outside of a trace this is a shared no-op span, so callers can set
+    attributes unconditionally and untraced calls cost next to nothing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _traced_span(trace, name, attributes)
+
+
+@contextmanager
+def _traced_span(trace: Trace, name: str, attributes: Dict[str, Any]):
+    parent = _current_span.get()
+    s = Span(name, trace.trace_id, parent.span_id if parent else None, attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.finish(error=e)
+        raise
+    else:
+        s.finish()
+    finally:
+        _current_span.reset(token)
+        trace.add(s)
+        logger.debug(f"span {name} {s.duration_ms}ms status={s.status}")
+
+
+async def run_in_executor(func: Callable, *args: Any) -> Any:
+    """Run a blocking function on the default executor, keeping the trace context."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(ctx.run, func, *args))
+
+
+class TraceIdFilter(logging.Filter):
+    """Inject the current trace id into log records as `trace_id`."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+_jsonl_lock = threading.Lock()
+
+
+def _write_jsonl(payload: Dict[str, Any]) -> None:
+    line = json.dumps(payload, ensure_ascii=False, default=str)
+    with _jsonl_lock:
+        with open(TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_trace_id(trace_id: str) -> str:
+    """
+    OTLP takes exactly 32 lowercase hex digits: a UUID without its dashes,
+    shorter hex ids zero-padded (as for 64-bit B3 ids), anything else hashed.
+    """
+    trace_hex = trace_id.replace("-", "").lower()
+    if OTLP_TRACE_ID_RE.fullmatch(trace_hex):
+        return trace_hex.zfill(32)
+    return hashlib.sha256(trace_id.encode("utf-8")).hexdigest()[:32]
+
+
+def _to_otlp(trace: Trace) -> Dict[str, Any]:
+    trace_hex = otlp_trace_id(trace.trace_id)
+    spans = []
+    for s in trace.spans:
+        start_ns = int(s.start_time * 1e9)
+        end_ns = start_ns + int((s.duration_ms or 0.0) * 1e6)
+        attributes = [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()]
+        if trace_hex != trace.trace_id.replace("-", ""):
+            # The id the client and the logs know this trace by
+            attributes.append({"key": "trace.original_id", "value": _otlp_value(trace.trace_id)})
+        otlp_span = {
+            "traceId": trace_hex,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": attributes,
+            "status": {"code": 2, "message": s.error or ""} if s.status == "error" else {"code": 1},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+async def _post_otlp(payload: Dict[str, Any]) -> None:
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(TRACE_OTLP_ENDPOINT, json=payload, timeout=5.0)
+            if response.status_code >= 300:
+                logger.warning(f"OTLP export rejected: {response.status_code}")
+    except Exception as e:
+        logger.warning(f"OTLP export failed: {e}")
+
+
+_background_tasks: set = set()
+
+
+def export_trace(trace: Trace) -> None:
+    """Export a finished trace without blocking the request path."""
+    if TRACE_EXPORTER in ("", "none") or not trace.spans:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if TRACE_EXPORTER == "jsonl":
+        payload = trace.to_dict()
+        if loop is not None:
+            loop.run_in_executor(None, _write_jsonl, payload)
+        else:
+            _write_jsonl(payload)
+    elif TRACE_EXPORTER == "otlp":
+        payload = _to_otlp(trace)
+        if loop is not None:
+            task = loop.create_task(_post_otlp(payload))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        else:
+            asyncio.run(_post_otlp(payload))
+    else:
+        logger.warning(f"Unknown TRACE_EXPORTER={TRACE_EXPORTER!r}; traces are not exported")
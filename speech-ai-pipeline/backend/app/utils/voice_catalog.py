@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.utils.cache_backend import cache_key, get_cache
+from app.utils.tracing import span
+
+logger = logging.getLogger("voice_catalog")
+
+VoiceFetcher = Callable[[], Awaitable[List[Dict]]]
+
+# A provider's list is served from memory; once older than this it is still
+# served while a background task fetches a new one
+VOICES_CACHE_TTL_S = float(os.getenv("VOICES_CACHE_TTL_S", "3600"))
+# After a failed fetch the current (or built-in) list is kept this long before asking again
+VOICES_RETRY_S = float(os.getenv("VOICES_RETRY_S", "60"))
+
+GENDERS = ("female", "male", "neutral")
+
+
+def normalize_locale(locale: Optional[str]) -> Optional[str]:
+    """'en_us' or 'en-US' → 'en-US'; None for voices without one."""
+    if not locale:
+        return None
+    parts = locale.replace("_", "-").split("-")
+    return "-".join([parts[0].lower()] + [part.upper() if len(part) == 2 else part for part in parts[1:]])
+
+
+def catalog_voice(voice_id: str, name: str, /, locale: Optional[str] = None, gender: Optional[str] = None,
+                  display_name: Optional[str] = None, **extra) -> Dict:
+    """A voice in the shape every provider's `list_voices` returns."""
+    locale = normalize_locale(locale)
+    gender = (gender or "").lower()
+    return {
+        "id": voice_id,
+        "name": name,
+        "display_name": display_name or name,
+        "locale": locale,
+        "language": locale.split("-")[0] if locale else None,
+        "gender": gender if gender in GENDERS else None,
+        **extra,
+    }
+
+
+class VoiceIndex:
+    """
+    One provider's voices, with lookups by id or name, full locale, language
+    and gender. Voices without a locale (multilingual ones) match every
+    language.
+    """
+
+    def __init__(self, voices: List[Dict], fetched_at: float):
+        self.voices = sorted(voices, key=lambda v: (v.get("locale") or "", v["name"]))
+        self.fetched_at = fetched_at
+        self._by_key: Dict[str, Dict] = {}
+        self._by_locale: Dict[str, List[int]] = defaultdict(list)
+        self._by_language: Dict[str, List[int]] = defaultdict(list)
+        self._by_gender: Dict[str, List[int]] = defaultdict(list)
+        self._any_locale: List[int] = []
+        for position, voice in enumerate(self.voices):
+            for key in (voice["id"], voice["name"]):
+                self._by_key.setdefault(key.lower(), voice)
+            if voice.get("locale"):
+                self._by_locale[voice["locale"].lower()].append(position)
+                self._by_language[voice["language"]].append(position)
+            else:
+                self._any_locale.append(position)
+            if voice.get("gender"):
+                self._by_gender[voice["gender"]].append(position)
+
+    def get(self, name: str) -> Optional[Dict]:
+        """The voice with this id or name (case-insensitive)."""
+        return self._by_key.get(name.lower())
+
+    def search(self, language: Optional[str] = None, gender: Optional[str] = None) -> List[Dict]:
+        """Voices of a full locale ('en-US') or a language ('en') and/or a gender, in catalog order."""
+        positions: Optional[List[int]] = None
+        if language:
+            language = language.replace("_", "-").lower()
+            by_language = self._by_locale if "-" in language else self._by_language
+            positions = sorted(by_language.get(language, []) + self._any_locale)
+        if gender:
+            matching = self._by_gender.get(gender.lower(), [])
+            if positions is None:
+                positions = matching
+            else:
+                matching = set(matching)
+                positions = [p for p in positions if p in matching]
+        if positions is None:
+            return list(self.voices)
+        return [self.voices[p] for p in positions]
+
+
+class VoiceCatalog:
+    """
+    Every provider's voice list, fetched once and indexed in memory. Lists
+    are shared with the other workers through the "voices" cache, so a host
+    fetches each one about once per `ttl_s`. Callers pass the provider's
+    `list_voices` and, optionally, a built-in list to serve when the first
+    fetch fails.
+    """
+
+    def __init__(self, ttl_s: float = VOICES_CACHE_TTL_S, retry_s: float = VOICES_RETRY_S):
+        self.ttl_s = ttl_s
+        self.retry_s = retry_s
+        self._indexes: Dict[str, VoiceIndex] = {}
+        self._next_refresh: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def index(self, provider: str, fetch: VoiceFetcher, fallback: Optional[List[Dict]] = None) -> VoiceIndex:
+        index = self._indexes.get(provider)
+        if index is None:
+            # Concurrent first requests share one fetch
+            async with self._locks.setdefault(provider, asyncio.Lock()):
+                index = self._indexes.get(provider)
+                if index is None:
+                    index = await self._load(provider, fetch, fallback)
+        elif time.time() >= self._next_refresh[provider] and provider not in self._refreshing:
+            task = asyncio.get_running_loop().create_task(self._refresh(provider, fetch))
+            self._refreshing[provider] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(provider, None))
+        return index
+
+    async def resolve(self, provider: str, name: str, fetch: VoiceFetcher,
+                      fallback: Optional[List[Dict]] = None) -> Optional[str]:
+        """Id of the provider's voice with this name (or id), or None if it has none."""
+        voice = (await self.index(provider, fetch, fallback)).get(name)
+        return voice["id"] if voice else None
+
+    @staticmethod
+    def _key(provider: str) -> str:
+        return cache_key("voice_catalog", provider)
+
+    async def _load(self, provider: str, fetch: VoiceFetcher, fallback: Optional[List[Dict]]) -> VoiceIndex:
+        cached = await get_cache("voices", default_max_mb=8).get_json(self._key(provider))
+        if cached is not None:
+            return self._install(provider, VoiceIndex(cached["voices"], cached["fetched_at"]))
+        try:
+            return await self._fetch(provider, fetch)
+        except Exception as e:
+            if fallback is None:
+                raise
+            logger.warning(f"Listing {provider} voices failed, serving the built-in list: {e}")
+            index = self._indexes[provider] = VoiceIndex(fallback, 0.0)
+            self._next_refresh[provider] = time.time() + self.retry_s
+            return index
+
+    async def _fetch(self, provider: str, fetch: VoiceFetcher) -> VoiceIndex:
+        with span("voice_catalog.fetch", provider=provider) as fetch_span:
+            voices = await fetch()
+            fetch_span.set_attribute("voices", len(voices))
+        fetched_at = time.time()
+        await get_cache("voices", default_max_mb=8).set_json(
+            self._key(provider), {"fetched_at": fetched_at, "voices": voices}, self.ttl_s)
+        return self._install(provider, VoiceIndex(voices, fetched_at))
+
+    def _install(self, provider: str, index: VoiceIndex) -> VoiceIndex:
+        self._indexes[provider] = index
+        self._next_refresh[provider] = index.fetched_at + self.ttl_s
+        return index
+
+    async def _refresh(self, provider: str, fetch: VoiceFetcher) -> None:
+        try:
+            # Another worker may already have fetched a newer list
+            cached = await get_cache("voices", default_max_mb=8).get_json(self._key(provider))
+            if cached is not None and cached["fetched_at"] > self._indexes[provider].fetched_at:
+                self._install(provider, VoiceIndex(cached["voices"], cached["fetched_at"]))
+                return
+            index = await self._fetch(provider, fetch)
+            logger.info(f"Refreshed {provider} voices: {len(index.voices)}")
+        except Exception as e:
+            logger.warning(f"Refreshing {provider} voices failed, keeping the current list: {e}")
+            self._next_refresh[provider] = time.time() + self.retry_s
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.time()
+        return {
+            provider: {"voices": len(index.voices), "age_s": round(now - index.fetched_at, 1) if index.fetched_at else None}
+            for provider, index in self._indexes.items()
+        }
+
+
+_voice_catalog: Optional[VoiceCatalog] = None
+
+
+def get_voice_catalog() -> VoiceCatalog:
+    global _voice_catalog
+    if _voice_catalog is None:
+        _voice_catalog = VoiceCatalog()
+    return _voice_catalog
@@ -0,0 +1,140 @@
+"""
+Hit latency of the shared SQLite cache backend against the in-process LRU.
+
+For each value size (a voice list is a few KB, a synthesized reply tens to
+hundreds of KB) the cache is filled with --entries values and read back in
+random order; the report shows per-hit latency of the blocking `get` and of
+`get_async` as request handlers call it (the SQLite backend runs on the
+default executor). A second report has --processes workers reading the same
+SQLite file concurrently, as uvicorn workers on one host do, and checks that
+entries written by one process are hits in all the others.
+
+    python -m benchmarks.cache_backend_bench
+    python -m benchmarks.cache_backend_bench --sizes 1024,65536 --entries 500 --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from app.utils.cache_backend import CacheBackend, MemoryLRUCache, SQLiteCache
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100.0 * (len(ordered) - 1))))]
+
+
+def fill(cache: CacheBackend, entries: int, size: int) -> List[str]:
+    keys = [f"key-{i}" for i in range(entries)]
+    value = os.urandom(size)
+    for key in keys:
+        cache.set(key, value)
+    return keys
+
+
+def time_hits(cache: CacheBackend, keys: List[str], lookups: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    order = [rng.choice(keys) for _ in range(lookups)]
+    sync_us = []
+    for key in order:
+        start = time.perf_counter()
+        value = cache.get(key)
+        sync_us.append((time.perf_counter() - start) * 1e6)
+        assert value is not None, f"{key} missed"
+
+    async def run_async() -> List[float]:
+        latencies = []
+        for key in order:
+            start = time.perf_counter()
+            await cache.get_async(key)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        return latencies
+
+    async_us = asyncio.run(run_async())
+    return {
+        "p50_us": round(_percentile(sync_us, 50), 1),
+        "p99_us": round(_percentile(sync_us, 99), 1),
+        "async_p50_us": round(_percentile(async_us, 50), 1),
+        "async_p99_us": round(_percentile(async_us, 99), 1),
+    }
+
+
+def latency_report(sizes: List[int], entries: int, lookups: int, seed: int, directory: str) -> None:
+    print(f"{'backend':<15} {'value':>8} {'p50_us':>8} {'p99_us':>8} {'async_p50_us':>13} {'async_p99_us':>13}")
+    for size in sizes:
+        max_bytes = entries * size * 2
+        for cache in (MemoryLRUCache("bench", max_bytes),
+                      SQLiteCache(f"bench_{size}", max_bytes, path=os.path.join(directory, "cache.db"))):
+            keys = fill(cache, entries, size)
+            row = time_hits(cache, keys, lookups, seed)
+            print(f"{type(cache).__name__:<15} {size:>8} {row['p50_us']:>8.1f} {row['p99_us']:>8.1f} "
+                  f"{row['async_p50_us']:>13.1f} {row['async_p99_us']:>13.1f}", flush=True)
+
+
+def _worker(path: str, worker: int, workers: int, entries: int, size: int, lookups: int, barrier, results) -> None:
+    cache = SQLiteCache("shared", entries * size * 4, path=path)
+    value = os.urandom(size)
+    # Each worker writes its share of the keys, then reads everyone's
+    for i in range(worker, entries, workers):
+        cache.set(f"key-{i}", value)
+    barrier.wait()
+    rng = random.Random(worker)
+    latencies = []
+    hits = 0
+    for _ in range(lookups):
+        key = f"key-{rng.randrange(entries)}"
+        start = time.perf_counter()
+        hits += cache.get(key) is not None
+        latencies.append((time.perf_counter() - start) * 1e6)
+    results.put((hits, latencies))
+
+
+def process_report(processes: int, entries: int, size: int, lookups: int, directory: str) -> None:
+    path = os.path.join(directory, "shared.db")
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    start = time.perf_counter()
+    workers = [context.Process(target=_worker, args=(path, i, processes, entries, size, lookups, barrier, results))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - start
+    latencies = [latency for _, worker_latencies in outcomes for latency in worker_latencies]
+    hits = sum(h for h, _ in outcomes)
+    print(f"\n{processes} processes sharing {path}: {size} B values, {entries} entries")
+    print(f"  hit rate {hits / len(latencies):.3f} across processes, p50 {_percentile(latencies, 50):.1f} us, "
+          f"p99 {_percentile(latencies, 99):.1f} us, {len(latencies) / wall:.0f} lookups/s in {wall:.1f}s")
+
+
+def parse_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hit latency of the cache backends")
+    parser.add_argument("--sizes", type=parse_list, default=[1024, 32 * 1024, 256 * 1024],
+                        help="value sizes in bytes (default 1024,32768,262144)")
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1) or 1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        latency_report(args.sizes, args.entries, args.lookups, args.seed, directory)
+        if args.processes > 1:
+            process_report(args.processes, args.entries, args.sizes[0], args.lookups, directory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Compare two load-test result files written by `benchmarks.loadgen --output`.
+
+    python -m benchmarks.compare results/before.json results/after.json
+"""
+import argparse
+import json
+
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two loadgen result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = {r["scenario"]: r for r in json.load(f)["results"]}
+    with open(args.after, encoding="utf-8") as f:
+        after = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    print(f"{'scenario':<13} {'metric':<10} {'before':>10} {'after':>10} {'delta':>8}")
+    for scenario in before:
+        if scenario not in after:
+            continue
+        b, a = before[scenario], after[scenario]
+        rows = [("rps", b["throughput_rps"], a["throughput_rps"])]
+        for key in ("p50", "p95", "p99"):
+            rows.append((key, b["latency_ms"][key], a["latency_ms"][key]))
+        if b.get("rss") and a.get("rss"):
+            rows.append(("rss_peak", b["rss"]["peak_mb"], a["rss"]["peak_mb"]))
+        for metric, bv, av in rows:
+            print(f"{scenario:<13} {metric:<10} {bv:>10} {av:>10} {_delta(bv, av):>8}")
+
+
+if __name__ == "__main__":
+    main()
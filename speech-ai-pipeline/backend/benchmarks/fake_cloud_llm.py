@@ -0,0 +1,226 @@
+"""
+A fake OpenAI / Anthropic HTTP server that simulates provider prompt caching.
+
+Implements non-streaming `POST /v1/chat/completions` and `POST /v1/messages`,
+records every request payload and reports cached prompt tokens the way the
+real APIs do:
+
+- OpenAI: prompts of at least 1024 tokens are cached automatically; a request
+  reuses the longest whole-message prefix seen before under the same
+  `prompt_cache_key`, rounded down to 128 tokens.
+- Anthropic: each `cache_control` breakpoint writes the prefix ending there
+  (system, then messages) if it is at least 1024 tokens; a request reads the
+  longest previously written prefix found by looking back at most 20 blocks
+  from each of its breakpoints. Usage splits `input_tokens`,
+  `cache_read_input_tokens` and `cache_creation_input_tokens`.
+
+Token counts are len(text) / 4. Point the SDKs at it with OPENAI_BASE_URL
+(`<url>/v1`) and ANTHROPIC_BASE_URL (`<url>`).
+
+    python -m benchmarks.fake_cloud_llm --port 11600
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set
+
+from benchmarks.standins import LatencyModel
+
+DEFAULT_RESPONSE = "Sure! Here is a short, friendly answer from the cloud model."
+MIN_CACHEABLE_TOKENS = 1024
+OPENAI_CACHE_INCREMENT = 128
+ANTHROPIC_LOOKBACK_BLOCKS = 20
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _block_texts(content) -> List[str]:
+    if isinstance(content, str):
+        return [content]
+    return [block.get("text", "") for block in content]
+
+
+class FakeCloudLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Optional[LatencyModel] = None,
+                 response: str = DEFAULT_RESPONSE):
+        self.latency = latency or LatencyModel()
+        self.response = response
+        self.requests: List[dict] = []
+        self._openai_prefixes: Dict[str, Set[str]] = {}
+        self._anthropic_prefixes: Set[str] = set()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeCloudLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-cloud-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def requests_for(self, path: str) -> List[dict]:
+        with self._lock:
+            return [r["payload"] for r in self.requests if r["path"] == path]
+
+    # -- OpenAI ----------------------------------------------------------------
+
+    def openai_completion(self, payload: dict) -> dict:
+        messages = payload.get("messages") or []
+        key = payload.get("prompt_cache_key") or ""
+        # Running hash and token count at each whole-message prefix
+        digest = hashlib.sha256()
+        prefixes = []
+        total = 0
+        for message in messages:
+            digest.update(json.dumps([message.get("role"), _block_texts(message.get("content") or "")]).encode("utf-8"))
+            total += _tokens("".join(_block_texts(message.get("content") or ""))) + 4
+            prefixes.append((digest.hexdigest(), total))
+        cached = 0
+        with self._lock:
+            seen = self._openai_prefixes.setdefault(key, set())
+            if total >= MIN_CACHEABLE_TOKENS:
+                for prefix_hash, tokens in reversed(prefixes):
+                    if prefix_hash in seen:
+                        cached = tokens // OPENAI_CACHE_INCREMENT * OPENAI_CACHE_INCREMENT
+                        break
+                seen.update(prefix_hash for prefix_hash, _ in prefixes)
+        completion = len(self.response.split())
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.response}}],
+            "usage": {
+                "prompt_tokens": total,
+                "completion_tokens": completion,
+                "total_tokens": total + completion,
+                "prompt_tokens_details": {"cached_tokens": cached},
+            },
+        }
+
+    # -- Anthropic -------------------------------------------------------------
+
+    def anthropic_message(self, payload: dict) -> dict:
+        system = payload.get("system") or []
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        blocks = list(system)
+        for message in payload.get("messages") or []:
+            content = message.get("content") or ""
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            blocks.extend({**block, "role": message.get("role")} for block in content)
+
+        digest = hashlib.sha256()
+        positions = []
+        total = 0
+        for block in blocks:
+            digest.update(json.dumps([block.get("role"), block.get("text", "")]).encode("utf-8"))
+            total += _tokens(block.get("text", ""))
+            positions.append((digest.hexdigest(), total, "cache_control" in block))
+        breakpoints = [i for i, (_, _, marked) in enumerate(positions) if marked]
+
+        read = 0
+        written = 0
+        with self._lock:
+            # Every breakpoint is a lookup point, each looking back a limited number of blocks
+            for last in reversed(breakpoints):
+                for i in range(last, max(-1, last - ANTHROPIC_LOOKBACK_BLOCKS), -1):
+                    if positions[i][0] in self._anthropic_prefixes:
+                        read = positions[i][1]
+                        break
+                if read:
+                    break
+            for i in breakpoints:
+                prefix_hash, tokens, _ = positions[i]
+                if tokens >= MIN_CACHEABLE_TOKENS and prefix_hash not in self._anthropic_prefixes:
+                    self._anthropic_prefixes.add(prefix_hash)
+                    written = max(written, tokens - read)
+        return {
+            "id": "msg_fake",
+            "type": "message",
+            "role": "assistant",
+            "model": payload.get("model"),
+            "content": [{"type": "text", "text": self.response}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": total - read - written,
+                "output_tokens": len(self.response.split()),
+                "cache_read_input_tokens": read,
+                "cache_creation_input_tokens": written,
+            },
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "invalid json"}})
+                    return
+                path = self.path.split("?")[0]
+                if path not in ("/v1/chat/completions", "/v1/messages"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                with server._lock:
+                    server.requests.append({"path": path, "payload": payload})
+                time.sleep(server.latency.sample_ms() / 1000.0)
+                if path == "/v1/chat/completions":
+                    self._send_json(200, server.openai_completion(payload))
+                else:
+                    self._send_json(200, server.anthropic_message(payload))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI/Anthropic server with simulated prompt caching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11600)
+    parser.add_argument("--latency", default="300:50:uniform", help="mean[:jitter[:distribution]] in ms")
+    args = parser.parse_args()
+
+    server = FakeCloudLLMServer(args.host, args.port, LatencyModel.parse(args.latency))
+    print(f"Fake OpenAI/Anthropic listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+A fake Ollama HTTP server for offline benchmarks.
+
+Implements the subset of the Ollama API the backend uses:
+`GET /api/tags`, `GET /api/ps`, `POST /api/generate` and `POST /api/chat`
+(non-streaming), with a configurable latency model. Models are resident the
+way Ollama keeps them: the first request to a model that is not loaded also
+waits `load_ms`, a request without a prompt (or messages) only loads the
+model, and each request keeps it loaded for its `keep_alive` (default 5m;
+negative: forever, 0: unload now). `parallel` caps how many requests it
+works on at once, like OLLAMA_NUM_PARALLEL on one GPU; the rest queue.
+
+Run standalone:
+
+    python -m benchmarks.fake_ollama --port 11500 --latency 400:100:lognormal --load-ms 3000
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from app.services.llm.ollama_service import keep_alive_seconds, model_key
+from benchmarks.standins import LatencyModel
+
+DEFAULT_RESPONSE = "Sure! Here is a short, friendly answer from the local model."
+
+
+class FakeOllamaServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Optional[LatencyModel] = None,
+                 models: Optional[List[str]] = None, response: str = DEFAULT_RESPONSE, load_ms: float = 0.0,
+                 parallel: int = 0):
+        self.latency = latency or LatencyModel()
+        self.models = list(models or ["llama2", "mistral"])
+        self.load_ms = load_ms
+        # Loaded model → when it unloads
+        self.loaded: Dict[str, float] = {}
+        self.loads = 0
+        self._slots = threading.BoundedSemaphore(parallel) if parallel > 0 else None
+        self.response = response
+        self.requests: List[dict] = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def resident(self) -> Dict[str, float]:
+        now = time.time()
+        with self._lock:
+            for model in [m for m, expires in self.loaded.items() if expires <= now]:
+                del self.loaded[model]
+            return dict(self.loaded)
+
+    def _use(self, model: str, keep_alive) -> bool:
+        """Keep `model` loaded for `keep_alive`; True if it had to be loaded."""
+        cold = model not in self.resident()
+        seconds = keep_alive_seconds(keep_alive)
+        with self._lock:
+            if cold:
+                self.loads += 1
+            if seconds > 0:
+                self.loaded[model] = time.time() + seconds
+            else:
+                self.loaded.pop(model, None)
+        return cold
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": m, "model": m} for m in server.models]})
+                elif self.path == "/api/ps":
+                    models = []
+                    for m, expires in server.resident().items():
+                        # Ollama reports a model kept forever as expiring centuries from now
+                        expires = min(expires, time.time() + 100 * 365 * 86400)
+                        expires_at = datetime.fromtimestamp(expires, timezone.utc).isoformat()
+                        models.append({"name": f"{m}:latest", "model": f"{m}:latest", "expires_at": expires_at})
+                    self._send_json(200, {"models": models})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": "invalid json"})
+                    return
+                model = model_key(payload.get("model") or "")
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                if model not in server.models:
+                    self._send_json(404, {"error": f"model '{model}' not found"})
+                    return
+                with server._lock:
+                    server.requests.append({"path": self.path, **payload})
+                if payload.get("keep_alive") == 0 and not (payload.get("prompt") or payload.get("messages")):
+                    server._use(model, 0)
+                    self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "unload"})
+                    return
+                if server._slots is not None:
+                    server._slots.acquire()
+                try:
+                    if server._use(model, payload.get("keep_alive")):
+                        time.sleep(server.load_ms / 1000.0)
+                    if not (payload.get("prompt") or payload.get("messages")):
+                        self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "load"})
+                        return
+                    time.sleep(server.latency.sample_ms() / 1000.0)
+                finally:
+                    if server._slots is not None:
+                        server._slots.release()
+                eval_count = len(server.response.split())
+                if self.path == "/api/generate":
+                    self._send_json(200, {"model": model, "response": server.response, "done": True, "eval_count": eval_count})
+                else:
+                    self._send_json(200, {
+                        "model": model,
+                        "message": {"role": "assistant", "content": server.response},
+                        "done": True,
+                        "eval_count": eval_count,
+                    })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", default="300:50:uniform", help="mean[:jitter[:distribution]] in ms")
+    parser.add_argument("--models", default="llama2,mistral")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="time to load a model that is not resident")
+    parser.add_argument("--parallel", type=int, default=0, help="requests worked on at once (0: unlimited)")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, LatencyModel.parse(args.latency), args.models.split(","),
+                              load_ms=args.load_ms, parallel=args.parallel)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Offline load generator for the pipeline and per-stage routers.
+
+By default the app is served in-process with every cloud provider replaced by
+a stand-in and Ollama pointed at a fake Ollama server, so no API keys or
+network access are needed:
+
+    python -m benchmarks.loadgen --scenario process --concurrency 16 --requests 400 \\
+        --stt-latency 250:50 --llm-latency 600:200:lognormal --tts-latency 300:80 \\
+        --output results/process-c16.json
+
+Use `--base-url` to drive an already running server instead.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.standins import LatencyModel, install_standins, make_wav
+
+SCENARIOS = ("process", "process-text", "stt", "llm", "llm-chat", "tts")
+
+CHAT_HISTORY = json.dumps([
+    {"role": "user", "content": "Hi there, can you help me plan a trip?"},
+    {"role": "assistant", "content": "Of course! Where would you like to go?"},
+    {"role": "user", "content": "Somewhere warm in March."},
+    {"role": "assistant", "content": "Lisbon, Seville or the Canary Islands are all lovely in March."},
+])
+
+
+def read_rss_bytes() -> int:
+    """Current resident set size of this process (Linux /proc, falling back to peak RSS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return 0
+
+
+class RSSSampler:
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.samples: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(read_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        self._thread.join()
+        if not self.samples:
+            return {"start_mb": 0.0, "end_mb": 0.0, "peak_mb": 0.0}
+        mb = 1024 * 1024
+        return {
+            "start_mb": round(self.samples[0] / mb, 1),
+            "end_mb": round(self.samples[-1] / mb, 1),
+            "peak_mb": round(max(self.samples) / mb, 1),
+        }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def build_request(scenario: str, args, wav: bytes, session_id: Optional[str] = None):
+    """Return (path, form data, files) for one request of the given scenario."""
+    llm_fields = {"llm_provider": args.llm_provider, "llm_max_tokens": "150", "llm_temperature": "0.7"}
+    if session_id:
+        llm_fields["session_id"] = session_id
+    elif args.with_history:
+        llm_fields["llm_messages"] = CHAT_HISTORY
+    if scenario == "process":
+        data = {"stt_provider": args.stt_provider, "tts_provider": args.tts_provider, **llm_fields}
+        return "/api/pipeline/process", data, {"audio": ("utterance.wav", wav, "audio/wav")}
+    if scenario == "process-text":
+        data = {"text": "What is the weather like today?", "tts_provider": args.tts_provider, **llm_fields}
+        return "/api/pipeline/process-text", data, None
+    if scenario == "stt":
+        return "/api/stt/transcribe", {"provider": args.stt_provider}, {"audio": ("utterance.wav", wav, "audio/wav")}
+    if scenario == "llm":
+        return "/api/llm/generate", {"text": "What is the weather like today?", "provider": args.llm_provider}, None
+    if scenario == "llm-chat":
+        if session_id:
+            return "/api/llm/chat", {"session_id": session_id, "text": "And in April?", "provider": args.llm_provider}, None
+        return "/api/llm/chat", {"messages": CHAT_HISTORY, "provider": args.llm_provider}, None
+    if scenario == "tts":
+        return "/api/tts/synthesize", {"text": "It is sunny with highs around 24 degrees.", "provider": args.tts_provider}, None
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+async def run_load(base_url: str, scenario: str, args) -> Dict:
+    wav = make_wav(args.audio_seconds)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    bytes_received = 0
+    issued = 0
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+
+        async def worker():
+            nonlocal issued, bytes_received
+            # Each worker is one conversation that keeps growing server-side
+            session_id = None
+            if args.with_session:
+                session_id = (await client.post("/api/sessions")).json()["session_id"]
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif issued >= args.requests:
+                    return
+                issued += 1
+                path, data, files = build_request(scenario, args, wav, session_id)
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, data=data, files=files)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if response.status_code == 200:
+                        latencies.append(elapsed)
+                        bytes_received += len(response.content)
+                    else:
+                        key = f"http_{response.status_code}"
+                        errors[key] = errors.get(key, 0) + 1
+                except Exception as e:
+                    key = type(e).__name__
+                    errors[key] = errors.get(key, 0) + 1
+
+        # Warm-up outside the measured window
+        for _ in range(args.warmup):
+            path, data, files = build_request(scenario, args, wav)
+            try:
+                await client.post(path, data=data, files=files)
+            except Exception:
+                pass
+
+        rss = RSSSampler()
+        rss.start()
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall_s = time.perf_counter() - wall_start
+        rss_stats = rss.stop()
+
+    ordered = sorted(latencies)
+    completed = len(ordered)
+    return {
+        "scenario": scenario,
+        "completed": completed,
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(completed / wall_s, 2) if wall_s > 0 else 0.0,
+        "latency_ms": {
+            "min": round(ordered[0], 2) if ordered else 0.0,
+            "mean": round(sum(ordered) / completed, 2) if completed else 0.0,
+            "p50": round(percentile(ordered, 50), 2),
+            "p95": round(percentile(ordered, 95), 2),
+            "p99": round(percentile(ordered, 99), 2),
+            "max": round(ordered[-1], 2) if ordered else 0.0,
+        },
+        "bytes_received": bytes_received,
+        # RSS is only meaningful for the in-process server
+        "rss": rss_stats if not args.base_url else None,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class InProcessServer:
+    """Serve the FastAPI app with uvicorn on a background thread."""
+
+    def __init__(self, port: int):
+        import uvicorn
+        from app.main import app
+
+        self.port = port
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="uvicorn", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load generator for the speech pipeline")
+    parser.add_argument("--scenario", default="process", help=f"comma-separated list or 'all': {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="run each scenario for N seconds instead")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--base-url", default=None, help="drive a running server instead of an in-process one")
+    parser.add_argument("--stt-provider", default="whisper")
+    parser.add_argument("--llm-provider", default="openai")
+    parser.add_argument("--tts-provider", default="edge")
+    parser.add_argument("--with-history", action="store_true", help="send chat history in llm_messages")
+    parser.add_argument("--with-session", action="store_true", help="continue a server-side session instead of sending history")
+    parser.add_argument("--audio-seconds", type=float, default=2.0)
+    parser.add_argument("--stt-latency", default="250:50", help="mean[:jitter[:distribution]] in ms")
+    parser.add_argument("--llm-latency", default="600:150:lognormal")
+    parser.add_argument("--tts-latency", default="300:60")
+    parser.add_argument("--ollama-latency", default="800:200:lognormal")
+    parser.add_argument("--stt-blocking", action="store_true", help="stub STT blocks the event loop like the Whisper SDK")
+    parser.add_argument("--log-level", default="WARNING", help="log level for the in-process server")
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    scenarios = SCENARIOS if args.scenario == "all" else tuple(args.scenario.split(","))
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario: {scenario}")
+
+    fake_ollama = None
+    server = None
+    tts_stub = None
+    base_url = args.base_url
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if base_url is None:
+        os.environ.setdefault("LOG_LEVEL", args.log_level)
+        fake_ollama = FakeOllamaServer(latency=LatencyModel.parse(args.ollama_latency)).start()
+        os.environ["OLLAMA_BASE_URL"] = fake_ollama.base_url
+        tts_stub = install_standins(
+            LatencyModel.parse(args.stt_latency),
+            LatencyModel.parse(args.llm_latency),
+            LatencyModel.parse(args.tts_latency),
+            stt_blocking=args.stt_blocking,
+        )
+        server = InProcessServer(_free_port())
+        server.start()
+        base_url = f"http://127.0.0.1:{server.port}"
+
+    results = []
+    try:
+        for scenario in scenarios:
+            result = asyncio.run(run_load(base_url, scenario, args))
+            results.append(result)
+            lat = result["latency_ms"]
+            rss = result["rss"] or {}
+            print(
+                f"{scenario:<13} c={args.concurrency:<3} ok={result['completed']:<5} err={sum(result['errors'].values()):<4} "
+                f"rps={result['throughput_rps']:<8} p50={lat['p50']:<8} p95={lat['p95']:<8} p99={lat['p99']:<8} "
+                f"rss_peak={rss.get('peak_mb', '-')}MB"
+            )
+            if tts_stub is not None:
+                tts_stub.cleanup()
+    finally:
+        if server is not None:
+            server.stop()
+        if fake_ollama is not None:
+            fake_ollama.stop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "base_url": args.base_url or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "duration": args.duration,
+            "providers": {"stt": args.stt_provider, "llm": args.llm_provider, "tts": args.tts_provider},
+            "with_history": args.with_history,
+            "with_session": args.with_session,
+            "latency": {
+                "stt": LatencyModel.parse(args.stt_latency).to_dict(),
+                "llm": LatencyModel.parse(args.llm_latency).to_dict(),
+                "tts": LatencyModel.parse(args.tts_latency).to_dict(),
+                "ollama": LatencyModel.parse(args.ollama_latency).to_dict(),
+            },
+        },
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
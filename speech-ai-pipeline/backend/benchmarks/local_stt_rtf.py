@@ -0,0 +1,167 @@
+"""
+Real-time factor of the local STT provider against CPU threads and batching.
+
+For each thread count the model is loaded with that many CTranslate2 threads
+and the clips are transcribed at each concurrency level (concurrent requests
+are grouped by the service's micro-batcher, up to --batch-size). The report
+shows the real-time factor (processing time / audio time, lower is better),
+audio seconds transcribed per wall second, per-request latency and the batch
+sizes that formed.
+
+    python -m benchmarks.local_stt_rtf --audio samples/*.wav
+    python -m benchmarks.local_stt_rtf --audio samples/ --threads 1,2,4,8 --concurrency 1,4,8 --model small
+
+Needs faster-whisper and the model weights (downloaded on first use unless
+LOCAL_STT_MODEL_DIR points at a local copy). Without --audio the clips are
+silence, which decodes to almost no tokens and so understates the cost of real
+speech; use recordings for numbers worth comparing.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from app.services.stt import local_whisper_service
+from app.services.stt.local_whisper_service import SAMPLE_RATE, LocalWhisperService
+from benchmarks.standins import make_wav
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".opus", ".webm", ".flac")
+
+
+def audio_files(patterns: List[str]) -> List[str]:
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(os.path.join(pattern, name) for name in os.listdir(pattern)
+                                if name.lower().endswith(AUDIO_EXTENSIONS)))
+        else:
+            files.extend(sorted(glob.glob(pattern)))
+    return files
+
+
+def silent_clips(count: int, duration_s: float) -> List[str]:
+    paths = []
+    for _ in range(count):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
+            f.write(make_wav(duration_s))
+            paths.append(f.name)
+    return paths
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100.0 * (len(ordered) - 1))))]
+
+
+async def run_level(service: LocalWhisperService, files: List[str], concurrency: int, rounds: int,
+                    language: Optional[str]) -> Dict:
+    durations = {path: len(local_whisper_service.decode_audio(path, SAMPLE_RATE)) / SAMPLE_RATE for path in files}
+    queue = [path for _ in range(rounds) for path in files]
+    latencies: List[float] = []
+    before = service.batcher.stats()
+
+    async def client():
+        while queue:
+            path = queue.pop()
+            start = time.perf_counter()
+            await service.transcribe(path, language)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    after = service.batcher.stats()
+    audio_s = sum(durations.values()) * rounds
+    batches = after["batches"] - before["batches"]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "audio_s": round(audio_s, 1),
+        "wall_s": round(wall, 2),
+        "rtf": round(wall / audio_s, 4),
+        "audio_s_per_s": round(audio_s / wall, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "mean_batch_size": round((after["items"] - before["items"]) / batches, 2) if batches else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace, files: List[str]) -> List[Dict]:
+    results = []
+    for threads in args.threads:
+        service = LocalWhisperService()
+        service.model_name = args.model
+        service.compute_type = args.compute_type
+        service.cpu_threads = threads
+        service.batcher.max_batch = args.batch_size
+        service.batcher.window_s = args.window_ms / 1000.0
+        load_start = time.perf_counter()
+        service.load_model()
+        load_s = time.perf_counter() - load_start
+        # Warm up once so the first level doesn't pay for lazy initialization
+        await service.transcribe(files[0], args.language)
+        for concurrency in args.concurrency:
+            level = await run_level(service, files, concurrency, args.rounds, args.language)
+            level.update(threads=threads, load_s=round(load_s, 1))
+            results.append(level)
+            print(f"threads={threads:<3} concurrency={concurrency:<3} rtf={level['rtf']:.3f}  "
+                  f"{level['audio_s_per_s']:>7.1f} audio s/s  p50 {level['p50_ms']:.0f} ms  "
+                  f"p95 {level['p95_ms']:.0f} ms  batch {level['mean_batch_size']:.1f}", flush=True)
+    return results
+
+
+def parse_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    cores = os.cpu_count() or 1
+    default_threads = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    parser = argparse.ArgumentParser(description="Real-time factor of the local STT provider")
+    parser.add_argument("--audio", nargs="*", default=[], help="audio files, globs or directories")
+    parser.add_argument("--model", default=os.getenv("LOCAL_STT_MODEL", "base"))
+    parser.add_argument("--compute-type", default=os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8"))
+    parser.add_argument("--language", default="en-US", help="'auto-detect' to include language detection")
+    parser.add_argument("--threads", type=parse_list, default=default_threads,
+                        help=f"comma-separated CPU thread counts (default {','.join(map(str, default_threads))})")
+    parser.add_argument("--concurrency", type=parse_list, default=[1, 4, 8], help="concurrent requests per level")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=25.0)
+    parser.add_argument("--rounds", type=int, default=2, help="times each clip is transcribed per level")
+    parser.add_argument("--clips", type=int, default=8, help="silent clips to generate without --audio")
+    parser.add_argument("--clip-seconds", type=float, default=5.0)
+    parser.add_argument("--output", help="write the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if local_whisper_service.WhisperModel is None:
+        print("error: faster-whisper is not installed (pip install faster-whisper)", file=sys.stderr)
+        return 2
+    files = audio_files(args.audio) if args.audio else silent_clips(args.clips, args.clip_seconds)
+    if not files:
+        print("error: no audio files found", file=sys.stderr)
+        return 2
+    print(f"{len(files)} clips, model {args.model} ({args.compute_type}), {os.cpu_count()} cores", flush=True)
+    try:
+        results = asyncio.run(run(args, files))
+    finally:
+        if not args.audio:
+            for path in files:
+                os.unlink(path)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "compute_type": args.compute_type, "cores": os.cpu_count(),
+                       "clips": len(files), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
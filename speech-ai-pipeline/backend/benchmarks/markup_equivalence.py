@@ -0,0 +1,153 @@
+"""
+Differential check for `strip_all_markup` and its streaming form.
+
+Compares `strip_all_markup` with the step-by-step reference
+(`strip_html_tags` -> `strip_markdown` -> `normalize_whitespace`) on generated
+LLM-style answers, and checks that `MarkupStreamNormalizer` fed the same text
+split into token-sized chunks, or cut at random points, produces exactly the
+one-shot output. The streaming check also runs on random soups of markup
+characters, which reach hold-back cases that well-formed answers don't.
+
+    python -m benchmarks.markup_equivalence --cases 2000 --seed 7
+"""
+import argparse
+import random
+import sys
+from typing import List
+
+from app.utils.text_utils import (
+    MarkupStreamNormalizer,
+    normalize_whitespace,
+    strip_all_markup,
+    strip_html_tags,
+    strip_markdown,
+)
+
+WORDS = ["the", "service", "config", "C#", "3.14", "e.g.", "status", "ready", "Paris", "日本語", "_id", "a*b"]
+INLINE = [
+    "**{w}**", "*{w}*", "__{w}__", "_{w}_", "`{w}`", "[{w}](https://example.com/{w})",
+    "![{w}](https://example.com/{w}.png)", "[![{w}](https://img/{w}.svg)](https://ci/{w})",
+    "[{w} ![{w}](https://img/{w}.png) {w}](https://example.com/{w})", "[![]({w}.png)]({w})", "!{w}", "[{w}]",
+    "<b>{w}</b>", "<a href='x'>{w}</a>", "{w}&amp;{w}",
+    "&nbsp;{w}", "&#42;{w}&#x2A;", "&lt;{w}&gt;",
+    # Code spans holding a line marker, which counts once the span is unwrapped
+    "`#include <{w}.h>`", "`- {w}`", "`1. {w}`", "`> {w}`",
+    # Empty fences, and a bare "<" or ">"
+    "``````", "{w} ```` {w}", "<{w}", "{w}>",
+    # Entities that only form once emphasis, links or code spans are removed
+    "{w}_&_amp;", "&[amp]({w});", "&`amp`;", "&*#42*;",
+    # Code spans and links that overlap
+    "[{w}`{w}]({w}) {w}`", "`{w} [{w}` {w}]({w})",
+]
+LINE_PREFIXES = ["", "", "", "# ", "## ", "### ", "> ", "- ", "* ", "+ ", "1. ", "12. ", "  - ", "> - ", "**1.** "]
+BLOCKS = [
+    "```python\nimport os\nprint(os.getcwd())\n```",
+    "<script>console.log('x');</script>",
+    "<style>p { color: red; }</style>",
+    "<p>Some <i>inline</i> HTML.</p>",
+]
+# Pieces of markup for the streaming-only soup cases
+SOUP = ["a", "b", " ", "\n", "!", "[", "]", "(", ")", "<", ">", "`", "```", "&", "amp;", "amp", "&#42;", "#", "*",
+        "_", "-", "+", "1", ".", "1.", "> ", "script", "style", "/", "![", "](", "<script>", "</script>", "<b>"]
+
+# Inputs that once came out differently, checked before the generated ones
+KNOWN = [
+    "See [![Build](https://img/badge.svg)](https://ci) now",
+    "`#include <stdio.h>` first\n`- item`\n`1. step`\n`> quote`",
+    "before\n``````\n# after",
+    "a_&_amp;",
+    "&[amp](x); and &`amp`;",
+    "[a`b](u) c`",
+    "- \n  - a",
+    "<a <script>x</script> b>",
+]
+
+
+def reference(text: str) -> str:
+    return normalize_whitespace(strip_markdown(strip_html_tags(text)))
+
+
+def random_answer(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(1, 12)):
+        if rng.random() < 0.1:
+            lines.append(rng.choice(BLOCKS))
+            continue
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            word = rng.choice(WORDS)
+            if rng.random() < 0.4:
+                parts.append(rng.choice(INLINE).format(w=word))
+            else:
+                parts.append(word)
+        lines.append(rng.choice(LINE_PREFIXES) + " ".join(parts))
+    return rng.choice(["\n", "\n\n"]).join(lines)
+
+
+def random_soup(rng: random.Random) -> str:
+    return "".join(rng.choice(SOUP) for _ in range(rng.randint(1, 40)))
+
+
+def random_split(text: str, rng: random.Random) -> List[str]:
+    """Token-sized chunks, or the text cut at a few random points."""
+    if rng.random() < 0.5:
+        cuts = sorted(rng.sample(range(1, len(text)), min(rng.randint(1, 6), len(text) - 1))) if len(text) > 1 else []
+        return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.choice([1, 1, 2, 3, 4, 8, 16])
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def stream(chunks: List[str]) -> str:
+    normalizer = MarkupStreamNormalizer()
+    return "".join(normalizer.feed(chunk) for chunk in chunks) + normalizer.flush()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Differential check for strip_all_markup and its streaming form")
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show", type=int, default=5, help="print up to N mismatches of each kind")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reference_mismatches = stream_mismatches = 0
+    for case in range(len(KNOWN) + args.cases):
+        text = KNOWN[case] if case < len(KNOWN) else random_answer(rng)
+        expected = strip_all_markup(text)
+        if reference(text) != expected:
+            reference_mismatches += 1
+            if reference_mismatches <= args.show:
+                print(f"reference mismatch:\n  input:     {text!r}\n  reference: {reference(text)!r}\n  one-shot:  {expected!r}")
+        streamed = stream(random_split(text, rng))
+        if streamed == expected:
+            # Single cut points as well
+            for cut in rng.sample(range(1, len(text)), min(24, len(text) - 1)) if len(text) > 1 else []:
+                streamed = stream([text[:cut], text[cut:]])
+                if streamed != expected:
+                    break
+        if streamed != expected:
+            stream_mismatches += 1
+            if stream_mismatches <= args.show:
+                print(f"stream mismatch:\n  input:    {text!r}\n  one-shot: {expected!r}\n  streamed: {streamed!r}")
+
+    for _ in range(args.cases):
+        text = random_soup(rng)
+        expected = strip_all_markup(text)
+        for chunks in (list(text), random_split(text, rng)):
+            streamed = stream(chunks)
+            if streamed != expected:
+                stream_mismatches += 1
+                if stream_mismatches <= args.show:
+                    print(f"stream mismatch:\n  input:    {text!r}\n  one-shot: {expected!r}\n  streamed: {streamed!r}")
+                break
+
+    print(f"{args.cases} cases: {reference_mismatches} reference mismatches, {stream_mismatches} stream mismatches")
+    return 1 if reference_mismatches or stream_mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
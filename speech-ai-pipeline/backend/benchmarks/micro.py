@@ -0,0 +1,368 @@
+"""
+Micro-benchmarks for hot-path utilities with baseline regression gating.
+
+    python -m benchmarks.micro                      # run and compare against the stored baseline
+    python -m benchmarks.micro --save-baseline      # record a new baseline
+    python -m benchmarks.micro --filter markup      # only benchmarks whose name contains "markup"
+
+Each timing round is paired with a round of a fixed pure-Python calibration
+workload, and a benchmark's normalized result is the median of its per-round
+ratios, so a baseline recorded on one machine is still meaningful on another
+and a slow stretch of a shared machine hits both sides of the ratio. The run
+exits with status 1 when any benchmark is slower than its baseline by more
+than `--threshold` (default 25%), or by more than its own threshold for
+entries registered with one.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+
+_FIXTURE_DIR: Optional[str] = None
+
+BENCHMARKS: List[Tuple[str, Callable[[], Callable[[], object]], Optional[float]]] = []
+
+
+def benchmark(name: str, threshold: Optional[float] = None):
+    """
+    Register a setup function that returns the zero-argument callable to time.
+
+    `threshold` overrides --threshold for entries that the calibration
+    workload tracks less closely (numpy, C-level regex work); the larger of
+    the two applies.
+    """
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS.append((name, setup, threshold))
+        return setup
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Realistic inputs
+# ---------------------------------------------------------------------------
+
+def long_markdown_answer(sections: int = 12) -> str:
+    """A long LLM answer mixing the markdown and HTML constructs models tend to emit."""
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Step {i + 1}: Configure the *service* properly\n")
+        parts.append(
+            f"To get started, open the [dashboard](https://example.com/dash/{i}) and check the **status** "
+            f"of each component. Use `kubectl get pods -n team-{i}` to list them &amp; verify they're _ready_.\n"
+        )
+        parts.append("> Note: changes can take a few minutes to propagate.\n")
+        parts.append("- First, update the config file\n- Then restart the worker\n* Finally, check the logs\n")
+        parts.append("1. Open the settings\n2. Select **Advanced**\n3. Save\n")
+        parts.append(f"```python\nimport os\nprint(os.environ.get('TOKEN_{i}'))\n```\n")
+        parts.append(f"<p>Some <b>inline</b> HTML&nbsp;content with an image ![diagram](https://example.com/{i}.png).</p>\n")
+        parts.append("<script>console.log('ignored');</script>\n\n")
+    return "".join(parts)
+
+
+def chat_history(turns: int = 200) -> str:
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i}: can you explain how part {i} of the system works in detail?"})
+        messages.append({"role": "assistant", "content": "Sure. " + "It works by coordinating several components. " * 8})
+    return json.dumps(messages)
+
+
+def fixture_dir() -> str:
+    """A temporary directory for fixture files, removed when the process exits."""
+    global _FIXTURE_DIR
+    if _FIXTURE_DIR is None:
+        _FIXTURE_DIR = tempfile.mkdtemp(prefix="micro-bench-")
+        atexit.register(shutil.rmtree, _FIXTURE_DIR, True)
+    return _FIXTURE_DIR
+
+
+def write_audio_fixtures(directory: str) -> Dict[str, str]:
+    """Audio files with realistic container headers followed by a large body."""
+    body = os.urandom(1024 * 1024)
+    headers = {
+        "wav": b"RIFF" + (len(body) + 36).to_bytes(4, "little") + b"WAVEfmt " + b"\x10\x00\x00\x00\x01\x00\x01\x00\x80\x3e\x00\x00",
+        "webm": b"\x1A\x45\xDF\xA3\x9f\x42\x86\x81\x01\x42\xf7\x81\x01\x42\xf2\x81\x04",
+        "ogg": b"OggS\x00\x02" + b"\x00" * 20,
+        "mp3": b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x64",
+    }
+    paths = {}
+    for kind, header in headers.items():
+        path = os.path.join(directory, f"sample.{kind}")
+        with open(path, "wb") as f:
+            f.write(header + body)
+        paths[kind] = path
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+@benchmark("text_utils.strip_all_markup[long_markdown]")
+def bench_strip_all_markup_long():
+    from app.utils.text_utils import strip_all_markup
+    text = long_markdown_answer()
+    return lambda: strip_all_markup(text)
+
+
+@benchmark("text_utils.strip_all_markup[short_answer]")
+def bench_strip_all_markup_short():
+    from app.utils.text_utils import strip_all_markup
+    text = "Sure! The **capital** of France is [Paris](https://en.wikipedia.org/wiki/Paris)."
+    return lambda: strip_all_markup(text)
+
+
+@benchmark("text_utils.MarkupStreamNormalizer[long_markdown_4char_tokens]")
+def bench_markup_stream():
+    from app.utils.text_utils import MarkupStreamNormalizer
+    text = long_markdown_answer()
+    tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def run():
+        normalizer = MarkupStreamNormalizer()
+        for token in tokens:
+            normalizer.feed(token)
+        normalizer.flush()
+    return run
+
+
+@benchmark("segmenter.SentenceSegmenter[long_markdown_4char_tokens]")
+def bench_sentence_segmenter():
+    from app.utils.segmenter import SentenceSegmenter
+    text = long_markdown_answer()
+    tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def run():
+        segmenter = SentenceSegmenter("en-US", max_wait_s=None)
+        for token in tokens:
+            segmenter.feed(token)
+        segmenter.flush()
+    return run
+
+
+@benchmark("stt.google._detect_audio_encoding[4_formats_1MB]")
+def bench_detect_audio_encoding():
+    from app.services.stt.google_service import _detect_audio_encoding
+    paths = list(write_audio_fixtures(fixture_dir()).values())
+
+    def run():
+        for path in paths:
+            _detect_audio_encoding(path)
+    return run
+
+
+@benchmark("pipeline.build_chat_messages[400_messages]")
+def bench_build_chat_messages():
+    from app.api.pipeline import build_chat_messages
+    history = chat_history(200)
+    prompt = "You are a helpful AI assistant. Provide clear, concise responses."
+    return lambda: build_chat_messages(history, prompt, "And what about part 201?")
+
+
+@benchmark("context_window.fit[400_messages_4k_budget]")
+def bench_context_fit():
+    from app.utils.context_window import ContextWindow
+    messages = [{"role": "system", "content": "You are a helpful AI assistant."}] + json.loads(chat_history(200))
+    messages.append({"role": "user", "content": "And what about part 201?"})
+    window = ContextWindow(budget_tokens=4000)
+    return lambda: window.fit(messages, "openai", "gpt-4o", 150)
+
+
+# numpy does most of the work here, and its speed moves independently of the
+# pure-Python calibration workload on a shared machine
+@benchmark("semantic_cache.lookup[2000_entries]", threshold=0.5)
+def bench_semantic_cache_lookup():
+    import random
+    from app.utils.semantic_cache import SemanticCache
+    rng = random.Random(1)
+    words = "how do i reset change cancel update my password email plan order account store hours price today".split()
+    cache = SemanticCache(max_entries=2000)
+    partition = SemanticCache.partition_key("openai", None, "You are a helpful AI assistant.", 150, 0.7)
+    for _ in range(2000):
+        cache.store(" ".join(rng.choice(words) for _ in range(8)), partition, {"response": "answer"})
+    return lambda: cache.lookup("um, how can I reset my password please", partition)
+
+
+@benchmark("pipeline.response_headers[long_answer]")
+def bench_response_headers():
+    from app.api.pipeline import pipeline_response
+    from app.utils.text_utils import strip_all_markup
+    answer = strip_all_markup(long_markdown_answer(4))
+    path = os.path.join(fixture_dir(), "response.mp3")
+    with open(path, "wb") as f:
+        f.write(b"ID3")
+    result = {
+        "llm_provider": "openai",
+        "llm_route": "openai",
+        "tts_provider": "edge",
+        "tts_route": "edge",
+        "stt_route": "whisper",
+        "session_id": "5f0c6a52-3b8e-4e8a-9a5e-1d2f0b7c9e41",
+        "context": {"tokens_before": 5200, "tokens_after": 3900},
+        "degradations": [],
+        "semantic_cache": None,
+        "audio_format": "mp3",
+        "sample_rate": None,
+        "audio_file": path,
+        "audio": None,
+    }
+    text_headers = {
+        "X-Transcribed-Text": "What are the steps to configure the service?",
+        "X-Response-Text": answer,
+        "X-STT-Provider": "whisper",
+        "X-STT-Confidence": str(0.95),
+    }
+    return lambda: pipeline_response(result, text_headers)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _calibration_workload():
+    total = 0
+    for i in range(200_000):
+        total += i % 7
+    return total
+
+
+def calibrate(repeats: int = 5) -> float:
+    """Best-of seconds for a fixed pure-Python workload, used to normalize results."""
+    return _measure(_calibration_workload, repeats=repeats, min_time=0.0, number=1)
+
+
+def _calls_per_round(func: Callable[[], object], min_time: float) -> int:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time or number >= 1_000_000:
+            return number
+        number *= 2
+
+
+def _measure(func: Callable[[], object], repeats: int, min_time: float, number: Optional[int] = None) -> float:
+    """
+    Best seconds per call over `repeats` rounds.
+
+    The minimum is used rather than the median: noise on a shared machine
+    only ever adds time, so the fastest round is the most repeatable.
+    """
+    if number is None:
+        number = _calls_per_round(func, min_time)
+    rounds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return min(rounds)
+
+
+def _measure_normalized(func: Callable[[], object], repeats: int, min_time: float) -> Tuple[float, float]:
+    """
+    (best seconds per call, median ratio to the calibration workload).
+
+    Each round times the calibration workload right before the benchmark, so
+    both sides of a ratio see the same machine; the median of the ratios
+    ignores the rounds where only one side was interrupted.
+    """
+    number = _calls_per_round(func, min_time)
+    best = None
+    ratios = []
+    for _ in range(repeats):
+        calibration = _measure(_calibration_workload, repeats=1, min_time=0.0, number=1)
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        seconds = (time.perf_counter() - start) / number
+        best = seconds if best is None else min(best, seconds)
+        ratios.append(seconds / calibration)
+    return best, statistics.median(ratios)
+
+
+def run_benchmarks(name_filter: Optional[str], repeats: int, min_time: float) -> Dict:
+    results = {}
+    for name, setup, _ in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        func = setup()
+        seconds, normalized = _measure_normalized(func, repeats=repeats, min_time=min_time)
+        results[name] = {"best_us": round(seconds * 1e6, 3), "normalized": normalized}
+    return {"calibration_s": calibrate(repeats=max(repeats, 10)), "results": results}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    limits = {name: max(threshold, entry_threshold or 0.0) for name, _, entry_threshold in BENCHMARKS}
+    print(f"{'benchmark':<52} {'best':>12} {'baseline':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<52} {result['best_us']:>10.1f}us {'-':>12} {'new':>8}")
+            continue
+        change = result["normalized"] / base["normalized"] - 1.0
+        flag = ""
+        if change > limits.get(name, threshold):
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<52} {result['best_us']:>10.1f}us {base['best_us']:>10.1f}us {change * 100:>+7.1f}%{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks with regression gating")
+    parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this string")
+    parser.add_argument("--repeats", type=int, default=15)
+    parser.add_argument("--min-time", type=float, default=0.1, help="minimum seconds per timing round")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.filter, args.repeats, args.min_time)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        merged = dict(baseline.get("results", {}))
+        merged.update(current["results"])
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "recorded": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "calibration_s": current["calibration_s"],
+                "results": merged,
+            }, f, indent=2, sort_keys=True)
+        for name, result in current["results"].items():
+            print(f"{name:<52} {result['best_us']:>10.1f}us")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 1
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed past their threshold")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
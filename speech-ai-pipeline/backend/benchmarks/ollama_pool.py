@@ -0,0 +1,119 @@
+"""
+Ollama host pool: the same chat load against one fake Ollama server and
+against a pool of them, through `OllamaService`.
+
+Each fake host works on `--parallel` requests at a time (one GPU box) and
+takes `--load-ms` to load a model it doesn't have resident. The pool run
+preloads `--preload` models on every host first, and `--kill-after` stops
+the last host once that many requests have finished, to show it being
+ejected and its traffic moving to the others.
+
+    python -m benchmarks.ollama_pool --hosts 1,3 --concurrency 12 --requests 240
+    python -m benchmarks.ollama_pool --hosts 3 --kill-after 100 --output results/ollama-pool.json
+
+Reports throughput, p50/p95 latency, errors and, per host, its requests,
+cold requests, errors and utilization.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from app.services.llm.ollama_service import OllamaService
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.loadgen import percentile
+from benchmarks.standins import LatencyModel
+
+
+async def run_pool(servers: List[FakeOllamaServer], args) -> Dict:
+    os.environ["OLLAMA_BASE_URL"] = ",".join(server.base_url for server in servers)
+    os.environ["OLLAMA_PRELOAD_MODELS"] = args.preload
+    os.environ["OLLAMA_EJECT_BACKOFF_S"] = str(args.eject_backoff)
+    # A fresh service (and host pool) per run
+    service = OllamaService()
+    await service.preload()
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    remaining = list(range(args.requests))
+
+    async def worker():
+        while remaining:
+            remaining.pop()
+            start = time.perf_counter()
+            try:
+                await service.chat([{"role": "user", "content": "Tell me something short."}], max_tokens=32)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                key = str(e)[:80]
+                errors[key] = errors.get(key, 0) + 1
+            if args.kill_after and len(latencies) == args.kill_after and len(servers) > 1:
+                await asyncio.to_thread(servers[-1].stop)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "hosts": len(servers),
+        "completed": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {"p50": round(percentile(latencies, 50), 1), "p95": round(percentile(latencies, 95), 1)},
+        "retried": service.stats()["retried"],
+        "per_host": [
+            {key: host[key] for key in ("base_url", "requests", "cold_requests", "errors", "utilization", "healthy")}
+            for host in service.host_stats()
+        ],
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Chat load against one fake Ollama host and a pool of them")
+    parser.add_argument("--hosts", default="1,3", help="comma-separated pool sizes")
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=240)
+    parser.add_argument("--latency", default="200:40:uniform", help="per-request latency, mean[:jitter[:distribution]] in ms")
+    parser.add_argument("--load-ms", type=float, default=1500.0)
+    parser.add_argument("--parallel", type=int, default=2, help="requests each host works on at once")
+    parser.add_argument("--preload", default="default")
+    parser.add_argument("--kill-after", type=int, default=0, help="stop the last host after this many requests")
+    parser.add_argument("--eject-backoff", type=float, default=5.0)
+    parser.add_argument("--output", help="write the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = []
+    print(f"{'hosts':>5} {'ok':>5} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'retried':>7}  per-host requests/cold/util")
+    for size in [int(n) for n in args.hosts.split(",") if n.strip()]:
+        servers = [FakeOllamaServer(latency=LatencyModel.parse(args.latency), load_ms=args.load_ms,
+                                    parallel=args.parallel).start() for _ in range(size)]
+        try:
+            result = asyncio.run(run_pool(servers, args))
+        finally:
+            for server in servers:
+                try:
+                    server.stop()
+                except Exception:
+                    pass
+        results.append(result)
+        per_host = "  ".join(f"{h['requests']}/{h['cold_requests']}/{h['utilization']:.2f}" for h in result["per_host"])
+        print(f"{size:>5} {result['completed']:>5} {sum(result['errors'].values()):>4} {result['throughput_rps']:>8} "
+              f"{result['latency_ms']['p50']:>8} {result['latency_ms']['p95']:>8} {result['retried']:>7}  {per_host}",
+              flush=True)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
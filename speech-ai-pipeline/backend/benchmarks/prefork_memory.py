@@ -0,0 +1,140 @@
+"""
+Per-worker memory and boot time: `uvicorn --workers` against the pre-fork
+server (`python -m app.cli.serve`).
+
+Each mode is started with --workers processes on a free port; the report
+shows the wall time until every worker logged that it is ready and, per
+worker, its resident set (RSS), proportional set (PSS: shared pages divided
+among the processes sharing them) and private memory, read from
+/proc/<pid>/smaps_rollup. The total PSS of the parent and its workers is the
+memory the deployment actually costs.
+
+    python -m benchmarks.prefork_memory --workers 4
+    python -m benchmarks.prefork_memory --workers 2,4,8 --output results/prefork.json
+
+Linux only (reads /proc). Set LOCAL_STT_PRELOAD / LOCAL_TTS_VOICES_DIR as in
+production to include the local models in the comparison.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+MODES = {
+    "uvicorn": lambda port, workers: [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                                      "--port", str(port), "--workers", str(workers)],
+    "prefork": lambda port, workers: [sys.executable, "-m", "app.cli.serve", "--host", "127.0.0.1",
+                                      "--port", str(port), "--workers", str(workers)],
+}
+READY_RE = re.compile(r"Worker ready: pid (\d+) booted in ([\d.]+)s")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def children(pid: int) -> List[int]:
+    found = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tid}/children") as f:
+            found.extend(int(child) for child in f.read().split())
+    return found
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": fields.get("Rss", 0), "pss": fields.get("Pss", 0),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def run_mode(mode: str, workers: int, timeout_s: float) -> Dict:
+    port = free_port()
+    env = dict(os.environ, JOBS_WORKERS=os.getenv("JOBS_WORKERS", "0"))
+    start = time.perf_counter()
+    process = subprocess.Popen(MODES[mode](port, workers), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, env=env)
+    ready: Dict[int, float] = {}
+    all_ready = threading.Event()
+
+    def read_output():
+        for line in process.stdout:
+            match = READY_RE.search(line)
+            if match:
+                ready[int(match.group(1))] = float(match.group(2))
+                if len(ready) >= workers:
+                    all_ready.set()
+
+    threading.Thread(target=read_output, daemon=True).start()
+    try:
+        if not all_ready.wait(timeout_s):
+            raise RuntimeError(f"{mode}: only {len(ready)}/{workers} workers ready after {timeout_s:.0f}s")
+        wall_s = time.perf_counter() - start
+        # Let the workers finish their startup work before measuring them
+        time.sleep(1.0)
+        parent = memory_kb(process.pid)
+        per_worker = {pid: memory_kb(pid) for pid in children(process.pid) if pid in ready}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def mean(key: str) -> float:
+        return round(sum(m[key] for m in per_worker.values()) / len(per_worker) / 1024, 1)
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "all_ready_s": round(wall_s, 2),
+        "worker_boot_s": round(max(ready.values()), 2),
+        "worker_rss_mb": mean("rss"),
+        "worker_pss_mb": mean("pss"),
+        "worker_private_mb": mean("private"),
+        "total_pss_mb": round((parent["pss"] + sum(m["pss"] for m in per_worker.values())) / 1024, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-worker memory and boot time of the serving modes")
+    parser.add_argument("--workers", default="4", help="comma-separated worker counts")
+    parser.add_argument("--modes", default="uvicorn,prefork")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("error: needs Linux /proc/<pid>/smaps_rollup", file=sys.stderr)
+        return 2
+
+    results = []
+    print(f"{'mode':<8} {'workers':>7} {'all_ready_s':>11} {'boot_s':>7} {'rss_mb':>7} {'pss_mb':>7} "
+          f"{'private_mb':>10} {'total_pss_mb':>12}")
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        for mode in args.modes.split(","):
+            row = run_mode(mode, workers, args.timeout)
+            results.append(row)
+            print(f"{mode:<8} {workers:>7} {row['all_ready_s']:>11.2f} {row['worker_boot_s']:>7.2f} "
+                  f"{row['worker_rss_mb']:>7.1f} {row['worker_pss_mb']:>7.1f} {row['worker_private_mb']:>10.1f} "
+                  f"{row['total_pss_mb']:>12.1f}", flush=True)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cores": os.cpu_count(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
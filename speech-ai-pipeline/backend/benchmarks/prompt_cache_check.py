@@ -0,0 +1,151 @@
+"""
+Prompt-caching payload check against the fake OpenAI/Anthropic server.
+
+Runs a multi-turn conversation through `OpenAIService.chat` and
+`AnthropicService.chat` (real SDK clients, pointed at
+`benchmarks.fake_cloud_llm`) and checks the request payloads:
+
+- Anthropic: the system prompt is sent as blocks with a cache breakpoint on
+  the first one, the newest user turn carries a breakpoint, there are at
+  most four breakpoints, and the caller's messages are not modified.
+- OpenAI: every turn sends the same `prompt_cache_key`, and each request
+  starts with the previous request's messages unless context trimming moved
+  its cut point.
+- Both: cached prompt tokens are reported in `tokens_details` from the
+  second turn on, and nothing cache-related is sent with PROMPT_CACHING=off.
+
+A small context budget is used so that trimming happens during the run.
+
+    python -m benchmarks.prompt_cache_check
+    python -m benchmarks.prompt_cache_check --turns 30 --budget 3000
+"""
+import argparse
+import asyncio
+import copy
+import os
+import sys
+from typing import Dict, List
+
+from benchmarks.fake_cloud_llm import FakeCloudLLMServer
+
+SYSTEM_PROMPT = (
+    "You are a helpful voice assistant for a home automation product. Answers are read aloud, so keep them "
+    "short, avoid markup and lists, and spell out numbers and units. "
+) * 40
+
+
+def _breakpoints(payload: Dict) -> int:
+    count = sum(1 for block in payload.get("system") or [] if isinstance(block, dict) and "cache_control" in block)
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, list):
+            count += sum(1 for block in content if "cache_control" in block)
+    return count
+
+
+async def run_conversation(service, turns: int) -> List[Dict]:
+    """Chat for `turns` turns, returning the service result of each."""
+    history = [{"role": "system", "content": SYSTEM_PROMPT}]
+    results = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Turn {turn}: how do I set up scene number {turn} for the living room lights?"})
+        snapshot = copy.deepcopy(history)
+        result = await service.chat(messages=history, max_tokens=150)
+        if history != snapshot:
+            raise AssertionError("chat() modified the caller's messages")
+        results.append(result)
+        history.append({"role": "assistant", "content": result["response"]})
+    return results
+
+
+def check_anthropic(payloads: List[Dict], results: List[Dict], caching: bool) -> List[str]:
+    failures = []
+    for turn, (payload, result) in enumerate(zip(payloads, results)):
+        details = result.get("tokens_details") or {}
+        if not caching:
+            if _breakpoints(payload) or not isinstance(payload.get("system"), str):
+                failures.append(f"anthropic turn {turn}: cache markers sent with caching disabled")
+            continue
+        system = payload.get("system")
+        if not isinstance(system, list) or "cache_control" not in system[0]:
+            failures.append(f"anthropic turn {turn}: system prompt is not a cached block")
+        last_content = payload["messages"][-1]["content"]
+        if not isinstance(last_content, list) or "cache_control" not in last_content[-1]:
+            failures.append(f"anthropic turn {turn}: newest user turn has no cache breakpoint")
+        if _breakpoints(payload) > 4:
+            failures.append(f"anthropic turn {turn}: {_breakpoints(payload)} breakpoints (max 4)")
+        if result["tokens_used"] != details.get("prompt_tokens", 0) + details.get("completion_tokens", 0):
+            failures.append(f"anthropic turn {turn}: tokens_used does not include cached prompt tokens")
+        if turn > 0 and not details.get("cached_tokens"):
+            failures.append(f"anthropic turn {turn}: no cached tokens reported")
+    return failures
+
+
+def check_openai(payloads: List[Dict], results: List[Dict], caching: bool) -> List[str]:
+    failures = []
+    keys = {payload.get("prompt_cache_key") for payload in payloads}
+    if not caching:
+        if keys != {None}:
+            failures.append("openai: prompt_cache_key sent with caching disabled")
+        return failures
+    if len(keys) != 1 or None in keys:
+        failures.append(f"openai: prompt_cache_key not stable across turns: {keys}")
+    for turn in range(1, len(payloads)):
+        previous, current = payloads[turn - 1]["messages"], payloads[turn]["messages"]
+        cut_moved = results[turn]["context"]["dropped_messages"] != results[turn - 1]["context"]["dropped_messages"]
+        if not cut_moved and current[:len(previous)] != previous:
+            failures.append(f"openai turn {turn}: request does not extend the previous prefix")
+        if not cut_moved and not (results[turn].get("tokens_details") or {}).get("cached_tokens"):
+            failures.append(f"openai turn {turn}: no cached tokens reported")
+    return failures
+
+
+def summarize(name: str, results: List[Dict]) -> None:
+    prompt = sum((r.get("tokens_details") or {}).get("prompt_tokens", 0) for r in results)
+    cached = sum((r.get("tokens_details") or {}).get("cached_tokens", 0) for r in results)
+    written = sum((r.get("tokens_details") or {}).get("cache_write_tokens", 0) for r in results)
+    trims = len({r["context"]["dropped_messages"] for r in results}) - 1
+    print(f"{name:<10} turns={len(results):<4} prompt_tokens={prompt:<8} cached={cached:<8} "
+          f"written={written:<8} cached_ratio={cached / prompt if prompt else 0:.2f} cut_moves={trims}")
+
+
+async def run(turns: int, caching: bool) -> List[str]:
+    os.environ["PROMPT_CACHING"] = "on" if caching else "off"
+    server = FakeCloudLLMServer().start()
+    try:
+        os.environ["OPENAI_API_KEY"] = "test"
+        os.environ["OPENAI_BASE_URL"] = f"{server.base_url}/v1"
+        os.environ["ANTHROPIC_API_KEY"] = "test"
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        from app.services.llm.anthropic_service import AnthropicService
+        from app.services.llm.openai_service import OpenAIService
+
+        openai_results = await run_conversation(OpenAIService(), turns)
+        anthropic_results = await run_conversation(AnthropicService(), turns)
+        failures = check_openai(server.requests_for("/v1/chat/completions"), openai_results, caching)
+        failures += check_anthropic(server.requests_for("/v1/messages"), anthropic_results, caching)
+        print(f"PROMPT_CACHING={'on' if caching else 'off'}")
+        summarize("openai", openai_results)
+        summarize("anthropic", anthropic_results)
+        return failures
+    finally:
+        server.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check prompt-caching request payloads against a fake provider")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=2200, help="CONTEXT_BUDGET_TOKENS for the run")
+    args = parser.parse_args()
+
+    os.environ["CONTEXT_BUDGET_TOKENS"] = str(args.budget)
+    failures = asyncio.run(run(args.turns, caching=True))
+    failures += asyncio.run(run(min(args.turns, 3), caching=False))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
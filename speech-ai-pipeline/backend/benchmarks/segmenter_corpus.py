@@ -0,0 +1,116 @@
+"""
+Multilingual corpus check and latency/prosody report for the sentence segmenter.
+
+Each line of `benchmarks/data/segmenter_corpus.jsonl` holds a language, an
+input text, a `min_chars` setting and the expected segments. Every case is
+fed whole, character by character and in random token splits; all three
+must give the expected segments. The report then shows, for a range of
+`min_chars` values, how long segments are and how many characters of
+lookahead each one waited for.
+
+    python -m benchmarks.segmenter_corpus
+    python -m benchmarks.segmenter_corpus --min-chars 0,20,40,80 --splits 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+from app.utils.segmenter import SentenceSegmenter
+from benchmarks.micro import long_markdown_answer
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "segmenter_corpus.jsonl")
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def segment(language: str, min_chars: int, tokens: List[str]) -> List[str]:
+    # Forced flushes are disabled so the result does not depend on timing
+    segmenter = SentenceSegmenter(language, min_chars=min_chars, max_wait_s=None, max_chars=None)
+    segments = []
+    for token in tokens:
+        segments.extend(segmenter.feed(token))
+    segments.extend(segmenter.flush())
+    return segments
+
+
+def random_tokens(text: str, rng: random.Random) -> List[str]:
+    tokens, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 6)
+        tokens.append(text[pos:pos + size])
+        pos += size
+    return tokens
+
+
+def check_corpus(corpus: List[Dict], splits: int, seed: int) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    for case in corpus:
+        text, expected = case["text"], case["segments"]
+        variants = [("whole", [text]), ("chars", list(text))]
+        variants += [(f"random#{i}", random_tokens(text, rng)) for i in range(splits)]
+        for name, tokens in variants:
+            got = segment(case["language"], case.get("min_chars", 0), tokens)
+            if got != expected:
+                failures += 1
+                print(f"FAIL [{case['language']}] {name}: {text!r}\n  expected {expected}\n  got      {got}")
+                break
+    print(f"corpus: {len(corpus) - failures}/{len(corpus)} cases pass")
+    return failures
+
+
+def latency_report(texts: Dict[str, str], min_chars_values: List[int], token_size: int) -> None:
+    """Segment length vs. lookahead (characters received after a segment ended before it was emitted)."""
+    print(f"\n{'language':<8} {'min_chars':>9} {'segments':>8} {'avg_len':>8} {'avg_wait':>9} {'max_wait':>9} {'us/token':>9}")
+    for language, text in texts.items():
+        tokens = [text[i:i + token_size] for i in range(0, len(text), token_size)]
+        for min_chars in min_chars_values:
+            segmenter = SentenceSegmenter(language, min_chars=min_chars, max_wait_s=None, max_chars=None)
+            segments: List[str] = []
+            waits: List[int] = []
+            start = time.perf_counter()
+            for token in tokens:
+                for seg in segmenter.feed(token):
+                    segments.append(seg)
+                    # Lookahead: characters that had arrived beyond the emitted text
+                    waits.append(len(segmenter.pending_text))
+            segments.extend(segmenter.flush())
+            elapsed = time.perf_counter() - start
+            avg_len = sum(len(s) for s in segments) / len(segments) if segments else 0.0
+            avg_wait = sum(waits) / len(waits) if waits else 0.0
+            print(
+                f"{language:<8} {min_chars:>9} {len(segments):>8} {avg_len:>8.1f} {avg_wait:>9.1f} "
+                f"{max(waits, default=0):>9} {elapsed / len(tokens) * 1e6:>9.2f}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sentence segmenter corpus check and latency report")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--splits", type=int, default=10, help="random token splits per corpus case")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-chars", default="0,20,40,80")
+    parser.add_argument("--token-size", type=int, default=4, help="characters per token in the latency report")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    failures = check_corpus(corpus, args.splits, args.seed)
+
+    texts: Dict[str, str] = {"en": long_markdown_answer()}
+    for case in corpus:
+        language = case["language"].split("-")[0]
+        if language != "en":
+            texts[language] = texts.get(language, "") + (" " if language in texts else "") + case["text"]
+    latency_report(texts, [int(v) for v in args.min_chars.split(",")], args.token_size)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Threshold calibration and lookup latency for the semantic response cache.
+
+Each line of `benchmarks/data/semantic_cache_pairs.jsonl` holds a cached
+question, a new question and whether the cached answer would be right for
+it. For a range of thresholds the report shows how many same-answer pairs
+hit (recall) and how many different-answer pairs would wrongly be served
+from the cache, with and without the number/contrast-word guard. A second
+report times lookups against caches of increasing size.
+
+    python -m benchmarks.semantic_cache_eval
+    python -m benchmarks.semantic_cache_eval --thresholds 0.7,0.8,0.9 --sizes 100,1000,10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+from app.utils.semantic_cache import SemanticCache, _guard_words, normalize_query
+
+PAIRS_PATH = os.path.join(os.path.dirname(__file__), "data", "semantic_cache_pairs.jsonl")
+
+
+def load_pairs(path: str = PAIRS_PATH) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def threshold_report(pairs: List[Dict], thresholds: List[float], show: bool) -> int:
+    """Prints recall / false hits per threshold; returns false hits at the default threshold."""
+    embedder = SemanticCache().embedder
+    scored = []
+    for pair in pairs:
+        a, b = normalize_query(pair["query"]), normalize_query(pair["candidate"])
+        similarity = float(embedder.embed(a) @ embedder.embed(b))
+        scored.append((similarity, _guard_words(a) == _guard_words(b), pair))
+    same = sum(1 for pair in pairs if pair["same"])
+    different = len(pairs) - same
+
+    print(f"{'threshold':>9} {'recall':>8} {'false_hits':>10} {'false_hits_unguarded':>21}")
+    for threshold in thresholds:
+        hits = sum(1 for s, guard, p in scored if p["same"] and s >= threshold and guard)
+        false_hits = sum(1 for s, guard, p in scored if not p["same"] and s >= threshold and guard)
+        unguarded = sum(1 for s, _, p in scored if not p["same"] and s >= threshold)
+        print(f"{threshold:>9.2f} {hits:>4}/{same:<3} {false_hits:>6}/{different:<3} {unguarded:>17}/{different:<3}")
+    if show:
+        for similarity, guard, pair in sorted(scored, key=lambda item: -item[0]):
+            label = "same" if pair["same"] else "diff"
+            print(f"  {similarity:.3f} {label} guard={'ok' if guard else 'blocks'}  {pair['query']!r} ~ {pair['candidate']!r}")
+    default = SemanticCache().threshold
+    return sum(1 for s, guard, p in scored if not p["same"] and s >= default and guard)
+
+
+def latency_report(pairs: List[Dict], sizes: List[int], lookups: int, seed: int) -> None:
+    rng = random.Random(seed)
+    words = sorted({w for p in pairs for w in normalize_query(p["query"] + " " + p["candidate"]).split()})
+    print(f"\n{'entries':>8} {'store_us':>9} {'lookup_us':>10}")
+    for size in sizes:
+        cache = SemanticCache(max_entries=size)
+        partition = SemanticCache.partition_key("openai", "gpt-4o", "You are a helpful assistant.", 150, 0.7)
+        questions = [" ".join(rng.choice(words) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+        start = time.perf_counter()
+        for question in questions:
+            cache.store(question, partition, {"response": "answer"})
+        store_us = (time.perf_counter() - start) / size * 1e6
+        probes = [rng.choice(questions) for _ in range(lookups)]
+        start = time.perf_counter()
+        for probe in probes:
+            cache.lookup(probe, partition)
+        lookup_us = (time.perf_counter() - start) / lookups * 1e6
+        print(f"{size:>8} {store_us:>9.1f} {lookup_us:>10.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Semantic cache threshold calibration and latency")
+    parser.add_argument("--pairs", default=PAIRS_PATH)
+    parser.add_argument("--thresholds", default="0.70,0.75,0.80,0.82,0.85,0.90,0.95")
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show", action="store_true", help="print every pair with its similarity")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    false_hits = threshold_report(pairs, [float(t) for t in args.thresholds.split(",")], args.show)
+    latency_report(pairs, [int(s) for s in args.sizes.split(",")], args.lookups, args.seed)
+    return 1 if false_hits else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Local stand-ins for the STT, LLM and TTS providers.
+
+The stubs implement the same async interfaces as the real services
+(`transcribe`, `generate`/`chat`, `synthesize`/`list_voices`, `is_available`)
+and sleep for a configurable latency instead of calling a paid API.
+"""
+import asyncio
+import math
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+class LatencyModel:
+    """
+    Latency distribution in milliseconds.
+
+    - **constant**: always `mean_ms`
+    - **uniform**: `mean_ms ± jitter_ms`
+    - **normal**: gaussian with stddev `jitter_ms`
+    - **lognormal**: long-tailed, median `mean_ms`, sigma derived from `jitter_ms / mean_ms`
+    """
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, distribution: str = "uniform", seed: Optional[int] = None):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self._random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """Parse `mean[:jitter[:distribution]]`, e.g. `300:50:lognormal`."""
+        parts = spec.split(":")
+        mean_ms = float(parts[0]) if parts[0] else 0.0
+        jitter_ms = float(parts[1]) if len(parts) > 1 and parts[1] else 0.0
+        distribution = parts[2] if len(parts) > 2 and parts[2] else "uniform"
+        return cls(mean_ms, jitter_ms, distribution)
+
+    def sample_ms(self) -> float:
+        if self.distribution == "constant" or self.jitter_ms <= 0:
+            value = self.mean_ms
+        elif self.distribution == "normal":
+            value = self._random.gauss(self.mean_ms, self.jitter_ms)
+        elif self.distribution == "lognormal":
+            sigma = self.jitter_ms / self.mean_ms if self.mean_ms > 0 else 0.0
+            value = self.mean_ms * math.exp(self._random.gauss(0.0, sigma))
+        else:
+            value = self._random.uniform(self.mean_ms - self.jitter_ms, self.mean_ms + self.jitter_ms)
+        return max(0.0, value)
+
+    async def wait(self, blocking: bool = False) -> None:
+        """Sleep for one sample; `blocking=True` mimics an SDK that blocks the event loop."""
+        delay = self.sample_ms() / 1000.0
+        if blocking:
+            time.sleep(delay)
+        else:
+            await asyncio.sleep(delay)
+
+    def to_dict(self) -> Dict:
+        return {"mean_ms": self.mean_ms, "jitter_ms": self.jitter_ms, "distribution": self.distribution}
+
+
+class StubSTTService:
+    def __init__(self, latency: Optional[LatencyModel] = None, text: str = "What is the weather like today?", blocking: bool = False):
+        self.latency = latency or LatencyModel()
+        self.text = text
+        self.blocking = blocking
+
+    async def transcribe(self, audio_file_path: str, language: Optional[str] = "en-US") -> Dict:
+        await self.latency.wait(self.blocking)
+        return {"text": self.text, "confidence": 0.99, "language": language}
+
+    def is_available(self) -> bool:
+        return True
+
+
+class StubLLMService:
+    def __init__(self, latency: Optional[LatencyModel] = None, response: Optional[str] = None):
+        self.latency = latency or LatencyModel()
+        self.response = response or (
+            "Here is a **short** answer with some `markup`: it is sunny, "
+            "with highs around 24 degrees. See [the forecast](https://example.com) for details."
+        )
+        self.default_model = "stub-model"
+
+    async def generate(self, text: str, model: Optional[str] = None, max_tokens: int = 150,
+                       temperature: float = 0.7, system_prompt: str = "") -> Dict:
+        await self.latency.wait()
+        return {"response": self.response, "model": model or self.default_model,
+                "tokens_used": len(self.response.split()), "finish_reason": "stop"}
+
+    async def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                   max_tokens: int = 150, temperature: float = 0.7) -> Dict:
+        await self.latency.wait()
+        return {"response": self.response, "model": model or self.default_model,
+                "tokens_used": len(self.response.split()), "finish_reason": "stop"}
+
+    def is_available(self) -> bool:
+        return True
+
+
+class StubTTSService:
+    def __init__(self, latency: Optional[LatencyModel] = None, audio_bytes: int = 32 * 1024):
+        self.latency = latency or LatencyModel()
+        # ID3 header followed by silence-sized padding; enough for FileResponse to stream
+        self.payload = b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\x00" * max(0, audio_bytes - 10)
+        self.created: List[str] = []
+
+    async def synthesize(self, text: str, voice: Optional[str] = None, language: str = "en-US",
+                         speed: float = 1.0, pitch: float = 0.0, **kwargs) -> str:
+        await self.latency.wait()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
+            temp_file.write(self.payload)
+            self.created.append(temp_file.name)
+            return temp_file.name
+
+    async def list_voices(self) -> List[Dict]:
+        return [{"id": "stub-voice", "name": "stub-voice", "display_name": "stub-voice", "locale": "en-US",
+                 "language": "en", "gender": "neutral"}]
+
+    def cleanup(self) -> None:
+        """Delete the files this stub produced (FileResponse leaves them behind, like the real services)."""
+        for path in self.created:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self.created.clear()
+
+    def is_available(self) -> bool:
+        return True
+
+
+def make_wav(duration_s: float = 1.0, sample_rate: int = 16000) -> bytes:
+    """A mono 16-bit WAV of silence, used as the upload for STT routes."""
+    import io
+    import wave
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * int(duration_s * sample_rate))
+    return buffer.getvalue()
+
+
+def install_standins(stt_latency: LatencyModel, llm_latency: LatencyModel, tts_latency: LatencyModel,
+                     stt_blocking: bool = False) -> StubTTSService:
+    """
+    Replace every cloud provider in the pipeline and per-stage routers with stubs.
+
+    Ollama is left as the real `OllamaService` so it can be pointed at the
+    fake Ollama server through `OLLAMA_BASE_URL`. Returns the TTS stub so
+    the caller can clean up its output files.
+    """
+    from app.api import pipeline, stt, llm, tts
+
+    stt_stub = StubSTTService(stt_latency, blocking=stt_blocking)
+    llm_stub = StubLLMService(llm_latency)
+    tts_stub = StubTTSService(tts_latency)
+
+    for name in ("whisper", "google", "azure"):
+        pipeline.stt_services[name] = stt_stub
+    for name in ("openai", "anthropic"):
+        pipeline.llm_services[name] = llm_stub
+    for name in ("google", "elevenlabs", "edge", "gtts"):
+        pipeline.tts_services[name] = tts_stub
+
+    stt.whisper_service = stt.google_service = stt.azure_service = stt_stub
+    llm.openai_service = llm.anthropic_service = llm_stub
+    tts.google_service = tts.elevenlabs_service = tts.edge_service = tts.gtts_service = tts_stub
+    return tts_stub
+
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Provider, PipelineStatus, ChatMessage } from './types';
+import { Provider, PipelineStatus, ChatMessage, PipelineMetadata } from './types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
@@ -44,6 +44,74 @@ export const getTTSVoices = async (provider: string, language?: string) => {
   return response.data;
 };
 
+const PIPELINE_TIMEOUT_MS = 120000;
+
+// Reads a response_format=framed body: a 4-byte big-endian length, that many
+// bytes of JSON metadata, then the audio. `onMetadata` gets the metadata as
+// soon as it arrives, before the audio has finished downloading.
+const readFramedResponse = async (
+  response: Response,
+  onMetadata?: (metadata: PipelineMetadata) => void
+): Promise<{ blob: Blob; metadata: PipelineMetadata }> => {
+  if (!response.body) {
+    throw new Error('Pipeline response has no body');
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let head = new Uint8Array(0);
+  let metadata: PipelineMetadata | null = null;
+  const audioChunks: Uint8Array[] = [];
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    if (metadata) {
+      audioChunks.push(value);
+      continue;
+    }
+    const joined = new Uint8Array(head.length + value.length);
+    joined.set(head);
+    joined.set(value, head.length);
+    head = joined;
+    if (head.length < 4) continue;
+    const length = new DataView(head.buffer).getUint32(0);
+    if (head.length < 4 + length) continue;
+    metadata = JSON.parse(decoder.decode(head.subarray(4, 4 + length))) as PipelineMetadata;
+    audioChunks.push(head.subarray(4 + length));
+    onMetadata?.(metadata);
+  }
+
+  if (!metadata) {
+    throw new Error('Pipeline response ended before its metadata');
+  }
+  return { blob: new Blob(audioChunks, { type: metadata.audio.media_type }), metadata };
+};
+
+// POST a pipeline form asking for the framed response
+const postPipeline = async (
+  path: string,
+  formData: FormData,
+  onMetadata?: (metadata: PipelineMetadata) => void
+): Promise<{ blob: Blob; metadata: PipelineMetadata }> => {
+  formData.append('response_format', 'framed');
+  const controller = new AbortController();
+  const timeout = setTimeout(() => controller.abort(), PIPELINE_TIMEOUT_MS);
+  try {
+    const response = await fetch(`${API_BASE_URL}${path}`, {
+      method: 'POST',
+      body: formData,
+      signal: controller.signal,
+    });
+    if (!response.ok) {
+      const error = await response.json().catch(() => null);
+      throw new Error(error?.detail || `Request failed with status code ${response.status}`);
+    }
+    return await readFramedResponse(response, onMetadata);
+  } finally {
+    clearTimeout(timeout);
+  }
+};
+
 // Get pipeline status
 export const getPipelineStatus = async (): Promise<PipelineStatus> => {
   const response = await api.get('/pipeline/status');
@@ -67,8 +135,9 @@ export const processFullPipeline = async (
     tts_speed?: number;
     tts_pitch?: number;
     llm_messages?: ChatMessage[];
-  }
-): Promise<{ blob: Blob; headers: any }> => {
+  },
+  onMetadata?: (metadata: PipelineMetadata) => void
+): Promise<{ blob: Blob; metadata: PipelineMetadata }> => {
   const formData = new FormData();
   formData.append('audio', audioFile);
   
@@ -82,17 +151,7 @@ export const processFullPipeline = async (
     }
   });
 
-  const response = await api.post('/pipeline/process', formData, {
-    headers: {
-      'Content-Type': 'multipart/form-data',
-    },
-    responseType: 'blob',
-  });
-
-  return {
-    blob: response.data,
-    headers: response.headers,
-  };
+  return postPipeline('/pipeline/process', formData, onMetadata);
 };
 
 // Process text pipeline (text input)
@@ -110,8 +169,9 @@ export const processTextPipeline = async (
     tts_speed?: number;
     tts_pitch?: number;
     llm_messages?: ChatMessage[];
-  }
-): Promise<{ blob: Blob; headers: any }> => {
+  },
+  onMetadata?: (metadata: PipelineMetadata) => void
+): Promise<{ blob: Blob; metadata: PipelineMetadata }> => {
   const formData = new FormData();
   formData.append('text', text);
   
@@ -125,17 +185,7 @@ export const processTextPipeline = async (
     }
   });
 
-  const response = await api.post('/pipeline/process-text', formData, {
-    headers: {
-      'Content-Type': 'multipart/form-data',
-    },
-    responseType: 'blob',
-  });
-
-  return {
-    blob: response.data,
-    headers: response.headers,
-  };
+  return postPipeline('/pipeline/process-text', formData, onMetadata);
 };
 
 // Individual service endpoints
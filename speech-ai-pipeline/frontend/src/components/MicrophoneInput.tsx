@@ -173,12 +173,12 @@ export const MicrophoneInput: React.FC<MicrophoneInputProps> = ({
       const responseAudioUrl = URL.createObjectURL(result.blob);
       
       const metadata = {
-        transcribedText: result.headers['x-transcribed-text'],
-        responseText: result.headers['x-response-text'],
-        sttProvider: result.headers['x-stt-provider'],
-        llmProvider: result.headers['x-llm-provider'],
-        ttsProvider: result.headers['x-tts-provider'],
-        sttConfidence: parseFloat(result.headers['x-stt-confidence'] || '0'),
+        transcribedText: result.metadata.input_text,
+        responseText: result.metadata.safe_response_text,
+        sttProvider: result.metadata.stt_provider,
+        llmProvider: result.metadata.llm_provider,
+        ttsProvider: result.metadata.tts_provider,
+        sttConfidence: result.metadata.stt_confidence || 0,
       };
       
       onProcessingComplete(responseAudioUrl, metadata);
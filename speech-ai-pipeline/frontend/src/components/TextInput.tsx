@@ -65,10 +65,10 @@ export const TextInput: React.FC<TextInputProps> = ({
       const responseAudioUrl = URL.createObjectURL(result.blob);
       
       const metadata = {
-        inputText: result.headers['x-input-text'] || inputText,
-        responseText: result.headers['x-response-text'],
-        llmProvider: result.headers['x-llm-provider'],
-        ttsProvider: result.headers['x-tts-provider'],
+        inputText: result.metadata.input_text || inputText,
+        responseText: result.metadata.response_text,
+        llmProvider: result.metadata.llm_provider,
+        ttsProvider: result.metadata.tts_provider,
       };
       
       onProcessingComplete(responseAudioUrl, metadata);
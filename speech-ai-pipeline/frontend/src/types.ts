@@ -28,6 +28,28 @@ export interface ChatMessage {
   content: string;
 }
 
+// Metadata JSON ahead of the audio in a response_format=framed pipeline response
+export interface PipelineMetadata {
+  input_text: string;
+  response_text: string;
+  safe_response_text: string;
+  stt_provider: string | null;
+  stt_confidence: number | null;
+  llm_provider: string;
+  tts_provider: string;
+  session_id: string | null;
+  degradations: string[];
+  tts_cache: 'hit' | 'miss';
+  audio_format: 'mp3' | 'opus' | 'wav' | 'pcm';
+  sample_rate: number | null;
+  audio: {
+    media_type: string;
+    filename: string;
+    bytes: number;
+  };
+  [key: string]: any;
+}
+
 export interface ProcessingResult {
   audioUrl: string;
   metadata: {